@@ -0,0 +1,282 @@
+"""
+Offline benchmarks for the ingest hot paths.
+
+Generates synthetic HRRR-shaped GRIB2 files, serves them from an
+in-process S3 stand-in (moto) and times find_nearest_grid_point, the grid
+index, process_grib_file, insert_forecast_data and the full cli.main
+path. Results are written as JSON so runs of different versions can be
+compared.
+
+Usage:
+    python -m benchmarks.run_benchmarks --points 10,1000,100000 --variables 1,11 --hours 1,3
+"""
+
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import click
+import numpy as np
+
+import hrrr_ingest
+from hrrr_ingest import cli, grid_index
+from hrrr_ingest.config import CACHE_DIR, HRRR_BUCKET, SUPPORTED_VARIABLES, get_s3_key
+from hrrr_ingest.database import DatabaseSession, insert_forecast_data
+from hrrr_ingest.decode import decode_fields
+from hrrr_ingest.process import find_nearest_grid_point, process_grib_file
+
+from .synthetic import make_idx, random_points, write_grib
+
+RUN_TIME = datetime(2025, 5, 1, 6)
+
+# Default location of the JSON results, inside the (git-ignored) cache directory
+RESULTS_DIR = CACHE_DIR / "benchmarks"
+
+class BenchmarkRecorder:
+    """Collects timings and writes them as a JSON report."""
+
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.results: List[Dict[str, Any]] = []
+
+    def measure(self, name: str, params: Dict[str, Any], func: Callable[[], Any],
+                items: Optional[int] = None, setup: Optional[Callable[[], None]] = None,
+                repeat: Optional[int] = None) -> None:
+        """
+        Time func, calling setup (untimed) before every repetition.
+
+        Args:
+            items: Number of items (points, rows) handled per call, used to
+                report throughput
+        """
+        times = []
+        for _ in range(repeat or self.repeat):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+
+        result = {
+            "name": name,
+            "params": params,
+            "times": times,
+            "min_seconds": min(times),
+            "median_seconds": statistics.median(times),
+        }
+        if items:
+            result["items_per_second"] = items / result["median_seconds"]
+        self.results.append(result)
+        click.echo(f"{name} {params}: median {result['median_seconds']:.4f}s")
+
+    def write(self, path: Path, config: Dict[str, Any]) -> None:
+        """Write the report."""
+        report = {
+            "hrrr_ingest_version": hrrr_ingest.__version__,
+            "timestamp": datetime.now().isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": config,
+            "results": self.results,
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        click.echo(f"Wrote {len(self.results)} results to {path}")
+
+@contextmanager
+def working_directory(path: Path) -> Iterator[None]:
+    """Run with a different working directory (the database and caches are relative paths)."""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+def reset_grid_index_cache() -> None:
+    """Forget in-memory grid indexes so every repetition starts cold."""
+    grid_index._INDEX_CACHE.clear()
+
+def load_grid(grib_file: Path) -> Tuple[np.ndarray, np.ndarray]:
+    """Grid latitudes and longitudes of a synthetic file."""
+    field = next(decode_fields(str(grib_file), [next(iter(SUPPORTED_VARIABLES))]))
+    return field.grid_coordinates()
+
+def bench_nearest_grid_point(recorder: BenchmarkRecorder, grib_file: Path,
+                             point_counts: List[int], brute_force_limit: int) -> None:
+    """Brute-force per-point search versus the batched grid index."""
+    lats, lons = load_grid(grib_file)
+    key = grid_index.grid_hash(lats, lons)
+
+    recorder.measure("grid_index_build", {"cells": lats.size},
+                     lambda: grid_index.GridIndex.build(lats, lons), repeat=1)
+    index = grid_index.GridIndex.build(lats, lons)
+
+    for count in point_counts:
+        points = random_points(count)
+        sample = points[:brute_force_limit]
+        recorder.measure("find_nearest_grid_point", {"points": len(sample)},
+                         lambda: [find_nearest_grid_point(lat, lon, lats, lons) for lat, lon in sample],
+                         items=len(sample))
+        recorder.measure("grid_index_query", {"points": count},
+                         lambda: index.query(points), items=count)
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        index.save(Path(index_dir) / f"{key}.pkl")
+        recorder.measure("grid_index_load", {"cells": lats.size},
+                         lambda: grid_index.get_grid_index(key, lambda: (lats, lons), Path(index_dir)),
+                         setup=reset_grid_index_cache)
+
+def bench_process_grib_file(recorder: BenchmarkRecorder, grib_file: Path,
+                            point_counts: List[int], variable_counts: List[int]) -> None:
+    """Decode and extraction of one file, with a warm grid index."""
+    variables = list(SUPPORTED_VARIABLES)
+    process_grib_file(str(grib_file), random_points(1), variables[:1], RUN_TIME)
+
+    for count in point_counts:
+        points = random_points(count)
+        for num_vars in variable_counts:
+            recorder.measure("process_grib_file", {"points": count, "variables": num_vars},
+                             lambda: process_grib_file(str(grib_file), points, variables[:num_vars], RUN_TIME),
+                             items=count * num_vars)
+
+def bench_insert_forecast_data(recorder: BenchmarkRecorder, grib_file: Path, work_dir: Path,
+                               point_counts: List[int], variable_counts: List[int]) -> None:
+    """Inserts into an empty table and re-inserts of the same rows (all skipped)."""
+    variables = list(SUPPORTED_VARIABLES)
+    for count in point_counts:
+        for num_vars in variable_counts:
+            batch = process_grib_file(str(grib_file), random_points(count), variables[:num_vars], RUN_TIME)
+            db_path = work_dir / f"insert_{count}_{num_vars}.db"
+            params = {"points": count, "variables": num_vars, "rows": batch.num_rows}
+
+            def fresh_database():
+                db_path.unlink(missing_ok=True)
+                DatabaseSession(db_path).close()
+
+            def insert():
+                with DatabaseSession(db_path) as session:
+                    insert_forecast_data(batch, session.conn)
+
+            recorder.measure("insert_forecast_data", params, insert,
+                             items=batch.num_rows, setup=fresh_database)
+            recorder.measure("insert_forecast_data_duplicates", params, insert, items=batch.num_rows)
+            db_path.unlink(missing_ok=True)
+
+def bench_cli_main(recorder: BenchmarkRecorder, work_dir: Path, scale: int,
+                   point_counts: List[int], variable_counts: List[int], hour_counts: List[int]) -> None:
+    """Full ingest through cli.main against a moto S3 bucket, starting from an empty database and caches."""
+    import boto3
+    from click.testing import CliRunner
+    from moto import mock_aws
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    variables = list(SUPPORTED_VARIABLES)
+
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket=HRRR_BUCKET)
+        date_str = RUN_TIME.strftime('%Y%m%d')
+        for forecast_hour in range(max(hour_counts)):
+            grib_file = work_dir / f"cli_f{forecast_hour:02d}.grib2"
+            offsets = write_grib(grib_file, RUN_TIME, forecast_hour, scale=scale)
+            s3_key = get_s3_key(date_str, forecast_hour, RUN_TIME.hour)
+            # The CLI uses anonymous requests, so objects must be public
+            s3.upload_file(str(grib_file), HRRR_BUCKET, s3_key, ExtraArgs={"ACL": "public-read"})
+            s3.put_object(Bucket=HRRR_BUCKET, Key=f"{s3_key}.idx", ACL="public-read",
+                          Body=make_idx(offsets, RUN_TIME, forecast_hour).encode())
+            grib_file.unlink()
+
+        for count in point_counts:
+            points_file = work_dir / f"points_{count}.txt"
+            points_file.write_text("".join(f"{lat},{lon}\n" for lat, lon in random_points(count)))
+            for num_vars in variable_counts:
+                for num_hours in hour_counts:
+                    run_dir = work_dir / "cli_run"
+
+                    def fresh_run_dir():
+                        reset_grid_index_cache()
+                        shutil.rmtree(run_dir, ignore_errors=True)
+                        run_dir.mkdir()
+
+                    def ingest():
+                        with working_directory(run_dir):
+                            result = CliRunner().invoke(cli.main, [
+                                str(points_file), "--run-date", RUN_TIME.strftime('%Y-%m-%d'),
+                                "--variables", ",".join(variables[:num_vars]),
+                                "--num-hours", str(num_hours),
+                            ])
+                        if result.exit_code != 0:
+                            raise RuntimeError(f"cli.main failed: {result.output[-2000:]}") from result.exception
+
+                    recorder.measure("cli_main", {"points": count, "variables": num_vars, "hours": num_hours},
+                                     ingest, items=count * num_vars * num_hours, setup=fresh_run_dir)
+
+def parse_counts(value: str) -> List[int]:
+    """Parse a comma separated list of positive integers."""
+    return [int(v) for v in value.split(',') if v.strip()]
+
+@click.command()
+@click.option('--points', default='10,100,1000,10000,100000',
+              help='Comma separated point counts')
+@click.option('--variables', default='1,11',
+              help='Comma separated variable counts (first N supported variables)')
+@click.option('--hours', default='1,3',
+              help='Comma separated forecast hour counts for the cli.main benchmark')
+@click.option('--scale', default=1, type=int,
+              help='Coarsen the HRRR grid by this factor for quicker runs (1 = full 1059x1799 grid)')
+@click.option('--repeat', default=3, type=int,
+              help='Repetitions of each measurement')
+@click.option('--brute-force-limit', default=100, type=int,
+              help='Maximum number of points timed with the brute-force find_nearest_grid_point')
+@click.option('--only', default=None,
+              help='Comma separated subset of: nearest,process,insert,cli')
+@click.option('--output', type=click.Path(dir_okay=False),
+              default=None, help='JSON results file (defaults to .hrrr_cache/benchmarks/<timestamp>.json)')
+def main(points: str, variables: str, hours: str, scale: int, repeat: int,
+         brute_force_limit: int, only: str, output: str):
+    """Run the benchmark suite and write the results as JSON."""
+    point_counts = parse_counts(points)
+    variable_counts = [min(v, len(SUPPORTED_VARIABLES)) for v in parse_counts(variables)]
+    hour_counts = parse_counts(hours)
+    suites = set(only.split(',')) if only else {"nearest", "process", "insert", "cli"}
+
+    recorder = BenchmarkRecorder(repeat)
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        grib_file = work_dir / "synthetic.grib2"
+        write_grib(grib_file, RUN_TIME, 1, scale=scale)
+
+        with working_directory(work_dir):
+            if "nearest" in suites:
+                bench_nearest_grid_point(recorder, grib_file, point_counts, brute_force_limit)
+            if "process" in suites:
+                bench_process_grib_file(recorder, grib_file, point_counts, variable_counts)
+            if "insert" in suites:
+                bench_insert_forecast_data(recorder, grib_file, work_dir, point_counts, variable_counts)
+            if "cli" in suites:
+                bench_cli_main(recorder, work_dir, scale, point_counts, variable_counts, hour_counts)
+
+    if output is None:
+        output = RESULTS_DIR / f"{datetime.now().strftime('%Y%m%dT%H%M%S')}.json"
+    recorder.write(Path(output), {
+        "points": point_counts, "variables": variable_counts, "hours": hour_counts,
+        "scale": scale, "repeat": repeat, "brute_force_limit": brute_force_limit,
+        "suites": sorted(suites),
+    })
+
+if __name__ == '__main__':
+    main()
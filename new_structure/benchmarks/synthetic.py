@@ -0,0 +1,115 @@
+"""Synthetic HRRR-shaped GRIB2 files for offline benchmarks."""
+
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import eccodes
+import numpy as np
+
+from hrrr_ingest.config import SUPPORTED_VARIABLES, IDX_SEARCH
+
+# HRRR CONUS Lambert conformal grid
+HRRR_GRID = {
+    "Nx": 1799,
+    "Ny": 1059,
+    "latitudeOfFirstGridPointInDegrees": 21.138123,
+    "longitudeOfFirstGridPointInDegrees": 237.280472,
+    "LoVInDegrees": 262.5,
+    "LaDInDegrees": 38.5,
+    "Latin1InDegrees": 38.5,
+    "Latin2InDegrees": 38.5,
+    "DxInMetres": 3000,
+    "DyInMetres": 3000,
+}
+
+# GRIB2 product definition of each variable:
+# (discipline, parameterCategory, parameterNumber, typeOfFirstFixedSurface, level, base value, amplitude)
+MESSAGES = {
+    "surface_pressure": (0, 3, 0, 1, None, 95000.0, 5000.0),
+    "surface_roughness": (2, 0, 1, 1, None, 0.5, 0.4),
+    "visible_beam_downward_solar_flux": (0, 4, 200, 1, None, 300.0, 300.0),
+    "visible_diffuse_downward_solar_flux": (0, 4, 201, 1, None, 100.0, 100.0),
+    "temperature_2m": (0, 0, 0, 103, 2, 288.0, 15.0),
+    "dewpoint_2m": (0, 0, 6, 103, 2, 280.0, 10.0),
+    "relative_humidity_2m": (0, 1, 1, 103, 2, 60.0, 35.0),
+    "u_component_wind_10m": (0, 2, 2, 103, 10, 0.0, 10.0),
+    "v_component_wind_10m": (0, 2, 3, 103, 10, 0.0, 10.0),
+    "u_component_wind_80m": (0, 2, 2, 103, 80, 0.0, 15.0),
+    "v_component_wind_80m": (0, 2, 3, 103, 80, 0.0, 15.0),
+}
+
+# CONUS bounding box used for random benchmark points
+CONUS_BOUNDS = ((25.0, 49.0), (-124.0, -67.0))
+
+def scaled_grid(scale: int = 1) -> dict:
+    """HRRR grid definition, optionally coarsened by an integer factor for quick runs."""
+    grid = dict(HRRR_GRID)
+    grid["Nx"] = HRRR_GRID["Nx"] // scale
+    grid["Ny"] = HRRR_GRID["Ny"] // scale
+    grid["DxInMetres"] = HRRR_GRID["DxInMetres"] * scale
+    grid["DyInMetres"] = HRRR_GRID["DyInMetres"] * scale
+    return grid
+
+def synthetic_values(nx: int, ny: int, base: float, amplitude: float, phase: float) -> np.ndarray:
+    """Smooth field with a little noise, so packing behaves like real data."""
+    x = np.linspace(0, 4 * np.pi, nx)
+    y = np.linspace(0, 2 * np.pi, ny)
+    field = np.sin(x[np.newaxis, :] + phase) * np.cos(y[:, np.newaxis] - phase)
+    noise = np.random.default_rng(int(phase * 1000)).normal(0, 0.05, (ny, nx))
+    return (base + amplitude * (field + noise)).ravel()
+
+def write_grib(path: Path, run_time: datetime, forecast_hour: int,
+               variables: Optional[List[str]] = None, scale: int = 1) -> List[Tuple[str, int]]:
+    """
+    Write a GRIB2 file with one message per variable on the HRRR grid.
+
+    Returns:
+        List of (variable, byte offset) for each message written
+    """
+    grid = scaled_grid(scale)
+    offsets = []
+    with open(path, 'wb') as f:
+        for i, var in enumerate(variables or list(SUPPORTED_VARIABLES)):
+            discipline, category, number, surface, level, base, amplitude = MESSAGES[var]
+            handle = eccodes.codes_grib_new_from_samples('GRIB2')
+            try:
+                eccodes.codes_set(handle, 'centre', 7)
+                eccodes.codes_set(handle, 'gridDefinitionTemplateNumber', 30)
+                for key, value in grid.items():
+                    eccodes.codes_set(handle, key, value)
+                eccodes.codes_set(handle, 'dataDate', int(run_time.strftime('%Y%m%d')))
+                eccodes.codes_set(handle, 'dataTime', run_time.hour * 100)
+                eccodes.codes_set(handle, 'discipline', discipline)
+                eccodes.codes_set(handle, 'parameterCategory', category)
+                eccodes.codes_set(handle, 'parameterNumber', number)
+                eccodes.codes_set(handle, 'typeOfFirstFixedSurface', surface)
+                if level is not None:
+                    eccodes.codes_set(handle, 'scaleFactorOfFirstFixedSurface', 0)
+                    eccodes.codes_set(handle, 'scaledValueOfFirstFixedSurface', level)
+                eccodes.codes_set(handle, 'forecastTime', forecast_hour)
+                eccodes.codes_set(handle, 'bitsPerValue', 16)
+                eccodes.codes_set_values(handle, synthetic_values(
+                    grid["Nx"], grid["Ny"], base, amplitude, i + forecast_hour / 48))
+                offsets.append((var, f.tell()))
+                eccodes.codes_write(handle, f)
+            finally:
+                eccodes.codes_release(handle)
+    return offsets
+
+def make_idx(offsets: List[Tuple[str, int]], run_time: datetime, forecast_hour: int) -> str:
+    """Build the wgrib2 inventory (.idx) published next to an HRRR file."""
+    forecast = "anl" if forecast_hour == 0 else f"{forecast_hour} hour fcst"
+    lines = []
+    for i, (var, offset) in enumerate(offsets, start=1):
+        name, level = IDX_SEARCH[var]
+        lines.append(f"{i}:{offset}:d={run_time.strftime('%Y%m%d%H')}:{name}:{level}:{forecast}:")
+    return "\n".join(lines) + "\n"
+
+def random_points(count: int, seed: int = 0) -> List[Tuple[float, float]]:
+    """Uniformly distributed (lat, lon) points over CONUS."""
+    rng = np.random.default_rng(seed)
+    (lat_min, lat_max), (lon_min, lon_max) = CONUS_BOUNDS
+    lats = rng.uniform(lat_min, lat_max, count)
+    lons = rng.uniform(lon_min, lon_max, count)
+    return list(zip(lats.tolist(), lons.tolist()))
@@ -0,0 +1,165 @@
+"""Local content-addressed cache of downloaded GRIB files."""
+
+import hashlib
+import logging
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+from .config import GRIB_CACHE_DIR, GRIB_CACHE_MAX_BYTES
+from .decode import INDEX_SUFFIX
+from .metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Suffix of cached GRIB files
+ENTRY_SUFFIX = ".grib2"
+
+# Entries used more recently than this are never evicted, so files that are
+# still being decoded survive even if the cache is over budget
+EVICTION_GRACE_SECONDS = 300
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive advisory lock on path, shared across processes."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+class GribCache:
+    """
+    Directory of downloaded GRIB files with a byte budget and LRU eviction.
+
+    Entries are keyed by S3 key, ETag and the set of downloaded variables,
+    so a changed object or a different partial download never hits a stale
+    entry. Files are written to a temporary name and renamed into place,
+    and file locks make it safe for several processes to share a directory:
+    only one of them downloads a missing entry while the others wait.
+    Recency is tracked with the file access time, which is set explicitly
+    on every hit (the modification time is left alone because message
+    indexes are validated against it).
+    """
+
+    def __init__(self, cache_dir: Path = GRIB_CACHE_DIR, max_bytes: int = GRIB_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(s3_key: str, etag: str, variables: Optional[List[str]] = None) -> str:
+        """Content key of an object version, optionally restricted to some variables."""
+        variant = ','.join(sorted(variables)) if variables else 'full'
+        etag = etag.strip('"')
+        return hashlib.sha256(f"{s3_key}:{etag}:{variant}".encode()).hexdigest()
+
+    def path_for(self, key: str) -> Path:
+        """Location of an entry."""
+        return self.cache_dir / key[:2] / f"{key}{ENTRY_SUFFIX}"
+
+    def get(self, key: str) -> Optional[Path]:
+        """Return the path of a cached entry and mark it as recently used."""
+        path = self.path_for(key)
+        try:
+            os.utime(path, ns=(time.time_ns(), path.stat().st_mtime_ns))
+        except FileNotFoundError:
+            return None
+        return path
+
+    def fetch(self, key: str, download: Callable[[Path], bool]) -> Optional[Path]:
+        """
+        Return a cached entry, downloading it first if it is missing.
+
+        Args:
+            key: Entry key from make_key
+            download: Writes the file to the given path and returns True on success
+
+        Returns:
+            Path of the cached file, or None if the download failed
+        """
+        path = self.get(key)
+        if path is not None:
+            metrics.count("cache", hits=1)
+            logger.info(f"Using cached GRIB file {path}")
+            return path
+
+        path = self.path_for(key)
+        with file_lock(path.with_suffix('.lock')):
+            # Another process may have filled the entry while we waited
+            if self.get(key) is not None:
+                metrics.count("cache", hits=1)
+                logger.info(f"Using cached GRIB file {path}")
+                return path
+
+            metrics.count("cache", misses=1)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            try:
+                if not download(tmp_path):
+                    return None
+                os.replace(tmp_path, path)
+            finally:
+                tmp_path.unlink(missing_ok=True)
+
+        self.evict(keep=path)
+        return path
+
+    def entries(self) -> List[Path]:
+        """All cached GRIB files."""
+        if not self.cache_dir.exists():
+            return []
+        return list(self.cache_dir.glob(f"*/*{ENTRY_SUFFIX}"))
+
+    def size(self) -> int:
+        """Total bytes held by cached GRIB files."""
+        total = 0
+        for path in self.entries():
+            try:
+                total += path.stat().st_size
+            except FileNotFoundError:
+                continue
+        return total
+
+    def evict(self, keep: Optional[Path] = None) -> int:
+        """
+        Remove least recently used entries until the cache fits its budget.
+
+        An entry's message index and lock file are removed with it.
+
+        Returns:
+            Number of bytes freed
+        """
+        with file_lock(self.cache_dir / '.lock'):
+            stats = []
+            for path in self.entries():
+                try:
+                    stats.append((path, path.stat()))
+                except FileNotFoundError:
+                    continue
+
+            total = sum(st.st_size for _, st in stats)
+            cutoff = time.time() - EVICTION_GRACE_SECONDS
+            freed = 0
+            for path, st in sorted(stats, key=lambda item: item[1].st_atime):
+                if total - freed <= self.max_bytes or st.st_atime > cutoff:
+                    break
+                if path == keep:
+                    continue
+                path.unlink(missing_ok=True)
+                Path(f"{path}{INDEX_SUFFIX}").unlink(missing_ok=True)
+                path.with_suffix('.lock').unlink(missing_ok=True)
+                freed += st.st_size
+                metrics.count("cache", evictions=1, evicted_bytes=st.st_size)
+                logger.info(f"Evicted cached GRIB file {path}")
+
+        return freed
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""Cached listings of the HRRR files published for each run."""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .config import HRRR_BUCKET, CATALOG_TTL_SECONDS, DEFAULT_RUN_HOUR, get_run_prefix, get_s3_key
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class AvailabilityCatalog:
+    """
+    Which forecast hours of a run are published, with their ETags and sizes.
+
+    A run's surface files are listed with ListObjectsV2 (one request for
+    the ~100 objects of a run) instead of issuing a HEAD request per
+    forecast hour. Listings are reused for ttl seconds; concurrent lookups
+    of the same run wait for a single listing. Lookups return None for
+    files that are not published.
+    """
+
+    def __init__(self, get_client: Callable[[], Any], ttl: float = CATALOG_TTL_SECONDS):
+        self.get_client = get_client
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._prefix_locks: Dict[str, threading.Lock] = {}
+        self._listings: Dict[str, Tuple[float, Dict[str, Dict[str, Any]]]] = {}
+
+    def list_prefix(self, prefix: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Objects under a key prefix, listed at most once per ttl.
+
+        Returns:
+            Dict mapping keys to dicts with the object's etag and size
+        """
+        with self._lock:
+            prefix_lock = self._prefix_locks.setdefault(prefix, threading.Lock())
+
+        with prefix_lock:
+            cached = self._listings.get(prefix)
+            if cached is not None and time.monotonic() - cached[0] < self.ttl:
+                return cached[1]
+
+            objects = {}
+            with metrics.stage("s3_list") as stage:
+                paginator = self.get_client().get_paginator('list_objects_v2')
+                for page in paginator.paginate(Bucket=HRRR_BUCKET, Prefix=prefix):
+                    stage["requests"] = stage.get("requests", 0) + 1
+                    for obj in page.get("Contents", []):
+                        objects[obj["Key"]] = {"etag": obj["ETag"], "size": obj["Size"]}
+                stage["keys"] = len(objects)
+            logger.info(f"Listed {len(objects)} objects under s3://{HRRR_BUCKET}/{prefix}")
+
+            self._listings[prefix] = (time.monotonic(), objects)
+            return objects
+
+    def get_file_info(self, date: str, forecast_hour: int,
+                      cycle: int = DEFAULT_RUN_HOUR) -> Optional[Dict[str, Any]]:
+        """Etag and size of a forecast hour's GRIB file, or None if it is not published."""
+        return self.list_prefix(get_run_prefix(date, cycle)).get(get_s3_key(date, forecast_hour, cycle))
+
+    def invalidate(self) -> None:
+        """Forget all listings, so the next lookups see newly published files."""
+        with self._lock:
+            self._listings.clear()
@@ -1,17 +1,30 @@
 """CLI interface for HRRR data ingestion."""
 
 import click
+import cProfile
 import logging
+import pstats
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 import sys
 from io import StringIO
 
-from .config import SUPPORTED_VARIABLES, DEFAULT_RUN_HOUR
-from .database import init_database, insert_forecast_data
-from .download import download_grib_file, check_file_exists
-from .process import process_grib_file
+from .cache import GribCache
+from .config import (SUPPORTED_VARIABLES, DEFAULT_RUN_HOUR, EXTENDED_CYCLES, GRIB_CACHE_DIR, GRIB_CACHE_MAX_BYTES,
+                     DB_PATH, STORAGE_LAYOUTS, POINT_CHUNK_SIZE, FIELD_CACHE_DIR, FIELD_CACHE_MAX_BYTES,
+                     STAGING_DIR)
+from .database import DatabaseSession, get_connection, migrate_database
+from .download import check_file_exists
+from .field_cache import FieldCache
+from .metrics import metrics, ProfileStats
+from .pipeline import run_pipeline
+from .points import PointSource, chunk_size_for_memory, iter_point_chunks
+from .rollups import ROLLUPS, drop_rollups, get_rollups, rebuild_rollups
+from .query import ForecastQuery, QueryCache, OUTPUT_FORMATS, query_forecasts, write_table
+from .scheduler import expand_work_units, parse_cycles, shard_work_units
+from .staging import ShardWriter, ingest_sharded, merge_shards
+from .watch import DEFAULT_POLL_INTERVAL, DEFAULT_POLL_JITTER, DEFAULT_RUN_LOOKBACK, Watcher
 
 def setup_logging(stream=None):
     """Configure logging with optional custom stream."""
@@ -44,35 +57,141 @@ def find_last_available_date():
     # If no complete data found in last 7 days, use a known good date
     return datetime(2025, 5, 1)
 
+def log_stage_summary(logger: logging.Logger) -> None:
+    """Log wall time, CPU time and counters of each stage of the run."""
+    for stage, totals in sorted(metrics.stage_totals().items()):
+        counters = ", ".join(f"{key} {value:g}" for key, value in sorted(totals.items())
+                             if key not in ("calls", "wall_seconds", "cpu_seconds"))
+        wall = f"{totals['wall_seconds']:.2f}s wall, {totals['cpu_seconds']:.2f}s CPU, " if "wall_seconds" in totals else ""
+        logger.info(f"Stage {stage}: {wall}{counters or 'no counters'}")
+
+def write_profile(profiler: cProfile.Profile, path: str, logger: logging.Logger) -> None:
+    """Merge the main process's profile with the decode workers' and write it in pstats format."""
+    stats = pstats.Stats(profiler)
+    for worker_stats in metrics.profiles:
+        stats.add(ProfileStats(worker_stats))
+    stats.dump_stats(path)
+
+    output = StringIO()
+    stats.stream = output
+    stats.sort_stats('cumulative').print_stats(20)
+    logger.info(f"Wrote profile to {path}; top functions by cumulative time:\n{output.getvalue()}")
+
 def read_points_file(file_path: str) -> List[Tuple[float, float]]:
-    """Read points from a file."""
-    points = []
-    with open(file_path, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.endswith('%'):  # Skip empty lines and comments
-                lat, lon = map(float, line.split(','))
-                points.append((lat, lon))
-    return points
-
-@click.command()
-@click.argument('points_file', type=click.Path(exists=True))
-@click.option('--run-date', type=click.DateTime(formats=["%Y-%m-%d"]),
-              help='Forecast run date (YYYY-MM-DD)')
-@click.option('--variables', default=None,
-              help='Comma separated list of variables to ingest')
-@click.option('--num-hours', default=48, type=int,
-              help='Number of forecast hours to ingest (max 48)')
-def main(points_file: str, run_date: datetime, 
-         variables: str, num_hours: int):
-    """Ingest HRRR forecast data for specified points."""
-    # Set up logging
-    logger = setup_logging()
-    
+    """Read points from a file (see points.iter_point_chunks for the formats)."""
+    try:
+        return [tuple(point) for chunk in iter_point_chunks(Path(file_path)) for point in chunk.coords.tolist()]
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+def open_points(points_file: str, point_chunk_size: int,
+                memory_limit_mb: Optional[int]) -> Tuple[PointSource, int]:
+    """
+    Point source for a points file, read in chunks sized by the chunk and memory options.
+
+    The file is parsed up front (see points.parse_points_file), so format
+    errors are reported before anything is downloaded.
+
+    Returns:
+        Tuple of (point source, number of points)
+    """
+    if point_chunk_size < 1:
+        raise click.BadParameter("Point chunk size must be at least 1")
+    if memory_limit_mb is not None:
+        if memory_limit_mb < 1:
+            raise click.BadParameter("Memory limit must be at least 1 MB")
+        point_chunk_size = chunk_size_for_memory(memory_limit_mb * 1024 ** 2, point_chunk_size)
+    points = PointSource(Path(points_file), chunk_size=point_chunk_size)
+    try:
+        return points, points.count()
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+class DefaultCommandGroup(click.Group):
+    """
+    Group that falls back to a default subcommand.
+
+    Arguments that do not start with a subcommand name are passed to the
+    default command, so ``hrrr_ingest points.txt --run-date ...`` keeps
+    working next to ``hrrr_ingest watch points.txt``.
+    """
+
+    def __init__(self, *args, default_command: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default_command = default_command
+
+    def parse_args(self, ctx: click.Context, args: List[str]) -> List[str]:
+        if args and args[0] not in self.commands and args[0] not in ctx.help_option_names:
+            args = [self.default_command] + list(args)
+        return super().parse_args(ctx, args)
+
+def pipeline_options(func):
+    """Options shared by the commands that run the download/decode/insert pipeline."""
+    options = [
+        click.option('--variables', default=None,
+                     help='Comma separated list of variables to ingest'),
+        click.option('--num-hours', default=48, type=int,
+                     help='Number of forecast hours to ingest (max 48)'),
+        click.option('--partial-download/--full-download', default=True,
+                     help='Fetch only the requested GRIB messages using byte-range requests'),
+        click.option('--download-workers', default=4, type=int,
+                     help='Number of concurrent downloads'),
+        click.option('--decode-workers', default=2, type=int,
+                     help='Number of processes decoding GRIB files'),
+        click.option('--cache-dir', type=click.Path(file_okay=False), default=str(GRIB_CACHE_DIR),
+                     help='Directory for cached GRIB files'),
+        click.option('--cache-size-mb', type=int, default=GRIB_CACHE_MAX_BYTES // 1024 ** 2,
+                     help='Size budget of the GRIB cache in MB'),
+        click.option('--no-cache', is_flag=True,
+                     help='Download to temporary files that are removed after processing'),
+        click.option('--max-concurrency', type=int, default=None,
+                     help='Maximum number of forecast files in flight across all runs '
+                          '(defaults to download-workers + 2 * decode-workers)'),
+        click.option('--metrics-prom', type=click.Path(dir_okay=False), default=None,
+                     help='Write per-stage totals as a Prometheus text file'),
+        click.option('--storage', type=click.Choice(STORAGE_LAYOUTS), default=None,
+                     help='Storage layout of a new database (existing databases keep theirs)'),
+        click.option('--point-chunk-size', type=int, default=POINT_CHUNK_SIZE,
+                     help='Points extracted and inserted per batch; larger point sets are streamed in chunks'),
+        click.option('--memory-limit-mb', type=int, default=None,
+                     help='Memory ceiling in MB: caps the point chunk size and DuckDB\'s memory use'),
+        click.option('--low-memory', is_flag=True,
+                     help='Crop decoded fields to the bounding box of the points right away'),
+        click.option('--decode-memory-mb', type=int, default=None,
+                     help='Peak RSS budget in MB shared by concurrent decodes; fewer decodes run at once to stay within it'),
+        click.option('--field-cache', is_flag=True,
+                     help='Keep decoded fields as memory-mapped arrays so new points can be added without re-downloading'),
+        click.option('--field-cache-dir', type=click.Path(file_okay=False), default=str(FIELD_CACHE_DIR),
+                     help='Directory for cached decoded fields'),
+        click.option('--field-cache-size-mb', type=int, default=FIELD_CACHE_MAX_BYTES // 1024 ** 2,
+                     help='Size budget of the decoded field cache in MB'),
+        click.option('--stream', is_flag=True,
+                     help='Fetch GRIB messages into memory and decode them without temporary files (bypasses the GRIB cache)'),
+        click.option('--force', is_flag=True,
+                     help='Ingest forecast files again even if the ingest manifest records them as complete'),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+def validate_pipeline_options(num_hours: int, download_workers: int, decode_workers: int,
+                              max_concurrency: int, decode_memory_mb: Optional[int] = None) -> None:
+    """Reject out-of-range pipeline options."""
     # Validate num_hours
     if num_hours < 1 or num_hours > 48:
         raise click.BadParameter("Number of hours must be between 1 and 48")
     
+    if download_workers < 1 or decode_workers < 1:
+        raise click.BadParameter("Worker counts must be at least 1")
+    
+    if max_concurrency is not None and max_concurrency < 1:
+        raise click.BadParameter("Maximum concurrency must be at least 1")
+    
+    if decode_memory_mb is not None and decode_memory_mb < 1:
+        raise click.BadParameter("Decode memory budget must be at least 1 MB")
+
+def parse_variable_list(variables: str) -> List[str]:
+    """Parse the --variables option, defaulting to all supported variables."""
     # Convert variables string to list if provided
     var_list = variables.split(',') if variables else list(SUPPORTED_VARIABLES.keys())
     
@@ -80,52 +199,339 @@ def main(points_file: str, run_date: datetime,
     invalid_vars = [v for v in var_list if v not in SUPPORTED_VARIABLES]
     if invalid_vars:
         raise click.BadParameter(f"Invalid variables: {', '.join(invalid_vars)}")
+    return var_list
+
+def parse_cycle_list(cycles: str) -> List[int]:
+    """Parse the --cycles option."""
+    try:
+        return parse_cycles(cycles)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+def open_session(storage: Optional[str], memory_limit_mb: Optional[int] = None,
+                 db_path: Path = DB_PATH) -> DatabaseSession:
+    """Open the database session, reporting a layout mismatch as a usage error."""
+    try:
+        session = DatabaseSession(db_path, storage=storage)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    if memory_limit_mb is not None:
+        session.conn.execute(f"SET memory_limit = '{int(memory_limit_mb)}MB'")
+    return session
+
+def make_cache(cache_dir: str, cache_size_mb: int, no_cache: bool) -> Optional[GribCache]:
+    """GRIB cache selected by the cache options."""
+    return None if no_cache else GribCache(Path(cache_dir), cache_size_mb * 1024 ** 2)
+
+def make_field_cache(field_cache: bool, field_cache_dir: str, field_cache_size_mb: int) -> Optional[FieldCache]:
+    """Decoded field cache selected by the field cache options."""
+    return FieldCache(Path(field_cache_dir), field_cache_size_mb * 1024 ** 2) if field_cache else None
+
+@click.group(cls=DefaultCommandGroup, default_command='ingest')
+def main():
+    """Ingest HRRR forecast data for specified points."""
+
+@main.command()
+@click.argument('points_file', type=click.Path(exists=True))
+@click.option('--run-date', type=click.DateTime(formats=["%Y-%m-%d"]),
+              help='Forecast run date (YYYY-MM-DD)')
+@click.option('--start-date', type=click.DateTime(formats=["%Y-%m-%d"]),
+              help='First run date of a backfill (YYYY-MM-DD)')
+@click.option('--end-date', type=click.DateTime(formats=["%Y-%m-%d"]),
+              help='Last run date of a backfill, inclusive (YYYY-MM-DD). Defaults to --start-date')
+@click.option('--cycles', default=str(DEFAULT_RUN_HOUR),
+              help='Comma separated list of run cycles (UTC hours) to ingest, e.g. 0,6,12,18')
+@pipeline_options
+@click.option('--shards', type=int, default=None,
+              help='Split the forecast files among this many worker processes that stage rows as Parquet '
+                   'shards, then merge the shards into the database in one transaction')
+@click.option('--shard-index', type=int, default=None,
+              help='Only stage shard I of --shards to --staging-dir, without opening the database '
+                   '(e.g. one per host); load the shards with the merge command')
+@click.option('--staging-dir', type=click.Path(file_okay=False), default=str(STAGING_DIR),
+              help='Directory for Parquet shards of a sharded ingest (may be shared by several hosts)')
+@click.option('--metrics-json', type=click.Path(dir_okay=False), default=None,
+              help='Write a JSON run report with per-stage and per-forecast-hour timings')
+@click.option('--profile', type=click.Path(dir_okay=False), default=None,
+              help='Run under cProfile (including decode workers) and write pstats output to this file')
+def ingest(points_file: str, run_date: datetime, start_date: datetime, end_date: datetime,
+           cycles: str, variables: str, num_hours: int, partial_download: bool,
+           download_workers: int, decode_workers: int,
+           cache_dir: str, cache_size_mb: int, no_cache: bool, max_concurrency: int,
+           metrics_prom: str, storage: str, point_chunk_size: int, memory_limit_mb: int,
+           low_memory: bool, decode_memory_mb: int, field_cache: bool, field_cache_dir: str,
+           field_cache_size_mb: int, stream: bool, force: bool, shards: int, shard_index: int, staging_dir: str,
+           metrics_json: str, profile: str):
+    """Ingest HRRR forecast data for specified points (the default command)."""
+    # Set up logging
+    logger = setup_logging()
     
-    # Read points file
-    points = read_points_file(points_file)
-    
-    # Initialize database
-    init_database()
-    
-    # Set run date to last available date if not provided
-    if not run_date:
-        run_date = find_last_available_date()
-        logger.info(f"Using last available date: {run_date.strftime('%Y-%m-%d')}")
-    
-    # Set run time to 06z
-    run_time = run_date.replace(hour=DEFAULT_RUN_HOUR, minute=0, second=0, microsecond=0)
-    
-    # Process each forecast hour
-    for hour in range(num_hours):
-        forecast_hour = hour
-        date_str = run_time.strftime('%Y%m%d')
-        
-        # Check if file exists
-        if not check_file_exists(date_str, forecast_hour):
-            logger.warning(f"No data available for {date_str} hour {forecast_hour}")
-            continue
-        
-        # Download GRIB file
-        grib_file = download_grib_file(date_str, forecast_hour)
-        if not grib_file:
-            logger.error(f"Failed to download GRIB file for {date_str} hour {forecast_hour}")
-            continue
-        
-        try:
-            # Process GRIB file
-            logger.info(f"Processing forecast for {date_str} hour {forecast_hour}")
-            results = process_grib_file(grib_file, points, var_list, run_time)
-            
-            # Insert results into database
-            if results:
-                insert_forecast_data(results)
-                logger.info(f"Successfully processed {len(results)} records for hour {forecast_hour}")
+    validate_pipeline_options(num_hours, download_workers, decode_workers, max_concurrency, decode_memory_mb)
+    cycle_list = parse_cycle_list(cycles)
+    
+    if run_date and (start_date or end_date):
+        raise click.BadParameter("Use either --run-date or --start-date/--end-date")
+    if end_date and not start_date:
+        raise click.BadParameter("--end-date requires --start-date")
+    if start_date and end_date and end_date < start_date:
+        raise click.BadParameter("--end-date must not be before --start-date")
+    if shards is not None and shards < 1:
+        raise click.BadParameter("Number of shards must be at least 1")
+    if shard_index is not None and (shards is None or not 0 <= shard_index < shards):
+        raise click.BadParameter("--shard-index requires --shards and must be between 0 and shards - 1")
+    
+    var_list = parse_variable_list(variables)
+    
+    metrics.reset()
+    profiler = cProfile.Profile() if profile else None
+    if profiler is not None:
+        profiler.enable()
+    
+    # Points are streamed from the file in chunks
+    points, num_points = open_points(points_file, point_chunk_size, memory_limit_mb)
+    logger.info(f"Read {num_points} points from {points_file} (chunks of {points.chunk_size})")
+    
+    if start_date:
+        end_date = end_date or start_date
+    else:
+        # Set run date to last available date if not provided
+        if not run_date:
+            run_date = find_last_available_date()
+            logger.info(f"Using last available date: {run_date.strftime('%Y-%m-%d')}")
+        start_date = end_date = run_date
+    
+    # Expand the dates and cycles into (run, forecast hour) work units
+    units = expand_work_units(start_date, end_date, cycle_list, num_hours)
+    logger.info(f"Scheduled {len(units)} forecast files from {start_date.strftime('%Y-%m-%d')} "
+                f"to {end_date.strftime('%Y-%m-%d')} for cycles {', '.join(f'{c:02d}z' for c in cycle_list)}")
+    
+    pipeline_kwargs = dict(
+        download_workers=download_workers,
+        decode_workers=decode_workers,
+        partial_download=partial_download,
+        cache=make_cache(cache_dir, cache_size_mb, no_cache),
+        max_in_flight=max_concurrency,
+        profile=profiler is not None,
+        low_memory=low_memory,
+        decode_memory_budget=decode_memory_mb * 1024 ** 2 if decode_memory_mb else None,
+        field_cache=make_field_cache(field_cache, field_cache_dir, field_cache_size_mb),
+        points_hash=points.fingerprint(),
+        skip_completed=not force,
+        stream=stream,
+    )
+    
+    if shard_index is not None:
+        # One worker of a sharded ingest: stage rows without touching the database
+        units = shard_work_units(units, shards, shard_index)
+        with ShardWriter(Path(staging_dir)) as writer:
+            staged, _ = run_pipeline(units, points, var_list, session=writer, **pipeline_kwargs)
+        logger.info(f"Staged {staged} records from {len(units)} forecast files of shard {shard_index} in {staging_dir}")
+    else:
+        # Download, decode and insert forecast hours concurrently
+        with open_session(storage, memory_limit_mb) as session:
+            sites = session.add_sites(points)
+            if sites:
+                logger.info(f"Recorded {sites} site ids")
+            if shards is not None:
+                inserted, skipped = ingest_sharded(units, points, var_list, session, shards,
+                                                   Path(staging_dir), **pipeline_kwargs)
             else:
-                logger.warning(f"No new data to insert for hour {forecast_hour}")
-                
-        finally:
-            # Keep the file for inspection
-            pass
+                inserted, skipped = run_pipeline(units, points, var_list, session=session, **pipeline_kwargs)
+        logger.info(f"Inserted {inserted} records across {len(units)} forecast files ({skipped} already present)")
+    
+    if profiler is not None:
+        profiler.disable()
+        write_profile(profiler, profile, logger)
+    
+    log_stage_summary(logger)
+    if metrics_json:
+        metrics.write_json(Path(metrics_json))
+        logger.info(f"Wrote run report to {metrics_json}")
+    if metrics_prom:
+        metrics.write_prometheus(Path(metrics_prom))
+        logger.info(f"Wrote Prometheus metrics to {metrics_prom}")
+
+@main.command()
+@click.argument('points_file', type=click.Path(exists=True))
+@click.option('--cycles', default=','.join(str(c) for c in EXTENDED_CYCLES),
+              help='Comma separated list of run cycles (UTC hours) to follow')
+@pipeline_options
+@click.option('--poll-interval', default=DEFAULT_POLL_INTERVAL, type=float,
+              help='Seconds between checks for newly published forecast hours')
+@click.option('--poll-jitter', default=DEFAULT_POLL_JITTER, type=float,
+              help='Random fraction by which each poll interval is shortened or stretched')
+@click.option('--lookback-hours', default=DEFAULT_RUN_LOOKBACK.total_seconds() / 3600, type=float,
+              help='Follow runs whose cycle started within this many hours')
+def watch(points_file: str, cycles: str, variables: str, num_hours: int, partial_download: bool,
+          download_workers: int, decode_workers: int,
+          cache_dir: str, cache_size_mb: int, no_cache: bool, max_concurrency: int,
+          metrics_prom: str, storage: str, point_chunk_size: int, memory_limit_mb: int,
+          low_memory: bool, decode_memory_mb: int, field_cache: bool, field_cache_dir: str,
+          field_cache_size_mb: int, stream: bool, force: bool, poll_interval: float, poll_jitter: float, lookback_hours: float):
+    """Keep running and ingest forecast hours as soon as they are published."""
+    logger = setup_logging()
+    
+    validate_pipeline_options(num_hours, download_workers, decode_workers, max_concurrency, decode_memory_mb)
+    if poll_interval <= 0 or not 0 <= poll_jitter < 1:
+        raise click.BadParameter("Poll interval must be positive and jitter between 0 and 1")
+    cycle_list = parse_cycle_list(cycles)
+    var_list = parse_variable_list(variables)
+    points, num_points = open_points(points_file, point_chunk_size, memory_limit_mb)
+    
+    metrics.reset()
+    with open_session(storage, memory_limit_mb) as session:
+        session.add_sites(points)
+        watcher = Watcher(
+            points, var_list, cycle_list, num_hours, session,
+            cache=make_cache(cache_dir, cache_size_mb, no_cache),
+            partial_download=partial_download,
+            download_workers=download_workers,
+            decode_workers=decode_workers,
+            max_in_flight=max_concurrency,
+            poll_interval=poll_interval,
+            jitter=poll_jitter,
+            lookback=timedelta(hours=lookback_hours),
+            metrics_prom=Path(metrics_prom) if metrics_prom else None,
+            low_memory=low_memory,
+            decode_memory_budget=decode_memory_mb * 1024 ** 2 if decode_memory_mb else None,
+            field_cache=make_field_cache(field_cache, field_cache_dir, field_cache_size_mb),
+            points_hash=points.fingerprint(),
+            skip_completed=not force,
+            stream=stream,
+        )
+        watcher.install_signal_handlers()
+        logger.info(f"Watching cycles {', '.join(f'{c:02d}z' for c in cycle_list)} for {num_points} points")
+        watcher.run()
+    log_stage_summary(logger)
+
+@main.command()
+@click.option('--storage', type=click.Choice(STORAGE_LAYOUTS), required=True,
+              help='Layout to convert the database to (the current layout re-sorts it)')
+@click.option('--db-path', type=click.Path(exists=True, dir_okay=False), default=str(DB_PATH),
+              help='Database file to migrate')
+@click.option('--keep-backup/--no-backup', default=True,
+              help='Keep the original database as <db>.bak')
+def migrate(storage: str, db_path: str, keep_backup: bool):
+    """Rewrite the database in another storage layout."""
+    logger = setup_logging()
+    
+    try:
+        old_size, new_size = migrate_database(Path(db_path), storage, keep_backup)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    logger.info(f"Migrated {db_path} to the {storage} layout: {old_size / 1024 ** 2:.1f} MB -> "
+                f"{new_size / 1024 ** 2:.1f} MB")
+
+@main.command()
+@click.option('--only', 'names', multiple=True, type=click.Choice([rollup.name for rollup in ROLLUPS]),
+              help='Rollup table to rebuild; may be repeated (defaults to all)')
+@click.option('--drop', is_flag=True,
+              help='Drop the rollup tables instead, which stops maintaining them')
+@click.option('--db-path', type=click.Path(exists=True, dir_okay=False), default=str(DB_PATH),
+              help='Database file holding the forecasts')
+def rollups(names: Tuple[str, ...], drop: bool, db_path: str):
+    """Create or rebuild the daily rollup tables, which inserts then keep up to date."""
+    logger = setup_logging()
+    
+    selected = get_rollups(names)
+    with DatabaseSession(Path(db_path)) as session, session.transaction():
+        if drop:
+            drop_rollups(session.conn, selected)
+            logger.info(f"Dropped rollup tables {', '.join(rollup.name for rollup in selected)}")
+            return
+        with metrics.stage("rollup_rebuild"):
+            counts = rebuild_rollups(session.conn, selected)
+    for name, count in counts.items():
+        logger.info(f"Rebuilt {name} with {count} rows")
+
+@main.command()
+@click.option('--staging-dir', type=click.Path(file_okay=False), default=str(STAGING_DIR),
+              help='Directory of the Parquet shards to merge')
+@click.option('--points-file', type=click.Path(exists=True), default=None,
+              help='Also record the site ids of this points file')
+@click.option('--storage', type=click.Choice(STORAGE_LAYOUTS), default=None,
+              help='Storage layout of a new database (existing databases keep theirs)')
+@click.option('--memory-limit-mb', type=int, default=None,
+              help='Memory ceiling of DuckDB in MB')
+@click.option('--db-path', type=click.Path(dir_okay=False), default=str(DB_PATH),
+              help='Database file to load the shards into (created if missing)')
+def merge(staging_dir: str, points_file: str, storage: str, memory_limit_mb: int, db_path: str):
+    """Load the Parquet shards staged by sharded ingest workers into the database."""
+    logger = setup_logging()
+    
+    with open_session(storage, memory_limit_mb, Path(db_path)) as session:
+        if points_file:
+            points, _ = open_points(points_file, POINT_CHUNK_SIZE, memory_limit_mb)
+            sites = session.add_sites(points)
+            if sites:
+                logger.info(f"Recorded {sites} site ids")
+        inserted, skipped, num_shards = merge_shards(session, Path(staging_dir))
+    logger.info(f"Inserted {inserted} records from {num_shards} shards ({skipped} already present)")
+
+@main.command()
+@click.option('--points-file', type=click.Path(exists=True), default=None,
+              help='File of latitude,longitude pairs to return (defaults to all points)')
+@click.option('--point', 'point_values', multiple=True,
+              help='A latitude,longitude pair to return; may be repeated')
+@click.option('--variables', default=None,
+              help='Comma separated list of variables to return (defaults to all)')
+@click.option('--run-time', type=click.DateTime(formats=["%Y-%m-%d %H", "%Y-%m-%dT%H", "%Y-%m-%d"]),
+              default=None, help='Run to return (YYYY-MM-DD HH); defaults to the latest run')
+@click.option('--all-runs', is_flag=True,
+              help='Return every run instead of a single one')
+@click.option('--start', type=click.DateTime(formats=["%Y-%m-%d %H", "%Y-%m-%dT%H", "%Y-%m-%d"]),
+              default=None, help='First valid time to return')
+@click.option('--end', type=click.DateTime(formats=["%Y-%m-%d %H", "%Y-%m-%dT%H", "%Y-%m-%d"]),
+              default=None, help='Last valid time to return (inclusive)')
+@click.option('--wide', is_flag=True,
+              help='One row per point and valid time with a column per variable')
+@click.option('--format', 'fmt', type=click.Choice(OUTPUT_FORMATS), default='csv',
+              help='Output format')
+@click.option('--output', type=click.Path(dir_okay=False), default=None,
+              help='Output file (CSV is written to stdout if omitted)')
+@click.option('--db-path', type=click.Path(exists=True, dir_okay=False), default=str(DB_PATH),
+              help='Database file to query')
+@click.option('--no-cache', is_flag=True,
+              help='Do not use or store cached results')
+def query(points_file: str, point_values: Tuple[str, ...], variables: str, run_time: datetime,
+          all_runs: bool, start: datetime, end: datetime, wide: bool, fmt: str, output: str,
+          db_path: str, no_cache: bool):
+    """Export stored forecasts for points, variables and runs."""
+    # Log to stderr so CSV on stdout stays clean
+    logger = setup_logging(sys.stderr)
+    
+    if fmt != 'csv' and output is None:
+        raise click.BadParameter("--output is required for Parquet and Arrow output")
+    if run_time and all_runs:
+        raise click.BadParameter("Use either --run-time or --all-runs")
+    
+    points = None
+    if points_file or point_values:
+        points = read_points_file(points_file) if points_file else []
+        try:
+            points += [tuple(map(float, value.split(','))) for value in point_values]
+        except ValueError:
+            raise click.BadParameter("Points must be given as latitude,longitude")
+    
+    forecast_query = ForecastQuery(
+        points=points,
+        variables=parse_variable_list(variables) if variables else None,
+        run_time=run_time,
+        all_runs=all_runs,
+        start=start,
+        end=end,
+        wide=wide,
+    )
+    conn = get_connection(Path(db_path), read_only=True)
+    try:
+        table = query_forecasts(forecast_query, conn, cache=None if no_cache else QueryCache())
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        conn.close()
+    
+    write_table(table, output, fmt)
+    logger.info(f"Returned {table.num_rows} rows{f' to {output}' if output else ''}")
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -1,12 +1,24 @@
 """Configuration and constants for HRRR data ingestion."""
 
+import os
 from pathlib import Path
-from typing import List
 
 # AWS S3 bucket for HRRR data
 HRRR_BUCKET = "noaa-hrrr-bdp-pds"
 HRRR_PREFIX = "hrrr"
 
+# Optional S3 endpoint override (e.g. a local moto server or MinIO for testing)
+S3_ENDPOINT_URL = os.environ.get("HRRR_S3_ENDPOINT_URL")
+
+# Connections kept open by the shared S3 client (boto3 defaults to 10)
+S3_MAX_POOL_CONNECTIONS = 32
+
+# Size of the concurrent ranged GETs used to stream a whole object into memory
+STREAM_PART_SIZE = 8 * 1024 * 1024
+
+# Seconds a listing of a run's published files is reused before S3 is listed again
+CATALOG_TTL_SECONDS = 60
+
 # Supported variables and their GRIB2 identifiers
 SUPPORTED_VARIABLES = {
     "surface_pressure": "sp",  # Surface pressure
@@ -37,13 +49,118 @@ VARIABLE_LEVELS = {
     'v_component_wind_80m': {'typeOfLevel': 'heightAboveGround', 'stepType': 'instant', 'level': 80},
 }
 
+# ecCodes shortNames of each variable's GRIB2 message (cfgrib renames some
+# of these in SUPPORTED_VARIABLES, e.g. 2t -> t2m)
+GRIB_SHORT_NAMES = {
+    'surface_pressure': 'sp',
+    'surface_roughness': 'fsr',
+    'visible_beam_downward_solar_flux': 'vbdsf',
+    'visible_diffuse_downward_solar_flux': 'vddsf',
+    'temperature_2m': '2t',
+    'dewpoint_2m': '2d',
+    'relative_humidity_2m': '2r',
+    'u_component_wind_10m': '10u',
+    'v_component_wind_10m': '10v',
+    'u_component_wind_80m': 'u',
+    'v_component_wind_80m': 'v',
+}
+
+# wgrib2 inventory (.idx) names for each variable: (parameter, level description)
+IDX_SEARCH = {
+    'surface_pressure': ('PRES', 'surface'),
+    'surface_roughness': ('SFCR', 'surface'),
+    'visible_beam_downward_solar_flux': ('VBDSF', 'surface'),
+    'visible_diffuse_downward_solar_flux': ('VDDSF', 'surface'),
+    'temperature_2m': ('TMP', '2 m above ground'),
+    'dewpoint_2m': ('DPT', '2 m above ground'),
+    'relative_humidity_2m': ('RH', '2 m above ground'),
+    'u_component_wind_10m': ('UGRD', '10 m above ground'),
+    'v_component_wind_10m': ('VGRD', '10 m above ground'),
+    'u_component_wind_80m': ('UGRD', '80 m above ground'),
+    'v_component_wind_80m': ('VGRD', '80 m above ground'),
+}
+
 # Default forecast run time (06z)
 DEFAULT_RUN_HOUR = 6
 
+# HRRR runs every hour; the 00z, 06z, 12z and 18z cycles forecast out to
+# 48 hours, the others only to 18 hours
+EXTENDED_CYCLES = (0, 6, 12, 18)
+EXTENDED_FORECAST_HOURS = 48
+STANDARD_FORECAST_HOURS = 18
+
 # Database configuration
 DB_PATH = Path("data.db")
 TABLE_NAME = "hrrr_forecasts"
 
-def get_s3_path(date: str, forecast_hour: int) -> str:
+# Storage layouts: "standard" keeps one wide-keyed row per value in
+# TABLE_NAME; "compact" stores point ids and an ENUM variable in
+# VALUES_TABLE_NAME and exposes TABLE_NAME as a view
+STORAGE_STANDARD = "standard"
+STORAGE_COMPACT = "compact"
+STORAGE_LAYOUTS = (STORAGE_STANDARD, STORAGE_COMPACT)
+VALUES_TABLE_NAME = "hrrr_forecast_values"
+POINTS_TABLE_NAME = "points"
+VARIABLE_ENUM_NAME = "hrrr_variable"
+
+# View with one column per variable
+WIDE_VIEW_NAME = "hrrr_forecasts_wide"
+
+# Mapping of optional site ids from the points file to coordinates
+SITES_TABLE_NAME = "sites"
+
+# Record of ingested forecast files, used to skip them on later runs
+MANIFEST_TABLE_NAME = "ingest_manifest"
+
+# Daily aggregates per run, point and UTC day, maintained as rows are
+# inserted once they are created with 'hrrr_ingest rollups'
+DAILY_TEMPERATURE_TABLE_NAME = "daily_temperature"
+DAILY_WIND_TABLE_NAME = "daily_wind"
+DAILY_SOLAR_TABLE_NAME = "daily_solar"
+
+# Points extracted and inserted per batch when streaming large point sets
+POINT_CHUNK_SIZE = 50_000
+
+# Directory for decoded rows of point sets larger than one chunk, which
+# decode workers spool to disk instead of returning in memory (None: the
+# system temporary directory)
+SPOOL_DIR = None
+
+# Local cache directories
+CACHE_DIR = Path(".hrrr_cache")
+GRID_INDEX_DIR = CACHE_DIR / "grid_index"
+GRIB_CACHE_DIR = CACHE_DIR / "grib"
+
+# Byte budget of the downloaded GRIB file cache (10 GB)
+GRIB_CACHE_MAX_BYTES = 10 * 1024 ** 3
+
+# Decoded fields kept as memory-mapped arrays, and their byte budget (50 GB;
+# a full 48 hour run of all variables takes about 4 GB)
+FIELD_CACHE_DIR = CACHE_DIR / "fields"
+FIELD_CACHE_MAX_BYTES = 50 * 1024 ** 3
+
+# Points files parsed into memory-mapped coordinate arrays
+POINTS_CACHE_DIR = CACHE_DIR / "points"
+
+# Parquet shards written by sharded ingest workers until they are merged
+STAGING_DIR = CACHE_DIR / "staging"
+
+# Cached query results, and how many are kept
+QUERY_CACHE_DIR = CACHE_DIR / "query"
+QUERY_CACHE_MAX_ENTRIES = 64
+
+def get_max_forecast_hour(cycle: int) -> int:
+    """Last forecast hour published for a cycle."""
+    return EXTENDED_FORECAST_HOURS if cycle in EXTENDED_CYCLES else STANDARD_FORECAST_HOURS
+
+def get_s3_key(date: str, forecast_hour: int, cycle: int = DEFAULT_RUN_HOUR) -> str:
+    """Generate S3 object key for HRRR data file."""
+    return f"hrrr.{date}/conus/hrrr.t{cycle:02d}z.wrfsfcf{forecast_hour:02d}.grib2"
+
+def get_run_prefix(date: str, cycle: int = DEFAULT_RUN_HOUR) -> str:
+    """S3 key prefix shared by the surface files (and their inventories) of one run."""
+    return f"hrrr.{date}/conus/hrrr.t{cycle:02d}z.wrfsfcf"
+
+def get_s3_path(date: str, forecast_hour: int, cycle: int = DEFAULT_RUN_HOUR) -> str:
     """Generate S3 path for HRRR data file."""
-    return f"s3://{HRRR_BUCKET}/hrrr.{date}/conus/hrrr.t06z.wrfsfcf{forecast_hour:02d}.grib2" 
\ No newline at end of file
+    return f"s3://{HRRR_BUCKET}/{get_s3_key(date, forecast_hour, cycle)}" 
\ No newline at end of file
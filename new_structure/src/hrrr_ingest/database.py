@@ -1,84 +1,630 @@
 """Database operations for HRRR data storage."""
 
 import duckdb
+import logging
+import os
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
-import pandas as pd
-from typing import List, Dict, Any, Optional
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from typing import List, Dict, Any, Iterator, Mapping, Optional, Sequence, Set, Tuple, Union
 
-from .config import DB_PATH, TABLE_NAME
+from .config import (DB_PATH, TABLE_NAME, HRRR_BUCKET, SUPPORTED_VARIABLES, STORAGE_STANDARD, STORAGE_COMPACT,
+                     VALUES_TABLE_NAME, POINTS_TABLE_NAME, VARIABLE_ENUM_NAME, WIDE_VIEW_NAME, SITES_TABLE_NAME,
+                     MANIFEST_TABLE_NAME)
+from .metrics import metrics
+from .points import PointSource
+from .rollups import Rollup, create_rollup_table, existing_rollups, update_rollups
 
-def get_connection() -> duckdb.DuckDBPyConnection:
+logger = logging.getLogger(__name__)
+
+# Columnar layout of forecast batches produced by process.py
+FORECAST_SCHEMA = pa.schema([
+    ("valid_time_utc", pa.timestamp("us")),
+    ("run_time_utc", pa.timestamp("us")),
+    ("latitude", pa.float64()),
+    ("longitude", pa.float64()),
+    ("variable", pa.string()),
+    ("value", pa.float32()),
+    ("source_s3", pa.string()),
+])
+
+# Name under which batches are registered with DuckDB while inserting
+BATCH_VIEW = "forecast_batch"
+
+# Statuses of forecast files in the ingest manifest
+MANIFEST_STARTED = "started"
+MANIFEST_COMPLETE = "complete"
+MANIFEST_FAILED = "failed"
+
+ForecastBatch = Union[pa.Table, pa.RecordBatch, Mapping[str, np.ndarray], List[Dict[str, Any]]]
+
+def sql_string(value: Any) -> str:
+    """Quote a value as a SQL string literal."""
+    return "'" + str(value).replace("'", "''") + "'"
+
+def get_connection(db_path: Path = DB_PATH, read_only: bool = False) -> duckdb.DuckDBPyConnection:
     """Get a connection to the DuckDB database."""
-    return duckdb.connect(str(DB_PATH))
+    return duckdb.connect(str(db_path), read_only=read_only)
 
-def init_database(conn: Optional[duckdb.DuckDBPyConnection] = None) -> None:
-    """Initialize the DuckDB database with required schema."""
-    if conn is None:
-        conn = duckdb.connect(str(DB_PATH))
-        should_close = True
+def to_arrow(data: ForecastBatch) -> pa.Table:
+    """
+    Convert a forecast batch to an Arrow table.
+
+    Arrow tables and record batches are used as they are, and dicts of
+    NumPy arrays are wrapped without copying their numeric buffers. Lists
+    of row dicts are converted row by row.
+    """
+    if isinstance(data, pa.Table):
+        return data
+    if isinstance(data, pa.RecordBatch):
+        return pa.Table.from_batches([data])
+    if isinstance(data, list):
+        return pa.Table.from_pylist(data)
+    return pa.table(dict(data))
+
+def get_storage(conn: duckdb.DuckDBPyConnection) -> Optional[str]:
+    """Storage layout of a database, or None if it has no forecast tables yet."""
+    return get_storage_of(conn, conn.execute("SELECT current_database()").fetchone()[0])
+
+def get_storage_of(conn: duckdb.DuckDBPyConnection, database: str) -> Optional[str]:
+    """Storage layout of a database attached to conn."""
+    tables = {row[0] for row in conn.execute(
+        "SELECT table_name FROM duckdb_tables() WHERE database_name = ?", [database]).fetchall()}
+    if VALUES_TABLE_NAME in tables:
+        return STORAGE_COMPACT
+    if TABLE_NAME in tables:
+        return STORAGE_STANDARD
+    return None
+
+def get_data_version(conn: duckdb.DuckDBPyConnection) -> Tuple[Optional[datetime], int]:
+    """
+    Latest run time and total row count of the stored forecasts.
+
+    Any insert changes the pair, so it identifies the state of the data
+    (e.g. for caching query results). Only the run_time_utc column of the
+    underlying table is scanned.
+    """
+    storage = get_storage(conn)
+    if storage is None:
+        return None, 0
+    table = VALUES_TABLE_NAME if storage == STORAGE_COMPACT else TABLE_NAME
+    return tuple(conn.execute(f"SELECT max(run_time_utc), count(*) FROM {table}").fetchone())
+
+def get_database_identity(conn: duckdb.DuckDBPyConnection) -> Optional[str]:
+    """
+    Identity of the connection's database file: its resolved path, device
+    and inode, so a file replaced at the same path (e.g. by
+    migrate_database) is a different database. None for in-memory
+    databases.
+    """
+    path = conn.execute(
+        "SELECT path FROM duckdb_databases() WHERE database_name = current_database()").fetchone()[0]
+    if not path:
+        return None
+    path = Path(path).resolve()
+    stat = path.stat()
+    return f"{path}:{stat.st_dev}:{stat.st_ino}"
+
+def source_s3_sql(run_time: str, valid_time: str) -> str:
+    """SQL expression rebuilding the source GRIB path of a row from its run and valid times."""
+    return (f"'s3://{HRRR_BUCKET}/hrrr.' || strftime({run_time}, '%Y%m%d') || '/conus/hrrr.t' "
+            f"|| strftime({run_time}, '%H') || 'z.wrfsfcf' "
+            f"|| lpad(CAST(date_diff('hour', {run_time}, {valid_time}) AS VARCHAR), 2, '0') || '.grib2'")
+
+def create_compact_schema(conn: duckdb.DuckDBPyConnection) -> None:
+    """
+    Create the compact layout: a points dimension, values keyed by point
+    id with an ENUM variable, and TABLE_NAME as a long-format view over
+    them with the standard columns (source_s3 is derived, not stored).
+    """
+    if not conn.execute("SELECT 1 FROM duckdb_types() WHERE type_name = ?", [VARIABLE_ENUM_NAME]).fetchall():
+        members = ", ".join(f"'{var}'" for var in SUPPORTED_VARIABLES)
+        conn.execute(f"CREATE TYPE {VARIABLE_ENUM_NAME} AS ENUM ({members})")
     else:
-        should_close = False
+        members = {row[0] for row in conn.execute(
+            f"SELECT unnest(enum_range(NULL::{VARIABLE_ENUM_NAME}))").fetchall()}
+        missing = [var for var in SUPPORTED_VARIABLES if var not in members]
+        if missing:
+            logger.warning(f"Variables {', '.join(missing)} are not in the {VARIABLE_ENUM_NAME} type; "
+                           f"run 'hrrr_ingest migrate --storage compact' to add them")
+
+    conn.execute(f"CREATE SEQUENCE IF NOT EXISTS {POINTS_TABLE_NAME}_id_seq")
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {POINTS_TABLE_NAME} (
+        point_id INTEGER PRIMARY KEY DEFAULT nextval('{POINTS_TABLE_NAME}_id_seq'),
+        latitude FLOAT NOT NULL,
+        longitude FLOAT NOT NULL,
+        UNIQUE (latitude, longitude)
+    )
+    """)
     
+    # No primary key: inserts deduplicate with an anti-join restricted to
+    # the batch's runs, and rows are kept ordered by (run_time_utc,
+    # point_id, valid_time_utc) so zone maps prune scans by run and point
     conn.execute(f"""
-    CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
-        valid_time_utc TIMESTAMP,
-        run_time_utc TIMESTAMP,
-        latitude FLOAT,
-        longitude FLOAT,
-        variable VARCHAR,
-        value FLOAT,
-        source_s3 VARCHAR,
-        PRIMARY KEY (valid_time_utc, run_time_utc, latitude, longitude, variable)
+    CREATE TABLE IF NOT EXISTS {VALUES_TABLE_NAME} (
+        run_time_utc TIMESTAMP NOT NULL,
+        point_id INTEGER NOT NULL,
+        valid_time_utc TIMESTAMP NOT NULL,
+        variable {VARIABLE_ENUM_NAME} NOT NULL,
+        value FLOAT
     )
     """)
     
-    if should_close:
-        conn.close()
+    conn.execute(f"""
+    CREATE OR REPLACE VIEW {TABLE_NAME} AS
+    SELECT
+        v.valid_time_utc,
+        v.run_time_utc,
+        p.latitude,
+        p.longitude,
+        CAST(v.variable AS VARCHAR) AS variable,
+        v.value,
+        {source_s3_sql('v.run_time_utc', 'v.valid_time_utc')} AS source_s3
+    FROM {VALUES_TABLE_NAME} v
+    JOIN {POINTS_TABLE_NAME} p USING (point_id)
+    """)
 
-def insert_forecast_data(data: List[Dict[str, Any]], conn: Optional[duckdb.DuckDBPyConnection] = None) -> None:
-    """Insert forecast data into database, handling duplicates."""
-    if not data:
-        return
-        
+def create_wide_view(conn: duckdb.DuckDBPyConnection) -> None:
+    """Create the view with one row per point and forecast time and one column per variable."""
+    columns = ",\n        ".join(
+        f"max(value) FILTER (WHERE variable = '{var}') AS {var}" for var in SUPPORTED_VARIABLES)
+    conn.execute(f"""
+    CREATE OR REPLACE VIEW {WIDE_VIEW_NAME} AS
+    SELECT
+        valid_time_utc,
+        run_time_utc,
+        latitude,
+        longitude,
+        {columns}
+    FROM {TABLE_NAME}
+    GROUP BY valid_time_utc, run_time_utc, latitude, longitude
+    """)
+
+def init_database(conn: Optional[duckdb.DuckDBPyConnection] = None,
+                  storage: Optional[str] = None) -> str:
+    """
+    Initialize the DuckDB database with required schema.
+
+    Args:
+        storage: Layout for a new database (STORAGE_STANDARD by default).
+            An existing database keeps its layout; asking for a different
+            one raises ValueError (use migrate_database to convert it).
+
+    Returns:
+        The database's storage layout
+    """
     if conn is None:
         conn = duckdb.connect(str(DB_PATH))
         should_close = True
     else:
         should_close = False
     
-    df = pd.DataFrame(data)
+    existing = get_storage(conn)
+    if existing is not None and storage is not None and storage != existing:
+        if should_close:
+            conn.close()
+        raise ValueError(f"Database uses the {existing} storage layout, not {storage}; "
+                         f"convert it with 'hrrr_ingest migrate --storage {storage}'")
+    storage = existing or storage or STORAGE_STANDARD
     
-    # Use INSERT OR IGNORE to handle duplicates
+    if storage == STORAGE_COMPACT:
+        create_compact_schema(conn)
+    else:
+        conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+            valid_time_utc TIMESTAMP,
+            run_time_utc TIMESTAMP,
+            latitude FLOAT,
+            longitude FLOAT,
+            variable VARCHAR,
+            value FLOAT,
+            source_s3 VARCHAR,
+            PRIMARY KEY (valid_time_utc, run_time_utc, latitude, longitude, variable)
+        )
+        """)
+    create_wide_view(conn)
     conn.execute(f"""
-        INSERT OR IGNORE INTO {TABLE_NAME} 
-        SELECT * FROM df
+    CREATE TABLE IF NOT EXISTS {SITES_TABLE_NAME} (
+        site_id VARCHAR PRIMARY KEY,
+        latitude FLOAT,
+        longitude FLOAT
+    )
+    """)
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE_NAME} (
+        s3_key VARCHAR,
+        variables VARCHAR,
+        points_hash VARCHAR,
+        etag VARCHAR,
+        status VARCHAR,
+        bytes BIGINT,
+        rows BIGINT,
+        updated_at TIMESTAMP,
+        PRIMARY KEY (s3_key, variables, points_hash)
+    )
     """)
     
     if should_close:
         conn.close()
+    
+    return storage
 
-def check_existing_data(run_time: str, valid_time: str, 
-                       latitude: float, longitude: float, 
-                       variable: str,
-                       conn: Optional[duckdb.DuckDBPyConnection] = None) -> bool:
-    """Check if data for a specific point and time already exists."""
+def upsert_sites(conn: duckdb.DuckDBPyConnection, site_ids: pa.Array, coords: np.ndarray) -> int:
+    """
+    Record the coordinates of named sites from a points file.
+
+    Coordinates are stored as FLOAT like the forecast rows, so sites join
+    the forecast table on (latitude, longitude). A site listed again with
+    new coordinates is moved.
+
+    Returns:
+        Number of sites written
+    """
+    sites = pa.table({
+        "site_id": site_ids,
+        "latitude": pa.array(coords[:, 0], pa.float64()),
+        "longitude": pa.array(coords[:, 1], pa.float64()),
+    }).filter(pc.is_valid(site_ids))
+    conn.register(BATCH_VIEW, sites)
+    try:
+        conn.execute(f"""
+            INSERT INTO {SITES_TABLE_NAME}
+            SELECT DISTINCT ON (site_id) site_id, CAST(latitude AS FLOAT), CAST(longitude AS FLOAT)
+            FROM {BATCH_VIEW}
+            ON CONFLICT (site_id) DO UPDATE SET latitude = excluded.latitude, longitude = excluded.longitude
+        """)
+    finally:
+        conn.unregister(BATCH_VIEW)
+    return sites.num_rows
+
+def manifest_variables(variables: List[str]) -> str:
+    """Canonical form of a variable set in the manifest."""
+    return ','.join(sorted(set(variables)))
+
+def record_manifest(conn: duckdb.DuckDBPyConnection, s3_key: str, variables: List[str], points_hash: str,
+                    status: str, etag: Optional[str] = None, num_bytes: Optional[int] = None,
+                    rows: Optional[int] = None) -> None:
+    """Create or update the manifest entry of a forecast file for a variable set and point set."""
+    conn.execute(f"""
+        INSERT INTO {MANIFEST_TABLE_NAME} VALUES (?, ?, ?, ?, ?, ?, ?, now()::TIMESTAMP)
+        ON CONFLICT (s3_key, variables, points_hash) DO UPDATE SET
+            etag = coalesce(excluded.etag, etag),
+            status = excluded.status,
+            bytes = coalesce(excluded.bytes, bytes),
+            rows = coalesce(excluded.rows, rows),
+            updated_at = excluded.updated_at
+    """, [s3_key, manifest_variables(variables), points_hash, etag, status, num_bytes, rows])
+
+def completed_files(conn: duckdb.DuckDBPyConnection, s3_keys: List[str],
+                    variables: List[str], points_hash: str) -> Set[str]:
+    """
+    Forecast files already ingested for every requested variable and the same point set.
+
+    Entries for several variable sets of one file are combined, so a file
+    ingested once for temperature and once for pressure counts as complete
+    for both.
+    """
+    rows = conn.execute(f"""
+        SELECT s3_key, variables FROM {MANIFEST_TABLE_NAME}
+        WHERE points_hash = ? AND status = '{MANIFEST_COMPLETE}' AND s3_key IN (SELECT unnest(?))
+    """, [points_hash, list(s3_keys)]).fetchall()
+    ingested: Dict[str, Set[str]] = {}
+    for s3_key, ingested_vars in rows:
+        ingested.setdefault(s3_key, set()).update(ingested_vars.split(','))
+    wanted = set(variables)
+    return {s3_key for s3_key, ingested_vars in ingested.items() if wanted <= ingested_vars}
+
+def insert_compact_rows(conn: duckdb.DuckDBPyConnection) -> int:
+    """
+    Insert the rows registered as BATCH_VIEW into the compact layout.
+
+    New coordinates are added to the points table, then the rows that are
+    not stored yet are inserted sorted by (run_time_utc, point_id,
+    valid_time_utc). The existence check only scans the batch's runs,
+    which zone maps on the run-ordered table keep cheap.
+
+    Returns:
+        Number of inserted rows
+    """
+    min_run, max_run = conn.execute(f"SELECT min(run_time_utc), max(run_time_utc) FROM {BATCH_VIEW}").fetchone()
+    
+    conn.execute(f"""
+        INSERT INTO {POINTS_TABLE_NAME} (latitude, longitude)
+        SELECT DISTINCT CAST(b.latitude AS FLOAT) AS latitude, CAST(b.longitude AS FLOAT) AS longitude
+        FROM {BATCH_VIEW} b
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {POINTS_TABLE_NAME} p
+            WHERE p.latitude = CAST(b.latitude AS FLOAT) AND p.longitude = CAST(b.longitude AS FLOAT)
+        )
+        ORDER BY latitude, longitude
+    """)
+    
+    return conn.execute(f"""
+        INSERT INTO {VALUES_TABLE_NAME}
+        SELECT DISTINCT ON (run_time_utc, point_id, valid_time_utc, variable) *
+        FROM (
+            SELECT
+                CAST(b.run_time_utc AS TIMESTAMP) AS run_time_utc,
+                p.point_id,
+                CAST(b.valid_time_utc AS TIMESTAMP) AS valid_time_utc,
+                CAST(b.variable AS {VARIABLE_ENUM_NAME}) AS variable,
+                CAST(b.value AS FLOAT) AS value
+            FROM {BATCH_VIEW} b
+            JOIN {POINTS_TABLE_NAME} p
+              ON p.latitude = CAST(b.latitude AS FLOAT) AND p.longitude = CAST(b.longitude AS FLOAT)
+        ) n
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {VALUES_TABLE_NAME} v
+            WHERE v.run_time_utc BETWEEN $min_run AND $max_run
+              AND v.run_time_utc = n.run_time_utc
+              AND v.point_id = n.point_id
+              AND v.valid_time_utc = n.valid_time_utc
+              AND v.variable = n.variable
+        )
+        ORDER BY run_time_utc, point_id, valid_time_utc, variable
+    """, {"min_run": min_run, "max_run": max_run}).fetchone()[0]
+
+def insert_batch_view(conn: duckdb.DuckDBPyConnection, storage: str, rollups: Sequence[Rollup] = ()) -> int:
+    """
+    Insert the rows registered as BATCH_VIEW (an Arrow batch or a view
+    over Parquet files), skipping rows that already exist.
+
+    In the standard layout deduplication is done in bulk against the
+    primary key with ON CONFLICT DO NOTHING, which also drops duplicates
+    within the batch; the compact layout uses an anti-join instead (see
+    insert_compact_rows). The groups of the given rollup tables touched
+    by the batch are then recomputed (see rollups.update_rollups).
+
+    Returns:
+        Number of inserted rows
+    """
+    if storage == STORAGE_COMPACT:
+        inserted = insert_compact_rows(conn)
+    else:
+        inserted = insert_standard_rows(conn)
+    
+    if rollups:
+        with metrics.stage("rollup_update") as stage:
+            stage["groups"] = update_rollups(conn, BATCH_VIEW, rollups)
+    return inserted
+
+def insert_standard_rows(conn: duckdb.DuckDBPyConnection) -> int:
+    """
+    Insert the batch registered as BATCH_VIEW into the standard layout.
+
+    Returns:
+        Number of inserted rows
+    """
+    # Columns are cast to the table types first, otherwise DOUBLE coordinates
+    # never match the stored FLOAT keys and the conflict is reported as a
+    # constraint error.
+    return conn.execute(f"""
+    INSERT INTO {TABLE_NAME} 
+    SELECT
+        CAST(valid_time_utc AS TIMESTAMP),
+        CAST(run_time_utc AS TIMESTAMP),
+        CAST(latitude AS FLOAT),
+        CAST(longitude AS FLOAT),
+        variable,
+        CAST(value AS FLOAT),
+        source_s3
+    FROM {BATCH_VIEW}
+    ON CONFLICT DO NOTHING
+    """).fetchone()[0]
+
+def insert_forecast_data(data: ForecastBatch,
+                         conn: Optional[duckdb.DuckDBPyConnection] = None,
+                         storage: Optional[str] = None,
+                         rollups: Optional[Sequence[Rollup]] = None) -> Tuple[int, int]:
+    """
+    Insert forecast data into database, skipping rows that already exist.
+
+    Accepts a columnar batch (pyarrow Table as returned by
+    process.process_grib_file, a RecordBatch or a dict of NumPy arrays),
+    which DuckDB scans in place, or a list of row dicts (see
+    insert_batch_view).
+
+    Args:
+        storage: Layout of the database, looked up if not given
+        rollups: Rollup tables to keep up to date, looked up if not given
+
+    Returns:
+        Tuple of (inserted, skipped) row counts
+    """
+    data = to_arrow(data)
+    if data.num_rows == 0:
+        return 0, 0
+        
     if conn is None:
         conn = duckdb.connect(str(DB_PATH))
         should_close = True
     else:
         should_close = False
     
-    result = conn.execute(f"""
-        SELECT COUNT(*) 
-        FROM {TABLE_NAME}
-        WHERE run_time_utc = ? 
-        AND valid_time_utc = ?
-        AND latitude = ?
-        AND longitude = ?
-        AND variable = ?
-    """, [run_time, valid_time, latitude, longitude, variable]).fetchone()
+    if storage is None:
+        storage = get_storage(conn) or STORAGE_STANDARD
+    if rollups is None:
+        rollups = existing_rollups(conn)
+    
+    conn.register(BATCH_VIEW, data)
+    try:
+        with metrics.stage("db_insert") as stage:
+            inserted = insert_batch_view(conn, storage, rollups)
+            stage["rows_inserted"] = inserted
+            stage["rows_skipped"] = data.num_rows - inserted
+    finally:
+        conn.unregister(BATCH_VIEW)
     
     if should_close:
         conn.close()
     
-    return result[0] > 0 
\ No newline at end of file
+    return inserted, data.num_rows - inserted
+
+class DatabaseSession:
+    """
+    One DuckDB connection held for a whole run.
+
+    Opening a connection loads the catalog and takes the file lock, so a
+    session is opened once and every insert goes through it. Batches are
+    handed to DuckDB as Arrow data without building intermediate
+    DataFrames, and transaction() groups the statements of one forecast
+    hour so it is committed as a unit.
+    """
+
+    def __init__(self, db_path: Path = DB_PATH, storage: Optional[str] = None):
+        self.db_path = Path(db_path)
+        self.conn = get_connection(self.db_path)
+        try:
+            self.storage = init_database(self.conn, storage)
+            # Rollup tables are looked up when the session opens, so tables created
+            # or dropped by another connection (see the rollups command) are only
+            # maintained by sessions opened afterwards
+            self.rollups = existing_rollups(self.conn)
+        except Exception:
+            self.conn.close()
+            raise
+
+    def __enter__(self) -> "DatabaseSession":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the connection."""
+        self.conn.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator["DatabaseSession"]:
+        """Run the enclosed statements in one transaction, rolled back on error."""
+        self.conn.execute("BEGIN TRANSACTION")
+        try:
+            yield self
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        with metrics.stage("db_commit"):
+            self.conn.execute("COMMIT")
+
+    def append(self, data: ForecastBatch) -> Tuple[int, int]:
+        """
+        Insert a batch of forecast rows, skipping existing ones.
+
+        Returns:
+            Tuple of (inserted, skipped) row counts
+        """
+        return insert_forecast_data(data, self.conn, self.storage, self.rollups)
+
+    def record_file(self, s3_key: str, variables: List[str], points_hash: str, status: str,
+                    etag: Optional[str] = None, num_bytes: Optional[int] = None,
+                    rows: Optional[int] = None) -> None:
+        """Update the manifest entry of a forecast file (see record_manifest)."""
+        record_manifest(self.conn, s3_key, variables, points_hash, status, etag, num_bytes, rows)
+
+    def completed_files(self, s3_keys: List[str], variables: List[str], points_hash: str) -> Set[str]:
+        """Forecast files the manifest records as ingested (see completed_files)."""
+        return completed_files(self.conn, s3_keys, variables, points_hash)
+
+    def add_sites(self, point_source: PointSource) -> int:
+        """
+        Record the site ids of a point source, one chunk at a time.
+
+        Returns:
+            Number of sites written (0 if the points have no site ids)
+        """
+        written = 0
+        with self.transaction():
+            for chunk in point_source.chunks():
+                if chunk.site_ids is not None:
+                    written += upsert_sites(self.conn, chunk.site_ids, chunk.coords)
+        return written
+
+def copy_forecasts(conn: duckdb.DuckDBPyConnection, source: str, storage: str) -> int:
+    """
+    Copy all forecast rows from the long-format table or view of an
+    attached database into the (empty) layout of conn, sorted so that
+    each run's rows are contiguous.
+
+    Returns:
+        Number of copied rows
+    """
+    if storage == STORAGE_COMPACT:
+        conn.execute(f"""
+            INSERT INTO {POINTS_TABLE_NAME} (latitude, longitude)
+            SELECT DISTINCT latitude, longitude FROM {source}.{TABLE_NAME}
+            ORDER BY latitude, longitude
+        """)
+        return conn.execute(f"""
+            INSERT INTO {VALUES_TABLE_NAME}
+            SELECT f.run_time_utc, p.point_id, f.valid_time_utc,
+                   CAST(f.variable AS {VARIABLE_ENUM_NAME}), f.value
+            FROM {source}.{TABLE_NAME} f
+            JOIN {POINTS_TABLE_NAME} p USING (latitude, longitude)
+            ORDER BY f.run_time_utc, p.point_id, f.valid_time_utc, f.variable
+        """).fetchone()[0]
+    
+    return conn.execute(f"""
+        INSERT INTO {TABLE_NAME}
+        SELECT valid_time_utc, run_time_utc, latitude, longitude, variable, value, source_s3
+        FROM {source}.{TABLE_NAME}
+        ORDER BY run_time_utc, valid_time_utc, latitude, longitude, variable
+    """).fetchone()[0]
+
+def migrate_database(db_path: Path = DB_PATH, storage: str = STORAGE_COMPACT,
+                     keep_backup: bool = True) -> Tuple[int, int]:
+    """
+    Rewrite a database in the given storage layout.
+
+    The rows are copied into a new file, which then replaces the original
+    (kept as <db>.bak unless keep_backup is False). Writing a fresh file
+    rather than converting in place is what actually shrinks it, since
+    DuckDB does not return the space of dropped tables to the file system.
+    Migrating to the layout a database already has re-sorts it, e.g. to
+    restore the (run_time_utc, point_id, valid_time_utc) order of a
+    compact database after many incremental inserts.
+
+    Returns:
+        Tuple of (old, new) file sizes in bytes
+    """
+    db_path = Path(db_path)
+    tmp_path = db_path.with_name(f"{db_path.name}.migrating")
+    backup_path = db_path.with_name(f"{db_path.name}.bak")
+    tmp_path.unlink(missing_ok=True)
+    
+    conn = duckdb.connect(str(tmp_path))
+    try:
+        init_database(conn, storage)
+        conn.execute(f"ATTACH {sql_string(db_path)} AS source")
+        # Fold the source's write-ahead log into its file before it is replaced
+        conn.execute("CHECKPOINT source")
+        if get_storage_of(conn, "source") is None:
+            raise ValueError(f"{db_path} has no forecast data to migrate")
+        with metrics.stage("db_migrate") as stage:
+            stage["rows"] = copy_forecasts(conn, "source", storage)
+        logger.info(f"Copied {stage['rows']} rows into the {storage} layout")
+        for table in (SITES_TABLE_NAME, MANIFEST_TABLE_NAME):
+            if conn.execute("""
+                SELECT count(*) FROM duckdb_tables() WHERE database_name = 'source' AND table_name = ?
+            """, [table]).fetchone()[0]:
+                conn.execute(f"INSERT INTO {table} SELECT * FROM source.{table}")
+        for rollup in existing_rollups(conn, "source"):
+            create_rollup_table(conn, rollup)
+            conn.execute(f"INSERT INTO {rollup.name} SELECT * FROM source.{rollup.name}")
+        conn.execute("DETACH source")
+        conn.execute("CHECKPOINT")
+    except BaseException:
+        conn.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    conn.close()
+    
+    old_size = db_path.stat().st_size
+    if keep_backup:
+        os.replace(db_path, backup_path)
+    os.replace(tmp_path, db_path)
+    Path(f"{db_path}.wal").unlink(missing_ok=True)
+    return old_size, db_path.stat().st_size
@@ -0,0 +1,267 @@
+"""Single-pass GRIB2 decoding with eccodes."""
+
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import eccodes
+import numpy as np
+
+from .config import VARIABLE_LEVELS, GRIB_SHORT_NAMES
+
+logger = logging.getLogger(__name__)
+
+# Keys used to match a message against VARIABLE_LEVELS
+MATCH_KEYS = ("shortName", "typeOfLevel", "level", "stepType")
+
+# Suffix of the persistent message-offset index written next to a GRIB file
+INDEX_SUFFIX = ".msgidx.json"
+
+class GribField:
+    """
+    A decoded GRIB2 field matched to one of the requested variables.
+
+    values may be cropped to a window of the grid (see crop); origin is the
+    (y, x) grid index of its first cell and shape the full grid's shape.
+    Fields decoded from memory keep their encoded message instead of a
+    file and offset.
+    """
+
+    def __init__(self, variable: str, values: np.ndarray, valid_time: datetime,
+                 step_hours: int, grid_key: str, grib_file: Optional[str], offset: int,
+                 message: Optional[memoryview] = None):
+        self.variable = variable
+        self.values = values
+        self.valid_time = valid_time
+        self.step_hours = step_hours
+        self.grid_key = grid_key
+        self.grib_file = grib_file
+        self.offset = offset
+        self.message = message
+        self.shape = values.shape
+        self.origin = (0, 0)
+
+    def crop(self, y_start: int, y_stop: int, x_start: int, x_stop: int) -> None:
+        """Keep only a window of the grid, releasing the full-resolution array."""
+        self.values = self.values[y_start:y_stop, x_start:x_stop].copy()
+        self.origin = (y_start, x_start)
+
+    def sample(self, y_indices: np.ndarray, x_indices: np.ndarray) -> np.ndarray:
+        """Values at grid cells given as full-grid indices."""
+        return self.values[y_indices - self.origin[0], x_indices - self.origin[1]]
+
+    def grid_coordinates(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Compute the (latitudes, longitudes) of the field's full grid."""
+        if self.message is not None:
+            handle = eccodes.codes_new_from_message(self.message)
+        else:
+            with open(self.grib_file, 'rb') as f:
+                f.seek(self.offset)
+                handle = eccodes.codes_grib_new_from_file(f)
+        try:
+            lats = eccodes.codes_get_array(handle, 'latitudes').reshape(self.shape)
+            lons = eccodes.codes_get_array(handle, 'longitudes').reshape(self.shape)
+        finally:
+            eccodes.codes_release(handle)
+        return lats, lons
+
+def build_match_table(variables: List[str]) -> Dict[Tuple[Any, ...], str]:
+    """Map (shortName, typeOfLevel, level, stepType) tuples to the requested variables."""
+    table = {}
+    for var in variables:
+        level_info = VARIABLE_LEVELS.get(var)
+        short_name = GRIB_SHORT_NAMES.get(var)
+        if not level_info or not short_name:
+            logger.error(f"No GRIB2 message definition for variable {var}")
+            continue
+        table[(short_name, level_info['typeOfLevel'], level_info.get('level'), level_info['stepType'])] = var
+    return table
+
+def match_message(keys: Dict[str, Any], match_table: Dict[Tuple[Any, ...], str]) -> Optional[str]:
+    """Return the variable a message holds, or None if it was not requested."""
+    var = match_table.get((keys["shortName"], keys["typeOfLevel"], keys["level"], keys["stepType"]))
+    if var is None:
+        # Surface-type variables are defined without a level
+        var = match_table.get((keys["shortName"], keys["typeOfLevel"], None, keys["stepType"]))
+    return var
+
+def read_message_keys(handle) -> Dict[str, Any]:
+    """Read the matching keys and byte offset of a message."""
+    keys = {key: eccodes.codes_get(handle, key) for key in MATCH_KEYS}
+    keys["offset"] = eccodes.codes_get_message_offset(handle)
+    return keys
+
+def decode_message(handle, variable: str, grib_file: Optional[str], offset: int,
+                   message: Optional[memoryview] = None) -> GribField:
+    """Decode a message's values as a float32 (y, x) array."""
+    shape = (eccodes.codes_get(handle, 'Nj'), eccodes.codes_get(handle, 'Ni'))
+    values = eccodes.codes_get_values(handle, ktype=np.float32).reshape(shape)
+
+    run_time = datetime.strptime(
+        f"{eccodes.codes_get(handle, 'dataDate')}{eccodes.codes_get(handle, 'dataTime'):04d}", "%Y%m%d%H%M")
+    valid_time = datetime.strptime(
+        f"{eccodes.codes_get(handle, 'validityDate')}{eccodes.codes_get(handle, 'validityTime'):04d}", "%Y%m%d%H%M")
+    step_hours = int((valid_time - run_time).total_seconds() // 3600)
+
+    return GribField(variable, values, valid_time, step_hours,
+                     eccodes.codes_get(handle, 'md5GridSection'), grib_file, offset, message)
+
+def index_path(grib_file: str) -> Path:
+    """Path of the message-offset index for a GRIB file."""
+    return Path(f"{grib_file}{INDEX_SUFFIX}")
+
+def read_message_index(grib_file: str) -> Optional[List[Dict[str, Any]]]:
+    """Load the message-offset index of a file if it exists and matches the file."""
+    path = index_path(grib_file)
+    if not path.exists():
+        return None
+    try:
+        with open(path) as f:
+            index = json.load(f)
+        stat = os.stat(grib_file)
+        if index["size"] != stat.st_size or index["mtime_ns"] != stat.st_mtime_ns:
+            logger.info(f"Message index {path} is stale")
+            return None
+        return index["messages"]
+    except Exception as e:
+        logger.warning(f"Failed to read message index {path}: {str(e)}")
+        return None
+
+def write_message_index(grib_file: str, messages: List[Dict[str, Any]]) -> None:
+    """Write the message-offset index of a file."""
+    path = index_path(grib_file)
+    stat = os.stat(grib_file)
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "messages": messages}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Failed to write message index {path}: {str(e)}")
+
+def decode_fields(grib_file: str, variables: List[str], use_index: bool = False) -> Iterator[GribField]:
+    """
+    Walk a GRIB2 file once and decode only the messages holding the requested variables.
+
+    Each message's keys are matched against VARIABLE_LEVELS; matching
+    messages are decoded as float32 and yielded one at a time, others are
+    skipped without decoding their data section. Each message handle is
+    released before its field is yielded, so only the float32 array stays
+    in memory while the caller works on it. If a variable appears more
+    than once only the first message is used.
+
+    If use_index is True, the offsets of all messages are saved next to the
+    file on the first pass, and later calls seek straight to the matching
+    messages instead of scanning the file.
+    """
+    grib_file = str(grib_file)
+    match_table = build_match_table(variables)
+    remaining = set(match_table.values())
+
+    messages = read_message_index(grib_file) if use_index else None
+
+    with open(grib_file, 'rb') as f:
+        if messages is not None:
+            for keys in messages:
+                var = match_message(keys, match_table)
+                if var not in remaining:
+                    continue
+                f.seek(keys["offset"])
+                handle = eccodes.codes_grib_new_from_file(f)
+                try:
+                    field = decode_message(handle, var, grib_file, keys["offset"])
+                finally:
+                    eccodes.codes_release(handle)
+                remaining.discard(var)
+                yield field
+                field = None
+        else:
+            messages = []
+            while True:
+                handle = eccodes.codes_grib_new_from_file(f)
+                if handle is None:
+                    break
+                field = None
+                try:
+                    keys = read_message_keys(handle)
+                    messages.append(keys)
+                    var = match_message(keys, match_table)
+                    if var in remaining:
+                        remaining.discard(var)
+                        field = decode_message(handle, var, grib_file, keys["offset"])
+                finally:
+                    eccodes.codes_release(handle)
+                if field is not None:
+                    yield field
+                    field = None
+                if not remaining and not use_index:
+                    break
+
+            if use_index:
+                write_message_index(grib_file, messages)
+
+    for var in remaining:
+        logger.error(f"Variable {var} not found in {grib_file}")
+
+def split_messages(buffer: bytes) -> Iterator[memoryview]:
+    """
+    Split a buffer of concatenated GRIB messages into messages.
+
+    Message lengths are read from the indicator section (8 bytes at offset
+    8 in GRIB2, 3 bytes at offset 4 in GRIB1), and each message is a
+    memoryview of the buffer rather than a copy. Bytes between messages
+    are skipped up to the next "GRIB" marker.
+    """
+    view = memoryview(buffer)
+    position = 0
+    while True:
+        position = buffer.find(b"GRIB", position)
+        if position < 0 or position + 16 > len(buffer):
+            return
+        edition = buffer[position + 7]
+        if edition == 2:
+            length = int.from_bytes(buffer[position + 8:position + 16], "big")
+        else:
+            length = int.from_bytes(buffer[position + 4:position + 7], "big")
+        if length < 16 or position + length > len(buffer):
+            logger.error(f"Truncated GRIB message at byte {position}")
+            return
+        yield view[position:position + length]
+        position += length
+
+def decode_messages(buffers: List[bytes], variables: List[str]) -> Iterator[GribField]:
+    """
+    Decode the requested variables from GRIB messages held in memory.
+
+    Like decode_fields, but for buffers fetched straight from S3 (see
+    download.stream_grib_messages): each message is handed to ecCodes with
+    codes_new_from_message, so nothing is written to or read from disk.
+    Messages are passed as views of the buffers; the only copy is the one
+    ecCodes makes into each message handle.
+    """
+    match_table = build_match_table(variables)
+    remaining = set(match_table.values())
+
+    for buffer in buffers:
+        for message in split_messages(buffer):
+            if not remaining:
+                break
+            handle = eccodes.codes_new_from_message(message)
+            field = None
+            try:
+                keys = {key: eccodes.codes_get(handle, key) for key in MATCH_KEYS}
+                var = match_message(keys, match_table)
+                if var in remaining:
+                    remaining.discard(var)
+                    field = decode_message(handle, var, None, 0, message)
+            finally:
+                eccodes.codes_release(handle)
+            if field is not None:
+                yield field
+                field = None
+
+    for var in remaining:
+        logger.error(f"Variable {var} not found in the downloaded messages")
\ No newline at end of file
@@ -2,45 +2,359 @@
 
 import boto3
 import botocore
+import re
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import List, Dict, Any, Optional, Tuple
 import logging
 
-from .config import HRRR_BUCKET
+from .cache import GribCache
+from .catalog import AvailabilityCatalog
+from .config import (HRRR_BUCKET, S3_ENDPOINT_URL, S3_MAX_POOL_CONNECTIONS, STREAM_PART_SIZE, IDX_SEARCH, VARIABLE_LEVELS,
+                     DEFAULT_RUN_HOUR, get_s3_key)
+from .metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+# Forecast descriptions in the .idx inventory for instantaneous fields,
+# e.g. "anl" or "12 hour fcst" (averaged/accumulated fields use "0-1 hour ave fcst")
+INSTANT_FORECAST = re.compile(r"^(anl|\d+ (hour|min) fcst)$")
+
+# Error codes of S3 responses for objects that do not exist (HEAD responses
+# have no body, so they only carry the HTTP status)
+NOT_FOUND_CODES = ("404", "NoSuchKey", "NotFound")
+
+# Chunk size used when streaming ranged GETs to disk
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Client shared by all threads of the process, created on first use
+_S3_CLIENT = None
+_S3_CLIENT_LOCK = threading.Lock()
+
+# Threads issuing the ranged GETs of in-memory downloads, created on first use
+_RANGE_POOL = None
+
 def get_s3_client():
-    """Get an anonymous S3 client."""
-    return boto3.client('s3', config=botocore.config.Config(signature_version=botocore.UNSIGNED))
+    """
+    Get the process's anonymous S3 client.
 
-def check_file_exists(date: str, forecast_hour: int) -> bool:
-    """Check if HRRR file exists in S3."""
-    s3 = get_s3_client()
-    s3_key = f"hrrr.{date}/conus/hrrr.t06z.wrfsfcf{forecast_hour:02d}.grib2"
-    logger.info(f"Checking for file: s3://{HRRR_BUCKET}/{s3_key}")
-    
+    The client is created once and reused, so its connection pool (sized
+    for the download threads) stays warm across requests. boto3 clients
+    are thread-safe, but creating one is not, hence the lock.
+    """
+    global _S3_CLIENT
+    with _S3_CLIENT_LOCK:
+        if _S3_CLIENT is None:
+            _S3_CLIENT = boto3.client('s3', endpoint_url=S3_ENDPOINT_URL,
+                                      config=botocore.config.Config(signature_version=botocore.UNSIGNED,
+                                                                    max_pool_connections=S3_MAX_POOL_CONNECTIONS))
+        return _S3_CLIENT
+
+def get_range_pool() -> ThreadPoolExecutor:
+    """Get the process's pool of threads for concurrent ranged GETs, sized like the connection pool."""
+    global _RANGE_POOL
+    with _S3_CLIENT_LOCK:
+        if _RANGE_POOL is None:
+            _RANGE_POOL = ThreadPoolExecutor(max_workers=S3_MAX_POOL_CONNECTIONS,
+                                             thread_name_prefix="s3-range")
+        return _RANGE_POOL
+
+# Published files of each run, listed once and shared by all threads
+catalog = AvailabilityCatalog(get_s3_client)
+
+def get_file_info(date: str, forecast_hour: int, cycle: int = DEFAULT_RUN_HOUR) -> Optional[Dict[str, Any]]:
+    """
+    Look up an HRRR file in S3.
+
+    The run's listing in the availability catalog is used; if the bucket
+    cannot be listed, the object is checked with a HEAD request instead
+    (see head_file_info), whose errors are raised.
+
+    Returns:
+        Dict with the object's etag and size, or None if it does not exist
+    """
     try:
-        s3.head_object(Bucket=HRRR_BUCKET, Key=s3_key)
-        return True
+        return catalog.get_file_info(date, forecast_hour, cycle)
     except Exception as e:
-        logger.info(f"File not found: {str(e)}")
+        logger.warning(f"Listing failed, falling back to HEAD requests: {str(e)}")
+    return head_file_info(date, forecast_hour, cycle)
+
+def head_file_info(date: str, forecast_hour: int, cycle: int = DEFAULT_RUN_HOUR) -> Optional[Dict[str, Any]]:
+    """
+    Look up an HRRR file with a HEAD request.
+
+    Only a missing object returns None; other errors (e.g. access denied or
+    a network error) are raised, so they are not mistaken for a file that
+    is not published yet.
+    """
+    s3 = get_s3_client()
+    s3_key = get_s3_key(date, forecast_hour, cycle)
+    logger.info(f"Checking for file: s3://{HRRR_BUCKET}/{s3_key}")
+
+    with metrics.stage("s3_head") as stage:
+        try:
+            response = s3.head_object(Bucket=HRRR_BUCKET, Key=s3_key)
+            return {"etag": response["ETag"], "size": response["ContentLength"]}
+        except botocore.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in NOT_FOUND_CODES:
+                raise
+            stage["not_found"] = 1
+            logger.info(f"File not found: {str(e)}")
+            return None
+
+def check_file_exists(date: str, forecast_hour: int, cycle: int = DEFAULT_RUN_HOUR) -> bool:
+    """Check if HRRR file exists in S3."""
+    return get_file_info(date, forecast_hour, cycle) is not None
+
+def parse_idx(text: str) -> List[Dict[str, Any]]:
+    """
+    Parse a wgrib2 inventory (.idx) file.
+
+    Each line looks like ``12:4567890:d=2025050106:TMP:2 m above ground:1 hour fcst:``.
+    The byte range of a message runs from its offset up to the next message's
+    offset; the last message runs to the end of the object (``end`` is None).
+
+    Returns:
+        List of dicts with message, start, end, variable, level and forecast keys
+    """
+    entries = []
+    for line in text.splitlines():
+        fields = line.strip().split(':')
+        if len(fields) < 6:
+            continue
+        entries.append({
+            "message": fields[0],
+            "start": int(fields[1]),
+            "end": None,
+            "variable": fields[3],
+            "level": fields[4],
+            "forecast": fields[5],
+        })
+
+    entries.sort(key=lambda e: e["start"])
+    for entry, next_entry in zip(entries, entries[1:]):
+        entry["end"] = next_entry["start"] - 1
+
+    return entries
+
+def select_idx_entries(entries: List[Dict[str, Any]], variables: List[str]) -> List[Dict[str, Any]]:
+    """Pick the inventory entry holding each requested variable."""
+    selected = []
+    for var in variables:
+        search = IDX_SEARCH.get(var)
+        if not search:
+            logger.error(f"No inventory mapping for variable {var}")
+            continue
+
+        instant = VARIABLE_LEVELS.get(var, {}).get('stepType') == 'instant'
+        matches = [
+            e for e in entries
+            if (e["variable"], e["level"]) == search
+            and (not instant or INSTANT_FORECAST.match(e["forecast"]))
+        ]
+        if not matches:
+            logger.warning(f"Variable {var} ({':'.join(search)}) not found in inventory")
+            continue
+        selected.append(matches[0])
+
+    return selected
+
+def merge_byte_ranges(ranges: List[Tuple[int, Optional[int]]]) -> List[Tuple[int, Optional[int]]]:
+    """Merge adjacent or overlapping inclusive byte ranges. An end of None means end of object."""
+    merged = []
+    for start, end in sorted(set(ranges), key=lambda r: r[0]):
+        if merged:
+            prev_start, prev_end = merged[-1]
+            if prev_end is None or start <= prev_end + 1:
+                if prev_end is not None and (end is None or end > prev_end):
+                    merged[-1] = (prev_start, end)
+                continue
+        merged.append((start, end))
+    return merged
+
+def fetch_idx(s3, s3_key: str) -> Optional[str]:
+    """Fetch the .idx inventory that sits next to a GRIB2 object."""
+    with metrics.stage("s3_idx") as stage:
+        try:
+            response = s3.get_object(Bucket=HRRR_BUCKET, Key=f"{s3_key}.idx")
+            body = response["Body"].read()
+            stage["bytes"] = len(body)
+            return body.decode("utf-8")
+        except Exception as e:
+            stage["errors"] = 1
+            logger.info(f"Inventory not available for {s3_key}: {str(e)}")
+            return None
+
+def download_grib_subset(date: str, forecast_hour: int, variables: List[str], dest: Path,
+                         cycle: int = DEFAULT_RUN_HOUR) -> bool:
+    """
+    Download only the GRIB2 messages holding the requested variables.
+
+    The message byte ranges are looked up in the object's .idx inventory and
+    adjacent ranges are fetched with a single ranged GET. The messages are
+    concatenated into dest, which is itself a valid GRIB2 file.
+
+    Returns:
+        True on success, False if the inventory or a range could not be fetched
+    """
+    s3 = get_s3_client()
+    s3_key = get_s3_key(date, forecast_hour, cycle)
+
+    idx_text = fetch_idx(s3, s3_key)
+    if idx_text is None:
+        return False
+
+    entries = select_idx_entries(parse_idx(idx_text), variables)
+    if not entries:
+        logger.error(f"None of the requested variables found in inventory for {s3_key}")
         return False
 
-def download_grib_file(date: str, forecast_hour: int) -> Optional[Path]:
-    """Download HRRR GRIB2 file from S3 to a temporary file."""
+    ranges = merge_byte_ranges([(e["start"], e["end"]) for e in entries])
+    logger.info(f"Attempting to download {len(entries)} messages in {len(ranges)} ranges: s3://{HRRR_BUCKET}/{s3_key}")
+
+    with metrics.stage("s3_download") as stage:
+        try:
+            with open(dest, 'wb') as f:
+                total_bytes = 0
+                for start, end in ranges:
+                    byte_range = f"bytes={start}-{'' if end is None else end}"
+                    response = s3.get_object(Bucket=HRRR_BUCKET, Key=s3_key, Range=byte_range)
+                    stage["requests"] = stage.get("requests", 0) + 1
+                    for chunk in response["Body"].iter_chunks(DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                        total_bytes += len(chunk)
+                        stage["bytes"] = total_bytes
+            logger.info(f"Successfully downloaded {total_bytes} bytes of {s3_key}")
+            return True
+        except Exception as e:
+            stage["errors"] = 1
+            logger.error(f"Failed to download ranges of {s3_key}: {str(e)}")
+            return False
+
+def download_whole_file(date: str, forecast_hour: int, dest: Path,
+                        cycle: int = DEFAULT_RUN_HOUR) -> bool:
+    """Download a whole HRRR GRIB2 object to dest."""
     s3 = get_s3_client()
-    s3_key = f"hrrr.{date}/conus/hrrr.t06z.wrfsfcf{forecast_hour:02d}.grib2"
+    s3_key = get_s3_key(date, forecast_hour, cycle)
     logger.info(f"Attempting to download: s3://{HRRR_BUCKET}/{s3_key}")
-    
-    try:
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.grib2') as tmp:
-            # Download file
-            s3.download_file(HRRR_BUCKET, s3_key, tmp.name)
+
+    with metrics.stage("s3_download") as stage:
+        try:
+            s3.download_file(HRRR_BUCKET, s3_key, str(dest))
+            stage["requests"] = 1
+            stage["bytes"] = Path(dest).stat().st_size
             logger.info(f"Successfully downloaded {s3_key}")
-            return Path(tmp.name)
+            return True
+        except Exception as e:
+            stage["errors"] = 1
+            logger.error(f"Failed to download {s3_key}: {str(e)}")
+            return False
+
+def download_grib_file(date: str, forecast_hour: int,
+                       variables: Optional[List[str]] = None,
+                       cache: Optional[GribCache] = None,
+                       etag: Optional[str] = None,
+                       cycle: int = DEFAULT_RUN_HOUR) -> Optional[Path]:
+    """
+    Download HRRR GRIB2 file from S3.
+
+    If variables are given, only their messages are fetched using byte-range
+    requests; the whole object is downloaded if the inventory is unavailable.
+
+    If a cache and the object's ETag are given, the file is looked up in
+    (and stored into) the cache; otherwise it is written to a temporary
+    file that the caller is responsible for removing.
+    """
+    def download(dest: Path) -> bool:
+        if variables:
+            if download_grib_subset(date, forecast_hour, variables, dest, cycle):
+                return True
+            logger.warning(f"Falling back to full download for {date} {cycle:02d}z hour {forecast_hour}")
+        return download_whole_file(date, forecast_hour, dest, cycle)
+
+    if cache is not None and etag:
+        key = GribCache.make_key(get_s3_key(date, forecast_hour, cycle), etag, variables)
+        return cache.fetch(key, download)
+
+    # Create temporary file
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.grib2') as tmp:
+        tmp_path = Path(tmp.name)
+    if not download(tmp_path):
+        tmp_path.unlink(missing_ok=True)
+        return None
+    return tmp_path
+
+
+def fetch_range(s3_key: str, start: int, end: Optional[int]) -> bytes:
+    """Fetch an inclusive byte range of an object into memory. An end of None means end of object."""
+    byte_range = f"bytes={start}-{'' if end is None else end}"
+    response = get_s3_client().get_object(Bucket=HRRR_BUCKET, Key=s3_key, Range=byte_range)
+    return response["Body"].read()
+
+def fetch_ranges(s3_key: str, ranges: List[Tuple[int, Optional[int]]]) -> List[bytes]:
+    """
+    Fetch byte ranges of an object concurrently into memory.
+
+    Returns:
+        The bytes of each range, in the order of ranges
+    """
+    futures = []
+    with metrics.stage("s3_download") as stage:
+        try:
+            futures = [get_range_pool().submit(fetch_range, s3_key, start, end) for start, end in ranges]
+            buffers = [future.result() for future in futures]
+        except Exception:
+            stage["errors"] = 1
+            for future in futures:
+                future.cancel()
+            raise
+        stage["requests"] = len(ranges)
+        stage["bytes"] = sum(len(buffer) for buffer in buffers)
+    return buffers
+
+def split_byte_range(size: int, part_size: int = STREAM_PART_SIZE) -> List[Tuple[int, Optional[int]]]:
+    """Split an object of size bytes into inclusive ranges of part_size bytes."""
+    return [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+def stream_grib_messages(date: str, forecast_hour: int,
+                         variables: Optional[List[str]] = None,
+                         size: Optional[int] = None,
+                         cycle: int = DEFAULT_RUN_HOUR) -> Optional[List[bytes]]:
+    """
+    Download HRRR GRIB2 messages straight into memory.
+
+    The counterpart of download_grib_file for diskless ingestion: if
+    variables are given, their messages are fetched with one ranged GET per
+    merged range, all in flight at once; otherwise (or if the inventory is
+    unavailable) the whole object is fetched in parts of STREAM_PART_SIZE
+    bytes when its size is known. Nothing is written to disk.
+
+    Returns:
+        Buffers of whole GRIB2 messages (see decode.decode_messages), or None on failure
+    """
+    s3_key = get_s3_key(date, forecast_hour, cycle)
+
+    if variables:
+        idx_text = fetch_idx(get_s3_client(), s3_key)
+        entries = select_idx_entries(parse_idx(idx_text), variables) if idx_text is not None else []
+        if entries:
+            ranges = merge_byte_ranges([(e["start"], e["end"]) for e in entries])
+            logger.info(f"Streaming {len(entries)} messages in {len(ranges)} ranges: s3://{HRRR_BUCKET}/{s3_key}")
+            try:
+                return fetch_ranges(s3_key, ranges)
+            except Exception as e:
+                logger.error(f"Failed to stream ranges of {s3_key}: {str(e)}")
+                return None
+        logger.warning(f"Falling back to streaming all of {date} {cycle:02d}z hour {forecast_hour}")
+
+    ranges = split_byte_range(size) if size else [(0, None)]
+    logger.info(f"Streaming {len(ranges)} parts: s3://{HRRR_BUCKET}/{s3_key}")
+    try:
+        parts = fetch_ranges(s3_key, ranges)
     except Exception as e:
-        logger.error(f"Failed to download {s3_key}: {str(e)}")
-        return None 
\ No newline at end of file
+        logger.error(f"Failed to stream {s3_key}: {str(e)}")
+        return None
+    # Messages may straddle parts, so they are joined into one buffer
+    return [b"".join(parts)] if len(parts) > 1 else parts
\ No newline at end of file
@@ -0,0 +1,171 @@
+"""On-disk cache of decoded GRIB fields as memory-mapped NumPy arrays."""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Tuple
+
+import numpy as np
+
+from .cache import EVICTION_GRACE_SECONDS, file_lock
+from .config import FIELD_CACHE_DIR, FIELD_CACHE_MAX_BYTES
+from .decode import GribField
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Suffix of cached field arrays; each has a JSON sidecar with its metadata
+FIELD_SUFFIX = ".npy"
+META_SUFFIX = ".json"
+
+class FieldKey(NamedTuple):
+    """
+    Identifies the decoded fields of one published GRIB file.
+
+    The ETag is part of the key, so a re-published file never hits fields
+    decoded from the previous version.
+    """
+    run_time: datetime
+    forecast_hour: int
+    etag: str
+
+    def dirname(self) -> str:
+        """Relative directory holding the key's fields."""
+        etag = hashlib.sha256(self.etag.strip('"').encode()).hexdigest()[:16]
+        return f"{self.run_time.strftime('%Y%m%d')}/{self.run_time.hour:02d}z/f{self.forecast_hour:02d}-{etag}"
+
+class CachedField(GribField):
+    """A field read back from the cache; values is a read-only memory map."""
+
+    def __init__(self, variable: str, values: np.ndarray, valid_time: datetime,
+                 step_hours: int, grid_key: str, grid_path: Path):
+        super().__init__(variable, values, valid_time, step_hours, grid_key, str(grid_path), 0)
+        self.grid_path = grid_path
+
+    def grid_coordinates(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Load the (latitudes, longitudes) of the field's grid saved next to the fields."""
+        with np.load(self.grid_path) as grid:
+            return grid["latitudes"], grid["longitudes"]
+
+class FieldCache:
+    """
+    Directory of decoded fields, one float32 .npy file per (run, forecast
+    hour, ETag, variable), with a byte budget and LRU eviction.
+
+    Fields are written when a GRIB file is decoded and read back with
+    np.load(mmap_mode='r'), so extracting new points from an already
+    ingested run only pages in the grid cells they fall on, with no
+    download and no decoding. The coordinates of each grid are saved once,
+    so grid indexes can be rebuilt without the GRIB file. Files are written
+    to a temporary name and renamed into place, so several processes can
+    share a directory. Like GribCache, recency is tracked with explicitly
+    set access times.
+    """
+
+    def __init__(self, cache_dir: Path = FIELD_CACHE_DIR, max_bytes: int = FIELD_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+    def path_for(self, key: FieldKey, variable: str) -> Path:
+        """Location of a cached field array."""
+        return self.cache_dir / key.dirname() / f"{variable}{FIELD_SUFFIX}"
+
+    def grid_path(self, grid_key: str) -> Path:
+        """Location of the saved coordinates of a grid."""
+        return self.cache_dir / "grids" / f"{grid_key}.npz"
+
+    def has(self, key: FieldKey, variables: List[str]) -> bool:
+        """Whether every requested variable of a file is cached, with its metadata."""
+        paths = [self.path_for(key, var) for var in variables]
+        return all(path.exists() and path.with_suffix(META_SUFFIX).exists() for path in paths)
+
+    def put(self, key: FieldKey, field: GribField) -> None:
+        """Save a freshly decoded (uncropped) field and, the first time, its grid coordinates."""
+        path = self.path_for(key, field.variable)
+        grid_path = self.grid_path(field.grid_key)
+        try:
+            if not grid_path.exists():
+                lats, lons = field.grid_coordinates()
+                grid_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_grid = grid_path.with_name(f"{grid_path.name}.{os.getpid()}.tmp")
+                with open(tmp_grid, 'wb') as f:
+                    np.savez(f, latitudes=lats, longitudes=lons)
+                os.replace(tmp_grid, grid_path)
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.asarray(field.values, dtype=np.float32))
+            meta_path = path.with_suffix(META_SUFFIX)
+            tmp_meta = meta_path.with_name(f"{meta_path.name}.{os.getpid()}.tmp")
+            tmp_meta.write_text(json.dumps({
+                "valid_time": field.valid_time.isoformat(),
+                "step_hours": field.step_hours,
+                "grid_key": field.grid_key,
+            }))
+            # The metadata goes in first, so an array is never found without it
+            os.replace(tmp_meta, meta_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to cache decoded field {path}: {str(e)}")
+            return
+        metrics.count("field_cache", writes=1, written_bytes=path.stat().st_size)
+
+    def load(self, key: FieldKey, variables: List[str]) -> Iterator[GribField]:
+        """
+        Yield the cached fields of a file as memory-mapped arrays and mark them as recently used.
+
+        Variables missing from the cache (e.g. evicted since has() was
+        called) are logged and skipped.
+        """
+        for var in variables:
+            path = self.path_for(key, var)
+            try:
+                meta = json.loads(path.with_suffix(META_SUFFIX).read_text())
+                values = np.load(path, mmap_mode='r')
+                os.utime(path, ns=(time.time_ns(), path.stat().st_mtime_ns))
+            except (OSError, ValueError) as e:
+                logger.error(f"Cached field {path} is unavailable: {str(e)}")
+                continue
+            metrics.count("field_cache", reads=1)
+            yield CachedField(var, values, datetime.fromisoformat(meta["valid_time"]),
+                              meta["step_hours"], meta["grid_key"], self.grid_path(meta["grid_key"]))
+
+    def entries(self) -> List[Path]:
+        """All cached field arrays."""
+        if not self.cache_dir.exists():
+            return []
+        return list(self.cache_dir.glob(f"*/*/*/*{FIELD_SUFFIX}"))
+
+    def evict(self) -> int:
+        """
+        Remove least recently used fields until the cache fits its budget.
+
+        Grid coordinates are kept. Returns the number of bytes freed.
+        """
+        with file_lock(self.cache_dir / '.lock'):
+            stats = []
+            for path in self.entries():
+                try:
+                    stats.append((path, path.stat()))
+                except FileNotFoundError:
+                    continue
+
+            total = sum(st.st_size for _, st in stats)
+            cutoff = time.time() - EVICTION_GRACE_SECONDS
+            freed = 0
+            for path, st in sorted(stats, key=lambda item: item[1].st_atime):
+                if total - freed <= self.max_bytes or st.st_atime > cutoff:
+                    break
+                path.unlink(missing_ok=True)
+                path.with_suffix(META_SUFFIX).unlink(missing_ok=True)
+                freed += st.st_size
+                metrics.count("field_cache", evictions=1, evicted_bytes=st.st_size)
+
+        if freed:
+            logger.info(f"Evicted {freed / 1024 ** 2:.0f} MB of cached fields")
+        return freed
\ No newline at end of file
@@ -0,0 +1,127 @@
+"""Persistent spatial index for nearest-grid-point lookup."""
+
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .config import GRID_INDEX_DIR
+
+logger = logging.getLogger(__name__)
+
+# Indexes already loaded in this process, keyed by grid hash
+_INDEX_CACHE: Dict[str, "GridIndex"] = {}
+
+def grid_hash(lats: np.ndarray, lons: np.ndarray) -> str:
+    """Hash the geometry of a lat/lon grid (shape and coordinates)."""
+    digest = hashlib.sha1()
+    digest.update(str(lats.shape).encode())
+    digest.update(np.ascontiguousarray(lats, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(lons, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+def to_unit_vectors(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Convert latitudes/longitudes in degrees to 3D unit vectors on the sphere."""
+    lat_rad = np.radians(np.asarray(lats, dtype=np.float64)).ravel()
+    lon_rad = np.radians(np.asarray(lons, dtype=np.float64)).ravel()
+    cos_lat = np.cos(lat_rad)
+    return np.column_stack((cos_lat * np.cos(lon_rad), cos_lat * np.sin(lon_rad), np.sin(lat_rad)))
+
+class GridIndex:
+    """
+    KD-tree over the cells of a 2D lat/lon grid.
+
+    Cells are stored as 3D unit vectors, so the nearest neighbour by chord
+    distance is the nearest cell by great-circle distance, independent of
+    the longitude convention (-180/180 or 0/360) of the grid or the points.
+    """
+
+    def __init__(self, tree: cKDTree, shape: Tuple[int, int]):
+        self.tree = tree
+        self.shape = shape
+
+    @classmethod
+    def build(cls, lats: np.ndarray, lons: np.ndarray) -> "GridIndex":
+        """Build an index for a grid."""
+        return cls(cKDTree(to_unit_vectors(lats, lons)), lats.shape)
+
+    def query(self, points: Union[List[Tuple[float, float]], np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the nearest grid cell for every point in one batched query.
+
+        Args:
+            points: List of (latitude, longitude) pairs or an (N, 2) array
+
+        Returns:
+            Tuple of (y_idx, x_idx) integer arrays, one entry per point
+        """
+        coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        _, flat_idx = self.tree.query(to_unit_vectors(coords[:, 0], coords[:, 1]))
+        y_idx, x_idx = np.unravel_index(flat_idx, self.shape)
+        return y_idx, x_idx
+
+    def save(self, path: Path) -> None:
+        """Write the index to disk atomically."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((self.tree, self.shape), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    @classmethod
+    def load(cls, path: Path) -> "GridIndex":
+        """Read an index written by save()."""
+        with open(path, 'rb') as f:
+            tree, shape = pickle.load(f)
+        return cls(tree, shape)
+
+def get_grid_index(key: str, load_coordinates: Callable[[], Tuple[np.ndarray, np.ndarray]],
+                   index_dir: Optional[Path] = GRID_INDEX_DIR) -> GridIndex:
+    """
+    Get the index for a grid, building it only once per grid definition.
+
+    Args:
+        key: Hash identifying the grid geometry (e.g. eccodes md5GridSection,
+            or grid_hash of the coordinates)
+        load_coordinates: Returns (latitudes, longitudes) 2D arrays; only
+            called if the index has to be built
+        index_dir: Directory holding saved indexes, or None to keep them
+            in memory only
+
+    Indexes are cached in memory and on disk under a file named after the
+    key, so later runs skip the build.
+    """
+    index = _INDEX_CACHE.get(key)
+    if index is not None:
+        return index
+
+    path = Path(index_dir) / f"{key}.pkl" if index_dir is not None else None
+    if path is not None and path.exists():
+        try:
+            index = GridIndex.load(path)
+            logger.info(f"Loaded grid index {key}")
+        except Exception as e:
+            logger.warning(f"Failed to load grid index {path}: {str(e)}")
+
+    if index is None:
+        lats, lons = load_coordinates()
+        logger.info(f"Building grid index for {lats.shape[0]}x{lats.shape[1]} grid {key}")
+        index = GridIndex.build(lats, lons)
+        if path is not None:
+            try:
+                index.save(path)
+            except OSError as e:
+                logger.warning(f"Failed to save grid index {path}: {str(e)}")
+
+    _INDEX_CACHE[key] = index
+    return index
@@ -0,0 +1,191 @@
+"""Per-stage timing and throughput instrumentation."""
+
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Prefix of exported Prometheus metric names
+METRIC_PREFIX = "hrrr_ingest"
+
+class RunMetrics:
+    """
+    Accumulates wall time, CPU time and counters per stage and work unit.
+
+    Instrumented code wraps each stage in stage(), which attributes it to
+    the work unit (e.g. a forecast hour) set with unit() in the current
+    thread. Counters such as bytes, messages or rows are added to the dict
+    yielded by stage(). Records from worker processes are collected with
+    drain() and merged into the parent's metrics with merge().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stages: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self.profiles: List[Dict[Any, Any]] = []
+        self.started = datetime.now()
+
+    @contextmanager
+    def unit(self, label: str) -> Iterator[None]:
+        """Attribute stages run by this thread to a work unit."""
+        previous = getattr(self._local, "unit", None)
+        self._local.unit = label
+        try:
+            yield
+        finally:
+            self._local.unit = previous
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Dict[str, float]]:
+        """Time a stage; counters added to the yielded dict are accumulated with it."""
+        counters: Dict[str, float] = {}
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield counters
+        finally:
+            counters["calls"] = 1
+            counters["wall_seconds"] = time.perf_counter() - wall_start
+            counters["cpu_seconds"] = time.thread_time() - cpu_start
+            self.add(name, getattr(self._local, "unit", None) or "", counters)
+
+    def count(self, name: str, **counters: float) -> None:
+        """Add untimed counters (e.g. cache hits) to a stage of the current unit."""
+        self.add(name, getattr(self._local, "unit", None) or "", counters)
+
+    def add(self, name: str, unit: str, counters: Dict[str, float]) -> None:
+        """Accumulate counters for a stage and unit."""
+        with self._lock:
+            totals = self._stages.setdefault((name, unit), {})
+            for key, value in counters.items():
+                totals[key] = totals.get(key, 0) + value
+
+    def drain(self) -> List[Tuple[str, str, Dict[str, float]]]:
+        """Return and clear all records (used to ship them out of worker processes)."""
+        with self._lock:
+            records = [(name, unit, totals) for (name, unit), totals in self._stages.items()]
+            self._stages = {}
+        return records
+
+    def merge(self, records: List[Tuple[str, str, Dict[str, float]]]) -> None:
+        """Add records drained from another RunMetrics."""
+        for name, unit, counters in records:
+            self.add(name, unit, counters)
+
+    def fold_units(self) -> None:
+        """
+        Fold the per-unit records into one record per stage.
+
+        Stage totals are unchanged but the per-unit breakdown is dropped, so
+        a long-running process (see watch.Watcher) keeps one record per
+        stage instead of one per forecast hour it ever ingested.
+        """
+        with self._lock:
+            folded: Dict[Tuple[str, str], Dict[str, float]] = {}
+            for (name, _), counters in self._stages.items():
+                totals = folded.setdefault((name, ""), {})
+                for key, value in counters.items():
+                    totals[key] = totals.get(key, 0) + value
+            self._stages = folded
+
+    def reset(self) -> None:
+        """Clear all records and restart the run clock."""
+        self.drain()
+        self.profiles = []
+        self.started = datetime.now()
+
+    def stage_totals(self) -> Dict[str, Dict[str, float]]:
+        """Counters per stage, summed over all units."""
+        totals: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            for (name, _), counters in self._stages.items():
+                stage = totals.setdefault(name, {})
+                for key, value in counters.items():
+                    stage[key] = stage.get(key, 0) + value
+        return totals
+
+    def report(self) -> Dict[str, Any]:
+        """Run report with per-stage totals and per-unit breakdown."""
+        finished = datetime.now()
+        units: Dict[str, Dict[str, Dict[str, float]]] = {}
+        with self._lock:
+            for (name, unit), counters in sorted(self._stages.items()):
+                units.setdefault(unit or "run", {})[name] = dict(counters)
+
+        return {
+            "started": self.started.isoformat(),
+            "finished": finished.isoformat(),
+            "wall_seconds": (finished - self.started).total_seconds(),
+            "stages": self.stage_totals(),
+            "units": units,
+        }
+
+    def write_json(self, path: Path) -> None:
+        """Write the run report as JSON."""
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def prometheus_text(self) -> str:
+        """Per-stage totals in the Prometheus text exposition format."""
+        report = self.report()
+        by_metric: Dict[str, List[str]] = {}
+        for stage, counters in sorted(report["stages"].items()):
+            for key, value in sorted(counters.items()):
+                by_metric.setdefault(key, []).append(f'{{stage="{stage}"}} {value}')
+
+        lines = [
+            f"# HELP {METRIC_PREFIX}_run_wall_seconds Wall time of the last run",
+            f"# TYPE {METRIC_PREFIX}_run_wall_seconds gauge",
+            f"{METRIC_PREFIX}_run_wall_seconds {report['wall_seconds']}",
+        ]
+        for key, samples in sorted(by_metric.items()):
+            metric = f"{METRIC_PREFIX}_stage_{key}_total"
+            lines.append(f"# HELP {metric} Total {key.replace('_', ' ')} per ingest stage")
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(f"{metric}{sample}" for sample in samples)
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Path) -> None:
+        """Write per-stage totals as a Prometheus text file (e.g. for the node_exporter textfile collector)."""
+        tmp_path = Path(f"{path}.tmp")
+        tmp_path.write_text(self.prometheus_text())
+        tmp_path.replace(path)
+
+class ProfileStats:
+    """
+    cProfile results of a worker process in a picklable form.
+
+    pstats.Stats accepts any object with a stats dict and a create_stats()
+    method, so worker profiles can be merged with the main process's.
+    """
+
+    def __init__(self, stats: Dict[Any, Any]):
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        pass
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process so far, or None where it cannot be measured."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+# Metrics of the current process
+metrics = RunMetrics()
+
+def reset_metrics() -> None:
+    """Clear this process's metrics (process pool initializer, so forked workers start empty)."""
+    metrics.reset()
\ No newline at end of file
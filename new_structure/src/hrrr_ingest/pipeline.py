@@ -0,0 +1,428 @@
+"""Concurrent download/decode/insert pipeline across forecast hours and runs."""
+
+import cProfile
+import logging
+import signal
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Set, Tuple, Optional, Iterable, Sequence, Union
+
+import pyarrow as pa
+
+from . import config
+from .cache import GribCache
+from .database import FORECAST_SCHEMA, MANIFEST_COMPLETE, MANIFEST_FAILED, MANIFEST_STARTED, DatabaseSession
+from .decode import GribField, decode_fields, decode_messages
+from .download import download_grib_file, get_file_info, stream_grib_messages
+from .field_cache import FieldCache, FieldKey
+from .metrics import metrics, peak_rss_bytes, reset_metrics
+from .points import PointSource
+from .process import iter_forecast_batches
+from .scheduler import WorkUnit
+
+logger = logging.getLogger(__name__)
+
+def init_decode_worker() -> None:
+    """
+    Initialize a decode worker process.
+
+    Workers start with empty metrics and ignore SIGINT/SIGTERM, so a
+    signal sent to the whole process group lets the main process shut the
+    pool down cleanly instead of killing tasks midway.
+    """
+    reset_metrics()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+def make_decode_pool(decode_workers: int) -> ProcessPoolExecutor:
+    """Process pool for decode_forecast_hour tasks."""
+    return ProcessPoolExecutor(max_workers=decode_workers, initializer=init_decode_worker)
+
+class FetchedHour(NamedTuple):
+    """
+    Result of the download stage for one forecast hour.
+
+    grib_file is None when every requested field is in the field cache
+    under field_key, so nothing was downloaded, or when the GRIB data was
+    streamed into memory as messages; num_bytes is the size of the GRIB
+    data otherwise.
+    """
+    grib_file: Optional[Path]
+    field_key: FieldKey
+    num_bytes: int = 0
+    messages: Optional[List[bytes]] = None
+
+def fetch_forecast_hour(unit: WorkUnit, variables: List[str],
+                        cache: Optional[GribCache] = None,
+                        partial_download: bool = True,
+                        field_cache: Optional[FieldCache] = None,
+                        stream: bool = False) -> Optional[FetchedHour]:
+    """
+    Download stage: check availability and download (or find in the caches) the GRIB file for one forecast hour.
+
+    With stream set, the GRIB messages are fetched into memory instead
+    (see download.stream_grib_messages) and the GRIB cache is not used.
+
+    Returns:
+        The downloaded (or cached) hour, or None if the file is not
+        published or could not be downloaded
+    """
+    with metrics.unit(str(unit)):
+        file_info = get_file_info(unit.date_str, unit.forecast_hour, unit.cycle)
+        if file_info is None:
+            logger.warning(f"No data available for {unit}")
+            return None
+
+        field_key = FieldKey(unit.run_time, unit.forecast_hour, file_info["etag"])
+        if field_cache is not None:
+            if field_cache.has(field_key, variables):
+                metrics.count("field_cache", hits=1)
+                logger.info(f"Using cached decoded fields for {unit}")
+                return FetchedHour(None, field_key)
+            metrics.count("field_cache", misses=1)
+
+        if stream:
+            messages = stream_grib_messages(unit.date_str, unit.forecast_hour,
+                                            variables if partial_download else None,
+                                            size=file_info.get("size"), cycle=unit.cycle)
+            if messages is None:
+                logger.error(f"Failed to stream GRIB messages for {unit}")
+                return None
+            return FetchedHour(None, field_key, sum(len(m) for m in messages), messages)
+
+        grib_file = download_grib_file(unit.date_str, unit.forecast_hour,
+                                       variables if partial_download else None,
+                                       cache=cache, etag=file_info["etag"], cycle=unit.cycle)
+    if not grib_file:
+        logger.error(f"Failed to download GRIB file for {unit}")
+        return None
+    return FetchedHour(grib_file, field_key, Path(grib_file).stat().st_size)
+
+def spool_batches(batches: Iterator[pa.Table]) -> Path:
+    """Write forecast batches to a temporary Arrow IPC stream file and return its path."""
+    fd, path = tempfile.mkstemp(prefix="hrrr_rows_", suffix=".arrows", dir=config.SPOOL_DIR)
+    try:
+        with open(fd, 'wb') as sink, pa.ipc.new_stream(sink, FORECAST_SCHEMA) as writer:
+            for batch in batches:
+                writer.write_table(batch)
+    except BaseException:
+        Path(path).unlink(missing_ok=True)
+        raise
+    return Path(path)
+
+def read_results(results: Union[pa.Table, Path]) -> Iterator[pa.Table]:
+    """Iterate over the batches of a decode result, removing a spool file once it is read."""
+    if isinstance(results, pa.Table):
+        yield results
+        return
+    try:
+        with pa.ipc.open_stream(pa.OSFile(str(results))) as reader:
+            for batch in reader:
+                yield pa.Table.from_batches([batch])
+    finally:
+        results.unlink(missing_ok=True)
+
+def track_variables(fields: Iterator[GribField], decoded: Set[str]) -> Iterator[GribField]:
+    """Pass fields through, adding the variable of each one to decoded."""
+    for field in fields:
+        decoded.add(field.variable)
+        yield field
+
+def decode_forecast_hour(grib_file: Optional[Path], points: PointSource,
+                         variables: List[str], run_time: datetime, cached: bool,
+                         unit_label: str = "", profile: bool = False, low_memory: bool = False,
+                         field_cache: Optional[FieldCache] = None, field_key: Optional[FieldKey] = None,
+                         messages: Optional[List[bytes]] = None) -> Tuple[Union[pa.Table, Path], Set[str],
+                                    List[Tuple[str, str, Dict[str, float]]],
+                                    Optional[Dict[Any, Any]], Optional[int]]:
+    """
+    Decode stage: extract point values from a downloaded GRIB file.
+
+    Runs in a worker process and never touches the database; the writer
+    skips rows that already exist when inserting. Cached files keep a
+    message index for the next run; temporary files are removed.
+
+    Points are read from their source in chunks and only their coordinates
+    are kept. If they fit in one chunk, the rows are returned in memory;
+    otherwise each decoded field is extracted chunk by chunk into a spool
+    file (see spool_batches), so neither this worker nor the writer holds
+    more than a chunk of rows at once. With low_memory set, fields are
+    also cropped to the points' bounding box as soon as they are decoded.
+
+    If messages are given (see fetch_forecast_hour), they are decoded from
+    memory instead of grib_file. With a field cache, decoded fields are
+    saved under field_key; if there is neither a grib_file nor messages,
+    the fields are read from the cache instead.
+
+    Returns:
+        Tuple of (forecast rows or the path of their spool file, variables
+        that were decoded, metrics recorded in this worker, cProfile stats
+        if profile is set, peak RSS of this worker in bytes if it can be
+        measured)
+    """
+    profiler = cProfile.Profile() if profile else None
+    try:
+        with metrics.unit(unit_label):
+            if profiler is not None:
+                profiler.enable()
+            try:
+                chunks = points.coordinate_chunks()
+                decoded: Set[str] = set()
+                if messages is not None:
+                    batches = iter_forecast_batches(None, chunks, variables, run_time, low_memory=low_memory,
+                                                    field_cache=field_cache, field_key=field_key,
+                                                    fields=track_variables(decode_messages(messages, variables),
+                                                                           decoded))
+                elif grib_file is None:
+                    batches = iter_forecast_batches(None, chunks, variables, run_time, low_memory=low_memory,
+                                                    fields=track_variables(field_cache.load(field_key, variables),
+                                                                           decoded))
+                else:
+                    fields = decode_fields(str(grib_file), variables, use_index=cached)
+                    batches = iter_forecast_batches(str(grib_file), chunks, variables, run_time,
+                                                    low_memory=low_memory,
+                                                    field_cache=field_cache, field_key=field_key,
+                                                    fields=track_variables(fields, decoded))
+                if len(chunks) > 1:
+                    results = spool_batches(batches)
+                else:
+                    results = pa.concat_tables(list(batches) or [FORECAST_SCHEMA.empty_table()])
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+    finally:
+        if grib_file is not None and not cached:
+            Path(grib_file).unlink(missing_ok=True)
+
+    if profiler is not None:
+        profiler.create_stats()
+    return results, decoded, metrics.drain(), profiler.stats if profiler is not None else None, peak_rss_bytes()
+
+def decode_slot_count(decode_memory_budget: Optional[int], decode_peak_rss: Optional[int], pending: int) -> int:
+    """
+    Number of decodes that may run at once.
+
+    Without a memory budget all pending decodes run. With one, at most
+    budget // (largest worker peak RSS seen) run, and a single one until
+    the first peak is known.
+    """
+    if decode_memory_budget is None:
+        return pending
+    if decode_peak_rss is None:
+        return 1
+    return max(1, decode_memory_budget // decode_peak_rss)
+
+def run_pipeline(units: Iterable[WorkUnit],
+                 points: Union[PointSource, Sequence[Tuple[float, float]]], variables: List[str],
+                 download_workers: int = 4, decode_workers: int = 2,
+                 partial_download: bool = True,
+                 cache: Optional[GribCache] = None,
+                 max_in_flight: Optional[int] = None,
+                 session: Optional[DatabaseSession] = None,
+                 profile: bool = False,
+                 download_pool: Optional[ThreadPoolExecutor] = None,
+                 decode_pool: Optional[ProcessPoolExecutor] = None,
+                 on_complete: Optional[Callable[[WorkUnit, int, int], None]] = None,
+                 low_memory: bool = False,
+                 decode_memory_budget: Optional[int] = None,
+                 field_cache: Optional[FieldCache] = None,
+                 points_hash: Optional[str] = None,
+                 skip_completed: bool = True,
+                 stream: bool = False) -> Tuple[int, int]:
+    """
+    Ingest work units with overlapping download, decode and insert stages.
+
+    Downloads run in a thread pool, decoding runs in a process pool and the
+    calling thread is the single writer that owns the database session
+    (opened for the run unless one is given). Each forecast hour is
+    inserted in its own transaction, one chunk of points at a time when the
+    points do not fit in one chunk (see decode_forecast_hour).
+    Units are started in the order given (see scheduler.order_work_units).
+    The number of units in flight (downloading, downloaded or being
+    decoded) is capped by max_in_flight, which defaults to
+    download_workers + 2 * decode_workers, so a slow stage applies
+    backpressure to the stages in front of it instead of letting files and
+    results pile up.
+
+    With decode_memory_budget (bytes) set, downloaded files wait until the
+    decodes already running fit in the budget: each worker reports its
+    peak RSS with its results, and at most budget // (largest peak seen)
+    decodes run at once (a single one until the first peak is known).
+    low_memory makes workers crop fields to the points' bounding box (see
+    process.iter_forecast_batches).
+
+    With a field_cache, forecast hours whose decoded fields are all cached
+    are neither downloaded nor decoded again; their points are read from
+    the memory-mapped fields. Other hours save their fields while being
+    decoded, and the cache is trimmed to its budget at the end.
+
+    With a points_hash (see points.PointSource.fingerprint), every file is
+    tracked in the ingest manifest: it is marked started when it is queued,
+    complete in the same transaction that inserts its rows and failed if
+    it cannot be decoded. Files the manifest already records as complete
+    for the variables and point set are skipped before any network or
+    decode work, unless skip_completed is False; files left started or
+    failed by an interrupted run are ingested again.
+
+    With stream set, GRIB messages are fetched into memory with concurrent
+    ranged GETs and handed to the decode workers as buffers, so nothing is
+    written to or read back from disk (the GRIB cache is bypassed).
+
+    session may also be a staging.ShardWriter, which writes each file's
+    rows to a Parquet shard to be merged later instead of inserting them.
+
+    Files are kept in the cache if one is given, and deleted after decoding
+    otherwise. Long-running callers can pass their own pools (see
+    make_decode_pool) so worker processes and their in-memory grid indexes
+    stay warm between calls; pools created here are shut down on return.
+    on_complete is called with (unit, inserted, skipped) once a unit's rows
+    are committed; units that fail to download (including files that are
+    not published) or decode are logged, counted as failures of their
+    s3_download or grib_decode stage and marked failed in the manifest,
+    and the other units carry on. A file that lacks some of the requested
+    variables has the rows it does hold inserted, but is counted as
+    incomplete and marked failed, so a later run ingests it again.
+
+    Stage timings and counters are recorded per forecast hour in
+    metrics.metrics; decode workers send theirs back with their results.
+    With profile set, decode workers also run under cProfile and their
+    stats are collected in metrics.metrics.profiles.
+
+    Returns:
+        Tuple of (inserted, skipped) record counts
+    """
+    if not isinstance(points, PointSource):
+        points = PointSource.from_points(points)
+    # Parse a points file before it is sent to the decode workers, which map the result
+    points.load()
+    if max_in_flight is None:
+        max_in_flight = download_workers + 2 * decode_workers
+    total_inserted = 0
+    total_skipped = 0
+
+    owns_session = session is None
+    if owns_session:
+        session = DatabaseSession()
+    try:
+        units = list(units)
+        if points_hash is not None and skip_completed:
+            completed = session.completed_files([u.s3_key for u in units], variables, points_hash)
+            if completed:
+                logger.info(f"Skipping {len(completed)} forecast files already ingested for these points and variables")
+                units = [u for u in units if u.s3_key not in completed]
+        pending_units = iter(units)
+        with ExitStack() as pools:
+            if download_pool is None:
+                download_pool = pools.enter_context(ThreadPoolExecutor(max_workers=download_workers))
+            if decode_pool is None:
+                decode_pool = pools.enter_context(make_decode_pool(decode_workers))
+            downloads = {}
+            decodes = {}
+            # Downloaded files waiting for the decode memory budget
+            ready = deque()
+            decode_peak_rss = None
+
+            def decode_slots() -> int:
+                return decode_slot_count(decode_memory_budget, decode_peak_rss, len(decodes) + len(ready))
+
+            def submit_decodes():
+                while ready and len(decodes) < decode_slots():
+                    unit, fetched = ready.popleft()
+                    logger.info(f"Processing forecast for {unit}")
+                    decodes[decode_pool.submit(
+                        decode_forecast_hour, fetched.grib_file, points, variables, unit.run_time,
+                        cache is not None, str(unit), profile, low_memory,
+                        field_cache, fetched.field_key, fetched.messages)] = (unit, fetched._replace(messages=None))
+
+            def submit_downloads():
+                while len(downloads) + len(ready) + len(decodes) < max_in_flight:
+                    unit = next(pending_units, None)
+                    if unit is None:
+                        return
+                    if points_hash is not None:
+                        session.record_file(unit.s3_key, variables, points_hash, MANIFEST_STARTED)
+                    future = download_pool.submit(
+                        fetch_forecast_hour, unit, variables, cache, partial_download, field_cache, stream)
+                    downloads[future] = unit
+
+            submit_downloads()
+            while downloads or decodes or ready:
+                submit_decodes()
+                done, _ = wait(list(downloads) + list(decodes), return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    if future in downloads:
+                        unit = downloads.pop(future)
+                        try:
+                            fetched = future.result()
+                        except Exception as e:
+                            logger.error(f"Failed to download {unit}: {str(e)}")
+                            fetched = None
+                        if fetched is None:
+                            metrics.add("s3_download", str(unit), {"failures": 1})
+                            if points_hash is not None:
+                                session.record_file(unit.s3_key, variables, points_hash, MANIFEST_FAILED)
+                            continue
+                        ready.append((unit, fetched))
+                        continue
+
+                    unit, fetched = decodes.pop(future)
+                    try:
+                        results, decoded, worker_metrics, worker_profile, worker_rss = future.result()
+                    except Exception as e:
+                        logger.error(f"Failed to process {unit}: {str(e)}")
+                        metrics.add("grib_decode", str(unit), {"failures": 1})
+                        if points_hash is not None:
+                            session.record_file(unit.s3_key, variables, points_hash, MANIFEST_FAILED,
+                                                fetched.field_key.etag, fetched.num_bytes)
+                        continue
+                    if worker_rss is not None and worker_rss > (decode_peak_rss or 0):
+                        slots = decode_slots()
+                        decode_peak_rss = worker_rss
+                        if decode_memory_budget is not None and decode_slots() != slots:
+                            logger.info(f"Decode workers peaked at {worker_rss / 1024 ** 2:.0f} MB; "
+                                        f"running up to {decode_slots()} decodes at once")
+                    metrics.merge(worker_metrics)
+                    if worker_profile is not None:
+                        metrics.profiles.append(worker_profile)
+
+                    missing = [var for var in variables if var not in decoded]
+                    if missing:
+                        logger.error(f"{unit} is missing {', '.join(missing)}; it is not marked complete")
+                        metrics.add("grib_decode", str(unit), {"incomplete": 1})
+
+                    # Insert results into database
+                    num_rows = inserted = skipped = 0
+                    with metrics.unit(str(unit)), session.transaction():
+                        for batch in read_results(results):
+                            if batch.num_rows:
+                                batch_inserted, batch_skipped = session.append(batch)
+                                num_rows += batch.num_rows
+                                inserted += batch_inserted
+                                skipped += batch_skipped
+                        if points_hash is not None:
+                            session.record_file(unit.s3_key, variables, points_hash,
+                                                MANIFEST_FAILED if missing else MANIFEST_COMPLETE,
+                                                fetched.field_key.etag, fetched.num_bytes, num_rows)
+                    if num_rows:
+                        total_inserted += inserted
+                        total_skipped += skipped
+                        logger.info(f"Successfully processed {num_rows} records for {unit} "
+                                    f"({inserted} inserted, {skipped} already present)")
+                    else:
+                        logger.warning(f"No new data to insert for {unit}")
+                    if on_complete is not None:
+                        on_complete(unit, inserted, skipped)
+
+                submit_downloads()
+    finally:
+        if owns_session:
+            session.close()
+    if field_cache is not None:
+        field_cache.evict()
+
+    return total_inserted, total_skipped
\ No newline at end of file
@@ -0,0 +1,315 @@
+"""Reading forecast points from text, CSV or Parquet files in chunks."""
+
+import hashlib
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from .config import POINT_CHUNK_SIZE, POINTS_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Accepted column names for coordinates and site ids in CSV and Parquet files
+LATITUDE_COLUMNS = ("latitude", "lat")
+LONGITUDE_COLUMNS = ("longitude", "lon", "lng")
+SITE_ID_COLUMNS = ("site_id", "site", "id")
+
+# Rough size of one forecast row while it is extracted and inserted, used to
+# derive a chunk size from a memory ceiling
+ESTIMATED_ROW_BYTES = 64
+
+class PointChunk(NamedTuple):
+    """A chunk of points: (n, 2) float64 (lat, lon) coordinates and optional site ids."""
+    coords: np.ndarray
+    site_ids: Optional[pa.Array] = None
+
+def detect_format(path: Path) -> str:
+    """
+    Guess the format of a points file.
+
+    Returns:
+        "parquet" for .parquet/.pq files, "text" for headerless
+        "lat,lon" lines (the original format) and "csv" for CSV files with
+        a header row
+    """
+    if path.suffix.lower() in (".parquet", ".pq"):
+        return "parquet"
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.endswith('%'):
+                continue
+            try:
+                [float(v) for v in line.split(',')[:2]]
+                return "text"
+            except ValueError:
+                return "csv"
+    return "text"
+
+def pick_column(names: Sequence[str], candidates: Sequence[str], path: Path, required: bool = True) -> Optional[str]:
+    """Find the column holding a field among its accepted names (case-insensitive)."""
+    lowered = {name.lower(): name for name in names}
+    for candidate in candidates:
+        if candidate in lowered:
+            return lowered[candidate]
+    if required:
+        raise ValueError(f"{path} has no {candidates[0]} column (accepted names: {', '.join(candidates)})")
+    return None
+
+def batch_to_chunk(batch: pa.RecordBatch, lat_col: str, lon_col: str, site_col: Optional[str]) -> PointChunk:
+    """Convert a record batch of a points file to a PointChunk."""
+    coords = np.column_stack([
+        batch.column(lat_col).to_numpy(zero_copy_only=False).astype(np.float64),
+        batch.column(lon_col).to_numpy(zero_copy_only=False).astype(np.float64),
+    ])
+    site_ids = batch.column(site_col).cast(pa.string()) if site_col else None
+    return PointChunk(coords, site_ids)
+
+def rechunk(batches: Iterator[pa.RecordBatch], chunk_size: int) -> Iterator[pa.RecordBatch]:
+    """Regroup record batches of arbitrary sizes into batches of chunk_size rows (the last may be smaller)."""
+    pending: List[pa.RecordBatch] = []
+    pending_rows = 0
+    for batch in batches:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= chunk_size:
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, chunk_size).combine_chunks().to_batches()[0]
+            rest = table.slice(chunk_size)
+            pending = rest.to_batches()
+            pending_rows = rest.num_rows
+    if pending_rows:
+        yield pa.Table.from_batches(pending).combine_chunks().to_batches()[0]
+
+def iter_text_chunks(path: Path, chunk_size: int) -> Iterator[PointChunk]:
+    """Read headerless "lat,lon" lines; empty lines and lines ending with % are skipped."""
+    coords = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.endswith('%'):  # Skip empty lines and comments
+                lat, lon = map(float, line.split(','))
+                coords.append((lat, lon))
+                if len(coords) == chunk_size:
+                    yield PointChunk(np.array(coords, dtype=np.float64))
+                    coords = []
+    if coords:
+        yield PointChunk(np.array(coords, dtype=np.float64))
+
+def iter_point_chunks(path: Path, chunk_size: int = POINT_CHUNK_SIZE) -> Iterator[PointChunk]:
+    """
+    Stream the points of a file in chunks of chunk_size.
+
+    CSV and Parquet files are read incrementally with pyarrow and need
+    latitude and longitude columns (lat/lon also accepted); a site_id
+    column is optional.
+    """
+    path = Path(path)
+    fmt = detect_format(path)
+    if fmt == "text":
+        yield from iter_text_chunks(path, chunk_size)
+        return
+
+    if fmt == "parquet":
+        parquet_file = pq.ParquetFile(path)
+        names = parquet_file.schema_arrow.names
+        lat_col = pick_column(names, LATITUDE_COLUMNS, path)
+        lon_col = pick_column(names, LONGITUDE_COLUMNS, path)
+        site_col = pick_column(names, SITE_ID_COLUMNS, path, required=False)
+        columns = [c for c in (lat_col, lon_col, site_col) if c]
+        batches = parquet_file.iter_batches(batch_size=chunk_size, columns=columns)
+    else:
+        reader = pa_csv.open_csv(path)
+        names = reader.schema.names
+        lat_col = pick_column(names, LATITUDE_COLUMNS, path)
+        lon_col = pick_column(names, LONGITUDE_COLUMNS, path)
+        site_col = pick_column(names, SITE_ID_COLUMNS, path, required=False)
+        batches = iter(reader)
+
+    for batch in rechunk(batches, chunk_size):
+        yield batch_to_chunk(batch, lat_col, lon_col, site_col)
+
+def chunk_size_for_memory(memory_limit_bytes: int, chunk_size: int = POINT_CHUNK_SIZE) -> int:
+    """
+    Largest chunk size whose rows fit a quarter of a memory ceiling.
+
+    A quarter leaves room for the decoded fields, the batch being inserted
+    and DuckDB's own buffers.
+    """
+    return max(1, min(chunk_size, memory_limit_bytes // 4 // ESTIMATED_ROW_BYTES))
+
+def points_cache_paths(path: Path, cache_dir: Path = POINTS_CACHE_DIR) -> Tuple[Path, Path]:
+    """
+    Cache files of a points file: its coordinates (.npy) and site ids (Parquet).
+
+    Names are a hash of the file's resolved path followed by a hash of its
+    size and modification time, so an edited file gets new entries.
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    prefix = hashlib.sha256(str(path).encode()).hexdigest()[:16]
+    version = hashlib.sha256(f"{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+    cache_dir = Path(cache_dir)
+    return cache_dir / f"{prefix}-{version}.npy", cache_dir / f"{prefix}-{version}.sites.parquet"
+
+def parse_points_file(path: Path, cache_dir: Path = POINTS_CACHE_DIR) -> Tuple[Path, Optional[Path]]:
+    """
+    Parse a points file once into a coordinate array that can be memory-mapped.
+
+    The (n, 2) float64 coordinates are written to a .npy file in cache_dir
+    and the site ids, if the file has them, to a Parquet file next to it.
+    Entries are reused until the points file changes, and the entries of
+    its older versions are removed. Files are written under temporary
+    names and renamed, coordinates last, so processes sharing the cache
+    never see a partial entry.
+
+    Returns:
+        Tuple of (coordinates path, site ids path or None)
+    """
+    coords_path, sites_path = points_cache_paths(path, cache_dir)
+    if coords_path.exists():
+        return coords_path, sites_path if sites_path.exists() else None
+
+    coords_path.parent.mkdir(parents=True, exist_ok=True)
+    tag = f"{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+    raw_tmp = coords_path.with_name(f".{coords_path.name}.raw.{tag}")
+    coords_tmp = coords_path.with_name(f".{coords_path.name}.{tag}")
+    sites_tmp = sites_path.with_name(f".{sites_path.name}.{tag}")
+    sites_writer = None
+    num_points = 0
+    try:
+        # The number of points is only known at the end, so the coordinates
+        # are streamed to a raw file and copied into the .npy afterwards
+        with open(raw_tmp, 'wb') as f:
+            for chunk in iter_point_chunks(path):
+                f.write(np.ascontiguousarray(chunk.coords, dtype=np.float64).tobytes())
+                num_points += len(chunk.coords)
+                if chunk.site_ids is not None:
+                    if sites_writer is None:
+                        sites_writer = pq.ParquetWriter(sites_tmp, pa.schema([("site_id", pa.string())]))
+                    sites_writer.write_table(pa.table({"site_id": chunk.site_ids}))
+        if sites_writer is not None:
+            sites_writer.close()
+            sites_writer = None
+            os.replace(sites_tmp, sites_path)
+
+        coords = np.lib.format.open_memmap(coords_tmp, mode='w+', dtype=np.float64, shape=(num_points, 2))
+        if num_points:
+            raw = np.memmap(raw_tmp, dtype=np.float64, mode='r', shape=(num_points, 2))
+            for start in range(0, num_points, POINT_CHUNK_SIZE):
+                coords[start:start + POINT_CHUNK_SIZE] = raw[start:start + POINT_CHUNK_SIZE]
+            del raw
+        coords.flush()
+        del coords
+        os.replace(coords_tmp, coords_path)
+    finally:
+        if sites_writer is not None:
+            sites_writer.close()
+        for tmp in (raw_tmp, coords_tmp, sites_tmp):
+            tmp.unlink(missing_ok=True)
+
+    prefix = coords_path.name.split('-')[0]
+    for old in coords_path.parent.glob(f"{prefix}-*"):
+        if old not in (coords_path, sites_path):
+            old.unlink(missing_ok=True)
+    logger.info(f"Parsed {num_points} points from {path} into {coords_path}")
+    return coords_path, sites_path if sites_path.exists() else None
+
+def mix64(values: np.ndarray) -> np.ndarray:
+    """Finalizer of splitmix64: spreads the bits of each uint64 over the whole word."""
+    with np.errstate(over='ignore'):
+        z = values + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+class PointSource:
+    """
+    Points to extract, read from a file or held in memory.
+
+    A points file is parsed once into a memory-mapped coordinate array in
+    cache_dir (see parse_points_file) the first time its points are used.
+    Only the path of that array is pickled when the source is sent to a
+    decode worker, which maps it instead of parsing the file again, so
+    large point sets are neither re-read nor copied into every task.
+    """
+
+    def __init__(self, path: Optional[Path] = None,
+                 coords: Optional[np.ndarray] = None,
+                 chunk_size: int = POINT_CHUNK_SIZE,
+                 cache_dir: Path = POINTS_CACHE_DIR):
+        if (path is None) == (coords is None):
+            raise ValueError("Give either a path or coordinates")
+        self.path = Path(path) if path is not None else None
+        self.coords = coords
+        self.chunk_size = chunk_size
+        self.cache_dir = Path(cache_dir)
+        self.coords_path: Optional[Path] = None
+        self.sites_path: Optional[Path] = None
+
+    @classmethod
+    def from_points(cls, points: Sequence[Tuple[float, float]], chunk_size: int = POINT_CHUNK_SIZE) -> "PointSource":
+        """In-memory source for a list of (lat, lon) pairs."""
+        return cls(coords=np.asarray(points, dtype=np.float64).reshape(-1, 2), chunk_size=chunk_size)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.path is not None:
+            # Workers map the parsed coordinates themselves
+            state["coords"] = None
+        return state
+
+    def load(self) -> np.ndarray:
+        """All coordinates; those of a file are memory-mapped (parsing the file if it is not cached yet)."""
+        if self.coords is None:
+            if self.coords_path is None:
+                self.coords_path, self.sites_path = parse_points_file(self.path, self.cache_dir)
+            self.coords = np.load(self.coords_path, mmap_mode='r')
+        return self.coords
+
+    def coordinate_chunks(self) -> List[np.ndarray]:
+        """Coordinates in chunks of chunk_size, as views of the coordinate array."""
+        coords = self.load()
+        return [coords[start:start + self.chunk_size] for start in range(0, len(coords), self.chunk_size)]
+
+    def chunks(self) -> Iterator[PointChunk]:
+        """Iterate over the points in chunks of chunk_size, with their site ids if the file has them."""
+        coord_chunks = self.coordinate_chunks()
+        if self.sites_path is None:
+            for coords in coord_chunks:
+                yield PointChunk(coords)
+            return
+        batches = rechunk(pq.ParquetFile(self.sites_path).iter_batches(batch_size=self.chunk_size), self.chunk_size)
+        for coords, batch in zip(coord_chunks, batches):
+            yield PointChunk(coords, batch.column(0))
+
+    def count(self) -> int:
+        """Number of points (parses a file that is not cached yet)."""
+        return len(self.load())
+
+    def fingerprint(self) -> str:
+        """
+        Hash of the set of points, independent of their order.
+
+        Coordinates are rounded to float32 like the stored latitude and
+        longitude columns, so the hash changes only when the stored points
+        would. Each point is hashed on its own and the hashes are summed,
+        so the points are read a chunk at a time and never sorted.
+        """
+        total = 0
+        count = 0
+        for coords in self.coordinate_chunks():
+            point_bits = np.ascontiguousarray(coords, dtype=np.float32).view(np.uint64).ravel()
+            total = (total + int(mix64(point_bits).sum(dtype=np.uint64))) % 2 ** 64
+            count += len(coords)
+        return hashlib.sha256(f"{count}:{total}".encode()).hexdigest()
+
+    def __str__(self) -> str:
+        return str(self.path) if self.path is not None else f"{len(self.coords)} points"
\ No newline at end of file
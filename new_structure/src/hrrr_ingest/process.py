@@ -1,50 +1,36 @@
 """HRRR GRIB2 data processing."""
 
-import xarray as xr
 import numpy as np
-from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Iterator, Optional, Tuple
 import logging
-from datetime import datetime, timedelta
-import pandas as pd
+from datetime import datetime
+import pyarrow as pa
 
-from . import config
-from .config import SUPPORTED_VARIABLES
-from .database import check_existing_data
+from .config import get_s3_path
+from .database import FORECAST_SCHEMA
+from .decode import GribField, decode_fields
+from .field_cache import FieldCache, FieldKey
+from .grid_index import get_grid_index
+from .metrics import metrics
 
 logger = logging.getLogger(__name__)
 
-# Map variables to their level types and step types
-VARIABLE_LEVELS = {
-    'surface_pressure': {'typeOfLevel': 'surface', 'stepType': 'instant'},
-    'surface_roughness': {'typeOfLevel': 'surface', 'stepType': 'instant'},
-    'visible_beam_downward_solar_flux': {'typeOfLevel': 'surface', 'stepType': 'instant'},
-    'visible_diffuse_downward_solar_flux': {'typeOfLevel': 'surface', 'stepType': 'instant'},
-    'temperature_2m': {'typeOfLevel': 'heightAboveGround', 'stepType': 'instant', 'level': 2},
-    'dewpoint_2m': {'typeOfLevel': 'heightAboveGround', 'stepType': 'instant', 'level': 2},
-    'relative_humidity_2m': {'typeOfLevel': 'heightAboveGround', 'stepType': 'instant', 'level': 2},
-    'u_component_wind_10m': {'typeOfLevel': 'heightAboveGround', 'stepType': 'instant', 'level': 10},
-    'v_component_wind_10m': {'typeOfLevel': 'heightAboveGround', 'stepType': 'instant', 'level': 10},
-    'u_component_wind_80m': {'typeOfLevel': 'heightAboveGround', 'stepType': 'instant', 'level': 80},
-    'v_component_wind_80m': {'typeOfLevel': 'heightAboveGround', 'stepType': 'instant', 'level': 80},
-}
-
-def find_nearest_grid_point(lat: float, lon: float, ds: xr.Dataset) -> Tuple[int, int]:
+def find_nearest_grid_point(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> Tuple[int, int]:
     """
     Find the nearest grid point to the given latitude and longitude coordinates.
     
+    This is a brute-force scan of the whole grid; use grid_index.get_grid_index
+    to resolve many points at once.
+    
     Args:
         lat: Target latitude
         lon: Target longitude (-180 to 180)
-        ds: xarray Dataset containing the grid
+        lats: 2-D grid latitudes (see decode.GribField.grid_coordinates)
+        lons: 2-D grid longitudes
         
     Returns:
         Tuple of (y_idx, x_idx) for the nearest grid point
     """
-    # Convert coordinates to numpy arrays
-    lats = ds.latitude.values
-    lons = ds.longitude.values
-    
     # Convert input longitude from -180/180 to 0/360 convention if needed
     lon_360 = lon % 360 if lon < 0 else lon
     
@@ -65,133 +51,127 @@ def find_nearest_grid_point(lat: float, lon: float, ds: xr.Dataset) -> Tuple[int
     
     return int(min_idx[0]), int(min_idx[1])
 
-def process_grib_file(grib_file: str, points: List[Tuple[float, float]], variables: List[str], run_time: datetime) -> List[Dict[str, Any]]:
-    """Process a GRIB2 file and extract data for specified points and variables."""
-    results = []
-    
-    # Group variables by their level types to minimize dataset openings
-    level_groups = {
-        'surface': [],
-        'heightAboveGround': []
-    }
-    
-    for var in variables:
-        level_info = VARIABLE_LEVELS.get(var)
-        if not level_info:
-            logger.error(f"No level information for variable {var}")
-            continue
-        level_type = level_info['typeOfLevel']
-        level_groups.setdefault(level_type, []).append((var, level_info))
-
-    # Process each level type group
-    for level_type, var_info_list in level_groups.items():
-        if not var_info_list:
-            continue
-            
-        try:
-            # For heightAboveGround, process each level separately
-            if level_type == "heightAboveGround":
-                # Group variables by their level
-                level_var_groups = {}
-                for var, info in var_info_list:
-                    level = info.get('level')
-                    if level is not None:
-                        level_var_groups.setdefault(level, []).append((var, info))
-                
-                # Process each level group separately
-                for level, level_vars in level_var_groups.items():
-                    results.extend(process_level_group(grib_file, points, level_vars, run_time, level_type, level))
-            else:
-                # Process surface variables together
-                results.extend(process_level_group(grib_file, points, var_info_list, run_time, level_type))
-            
-        except Exception as e:
-            logger.error(f"Error processing {level_type} variables: {str(e)}")
-            raise
-
-    return results
-
-def process_level_group(grib_file: str, points: List[Tuple[float, float]], 
-                       var_info_list: List[Tuple[str, dict]], run_time: datetime,
-                       level_type: str, level: int = None) -> List[Dict[str, Any]]:
-    """Process a group of variables with the same level type and level."""
-    results = []
-    
-    # Prepare filter kwargs
-    filter_kwargs = {
-        "typeOfLevel": level_type,
-        "stepType": "instant"
-    }
-    
-    # For heightAboveGround variables, we MUST specify the exact level
-    if level_type == "heightAboveGround":
-        if level is None:
-            logger.error("Level must be specified for heightAboveGround variables")
-            return []
-        filter_kwargs["level"] = level
-        
-    try:
-        # Open dataset with strict filtering
-        ds = xr.open_dataset(
-            grib_file,
-            engine="cfgrib",
-            backend_kwargs={
-                "filter_by_keys": filter_kwargs,
-                "indexpath": "",
-                "read_keys": ["paramId", "shortName", "typeOfLevel", "level", "stepType"]
-            }
-        )
-        
-        logger.info(f"Available variables in dataset with filter {filter_kwargs}: {list(ds.variables.keys())}")
-        
-        # Process each variable in this group
-        for var_name, var_info in var_info_list:
-            grib_var = SUPPORTED_VARIABLES.get(var_name)
-            if not grib_var:
-                logger.error(f"No GRIB2 name mapping for variable {var_name}")
-                continue
-                
-            if grib_var not in ds.variables:
-                logger.error(f"Variable {var_name} ({grib_var}) not found in dataset")
-                continue
-                
-            data_array = ds[grib_var]
-            data_values = data_array.values
-            
-            for lat, lon in points:
-                try:
-                    y_idx, x_idx = find_nearest_grid_point(lat, lon, ds)
-                    value = float(data_values[y_idx, x_idx])
-                    
-                    # Get the valid time and step hours
-                    valid_time = pd.Timestamp(ds.valid_time.values).isoformat()
-                    step_hours = int(ds.step.values / np.timedelta64(1, 'h'))
-                    
-                    result = {
-                        "valid_time_utc": valid_time,
-                        "run_time_utc": run_time.isoformat(),
-                        "latitude": lat,
-                        "longitude": lon,
-                        "variable": var_name,
-                        "value": value,
-                        "source_s3": f"s3://noaa-hrrr-bdp-pds/hrrr.{run_time.strftime('%Y%m%d')}/conus/hrrr.t{run_time.hour:02d}z.wrfsfcf{step_hours:02d}.grib2"
-                    }
-                    
-                    if not check_existing_data(
-                        run_time=run_time.isoformat(),
-                        valid_time=valid_time,
-                        latitude=lat,
-                        longitude=lon,
-                        variable=var_name
-                    ):
-                        results.append(result)
-                        
-                except Exception as e:
-                    logger.error(f"Error processing point ({lat}, {lon}) for variable {var_name}: {str(e)}")
-                    continue
-                    
-    except Exception as e:
-        logger.error(f"Error opening dataset with filter {filter_kwargs}: {str(e)}")
-        raise
-                
-    return results 
\ No newline at end of file
+def make_forecast_batch(valid_time: datetime, run_time: datetime,
+                        latitudes: np.ndarray, longitudes: np.ndarray,
+                        variable: str, values: np.ndarray, source_s3: str) -> pa.Table:
+    """
+    Build a columnar batch of forecast rows for one variable of one file.
+
+    Per-file columns are stored once and repeated, point columns are taken
+    as arrays.
+    """
+    num_rows = len(values)
+
+    return pa.Table.from_arrays([
+        pa.repeat(pa.scalar(valid_time, FORECAST_SCHEMA.field("valid_time_utc").type), num_rows),
+        pa.repeat(pa.scalar(run_time, FORECAST_SCHEMA.field("run_time_utc").type), num_rows),
+        pa.array(latitudes, FORECAST_SCHEMA.field("latitude").type),
+        pa.array(longitudes, FORECAST_SCHEMA.field("longitude").type),
+        pa.repeat(pa.scalar(variable, pa.string()), num_rows),
+        pa.array(values, FORECAST_SCHEMA.field("value").type),
+        pa.repeat(pa.scalar(source_s3, pa.string()), num_rows),
+    ], schema=FORECAST_SCHEMA)
+
+def points_bounds(cells: List[Tuple[np.ndarray, np.ndarray]]) -> Tuple[int, int, int, int]:
+    """Bounding window (y_start, y_stop, x_start, x_stop) of chunks of grid cells."""
+    y_indices = [y for y, _ in cells if len(y)]
+    x_indices = [x for _, x in cells if len(x)]
+    if not y_indices:
+        return 0, 0, 0, 0
+    return (min(int(y.min()) for y in y_indices), max(int(y.max()) for y in y_indices) + 1,
+            min(int(x.min()) for x in x_indices), max(int(x.max()) for x in x_indices) + 1)
+
+def iter_forecast_batches(grib_file: Optional[str], chunks: List[np.ndarray], variables: List[str], run_time: datetime,
+                          use_index: bool = False, low_memory: bool = False,
+                          field_cache: Optional[FieldCache] = None, field_key: Optional[FieldKey] = None,
+                          fields: Optional[Iterator[GribField]] = None) -> Iterator[pa.Table]:
+    """
+    Extract forecast rows for chunks of points, one batch per field and chunk.
+
+    The file is decoded in a single pass (see decode.decode_fields) and
+    each decoded field is reused for every chunk before the next one is
+    decoded, so memory holds one field and one chunk's rows at a time.
+    Points are resolved to grid cells once per grid and chunk. Rows are not
+    checked against the database; insert_forecast_data skips the ones that
+    already exist.
+
+    Args:
+        chunks: (n, 2) arrays of (lat, lon) points
+        use_index: Save/reuse a message-offset index next to the file so
+            re-processing it skips the scan
+        low_memory: Crop each field to the bounding box of the points' grid
+            cells as soon as it is decoded, so the full-resolution array is
+            released before the points are extracted
+        field_cache: Save each decoded field under field_key (see
+            field_cache.FieldCache) so later runs can skip the file
+        fields: Fields to extract from instead of decoding grib_file (e.g.
+            FieldCache.load or decode.decode_messages)
+
+    Yields:
+        Columnar tables of forecast rows matching database.FORECAST_SCHEMA
+    """
+    grid_cells = {}
+    grid_bounds = {}
+    if fields is None:
+        fields = decode_fields(grib_file, variables, use_index=use_index)
+
+    while True:
+        with metrics.stage("grib_decode") as stage:
+            field = next(fields, None)
+            if field is not None:
+                stage["messages"] = 1
+                stage["values"] = field.values.size
+        if field is None:
+            break
+        if field_cache is not None:
+            field_cache.put(field_key, field)
+
+        # Resolve all points to grid cells in one batched query per grid and chunk
+        if field.grid_key not in grid_cells:
+            with metrics.stage("grid_lookup") as stage:
+                grid_index = get_grid_index(field.grid_key, field.grid_coordinates)
+                grid_cells[field.grid_key] = [grid_index.query(coords) for coords in chunks]
+                grid_bounds[field.grid_key] = points_bounds(grid_cells[field.grid_key])
+                stage["points"] = sum(len(coords) for coords in chunks)
+        if low_memory:
+            field.crop(*grid_bounds[field.grid_key])
+
+        source_s3 = get_s3_path(run_time.strftime('%Y%m%d'), field.step_hours, run_time.hour)
+
+        for coords, (y_indices, x_indices) in zip(chunks, grid_cells[field.grid_key]):
+            # Extract the chunk's points at once with fancy indexing
+            with metrics.stage("extract") as stage:
+                batch = make_forecast_batch(
+                    field.valid_time, run_time, coords[:, 0], coords[:, 1],
+                    field.variable, field.sample(y_indices, x_indices), source_s3
+                )
+                stage["rows"] = len(coords)
+            yield batch
+
+        # Release the field before the next one is decoded
+        field = None
+
+def process_grib_file(grib_file: str, points: List[Tuple[float, float]], variables: List[str], run_time: datetime,
+                      use_index: bool = False, low_memory: bool = False,
+                      field_cache: Optional[FieldCache] = None, field_key: Optional[FieldKey] = None) -> pa.Table:
+    """
+    Process a GRIB2 file and extract data for specified points and variables.
+
+    All points are extracted as one chunk (see iter_forecast_batches).
+
+    Args:
+        use_index: Save/reuse a message-offset index next to the file so
+            re-processing it skips the scan
+        low_memory: Crop fields to the points' bounding box right after decoding
+        field_cache: Also save the decoded fields under field_key
+
+    Returns:
+        Columnar table of forecast rows matching database.FORECAST_SCHEMA
+    """
+    coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    results = list(iter_forecast_batches(grib_file, [coords], variables, run_time,
+                                         use_index=use_index, low_memory=low_memory,
+                                         field_cache=field_cache, field_key=field_key))
+    if not results:
+        return FORECAST_SCHEMA.empty_table()
+    return pa.concat_tables(results)
\ No newline at end of file
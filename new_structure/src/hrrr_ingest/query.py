@@ -0,0 +1,258 @@
+"""Reading point time series out of the forecast database."""
+
+import hashlib
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+import duckdb
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from .config import DB_PATH, TABLE_NAME, SUPPORTED_VARIABLES, QUERY_CACHE_DIR, QUERY_CACHE_MAX_ENTRIES
+from .database import get_connection, get_data_version, get_database_identity, get_storage
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Name under which the requested points are registered with DuckDB
+POINTS_VIEW = "query_points"
+
+# Output formats supported by write_table
+OUTPUT_FORMATS = ("csv", "parquet", "arrow")
+
+class ForecastQuery(NamedTuple):
+    """
+    A selection of stored forecasts.
+
+    Args:
+        points: (lat, lon) pairs to return, or None for all points
+        variables: Variables to return, or None for all
+        run_time: Run to return; None selects the latest run
+        all_runs: Return every run instead of a single one
+        start: First valid time to return
+        end: Last valid time to return (inclusive)
+        wide: Pivot to one row per point and valid time with a column per variable
+    """
+    points: Optional[List[Tuple[float, float]]] = None
+    variables: Optional[List[str]] = None
+    run_time: Optional[datetime] = None
+    all_runs: bool = False
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    wide: bool = False
+
+    def cache_key(self, database: str, data_version: Tuple[Optional[datetime], int]) -> str:
+        """
+        Key of the query's result for a database (see
+        database.get_database_identity) in a given state of its data (see
+        database.get_data_version).
+        """
+        description = {
+            "database": database,
+            "points": sorted({tuple(p) for p in self.points}) if self.points is not None else None,
+            "variables": sorted(set(self.variables)) if self.variables is not None else None,
+            "run_time": self.run_time,
+            "all_runs": self.all_runs,
+            "start": self.start,
+            "end": self.end,
+            "wide": self.wide,
+            "data_version": data_version,
+        }
+        return hashlib.sha256(json.dumps(description, default=str).encode()).hexdigest()
+
+def build_sql(query: ForecastQuery, run_time: Optional[datetime]) -> Tuple[str, List[Any]]:
+    """
+    Build the parameterized SQL for a query.
+
+    Run, variable and time filters are parameters in the WHERE clause, so
+    DuckDB pushes them into the table scan (where zone maps on
+    run_time_utc skip other runs); points are matched with a semi-join
+    against the table registered as POINTS_VIEW.
+
+    Returns:
+        Tuple of (sql, parameters)
+    """
+    variables = query.variables or list(SUPPORTED_VARIABLES)
+    invalid = [v for v in variables if v not in SUPPORTED_VARIABLES]
+    if invalid:
+        raise ValueError(f"Invalid variables: {', '.join(invalid)}")
+
+    conditions = [f"variable IN ({', '.join('?' for _ in variables)})"]
+    params: List[Any] = list(variables)
+    if run_time is not None:
+        conditions.append("run_time_utc = ?")
+        params.append(run_time)
+    if query.start is not None:
+        conditions.append("valid_time_utc >= ?")
+        params.append(query.start)
+    if query.end is not None:
+        conditions.append("valid_time_utc <= ?")
+        params.append(query.end)
+    if query.points is not None:
+        conditions.append(f"""(latitude, longitude) IN (
+            SELECT CAST(latitude AS FLOAT), CAST(longitude AS FLOAT) FROM {POINTS_VIEW}
+        )""")
+    where = " AND ".join(conditions)
+
+    if query.wide:
+        # Variable names are validated above, so they can be used as column names
+        columns = ",\n            ".join(
+            f"max(value) FILTER (WHERE variable = '{var}') AS {var}" for var in variables)
+        sql = f"""
+        SELECT
+            valid_time_utc,
+            run_time_utc,
+            latitude,
+            longitude,
+            {columns}
+        FROM {TABLE_NAME}
+        WHERE {where}
+        GROUP BY valid_time_utc, run_time_utc, latitude, longitude
+        ORDER BY run_time_utc, latitude, longitude, valid_time_utc
+        """
+    else:
+        sql = f"""
+        SELECT valid_time_utc, run_time_utc, latitude, longitude, variable, value, source_s3
+        FROM {TABLE_NAME}
+        WHERE {where}
+        ORDER BY run_time_utc, latitude, longitude, valid_time_utc, variable
+        """
+    return sql, params
+
+class QueryCache:
+    """
+    Directory of query results stored as Parquet files.
+
+    Entries are keyed by the query, the database file and the state of
+    its data (latest run and row count), so any insert makes older
+    results unreachable and databases sharing the cache do not see each
+    other's results; the
+    least recently used entries beyond max_entries are removed.
+    """
+
+    def __init__(self, cache_dir: Path = QUERY_CACHE_DIR, max_entries: int = QUERY_CACHE_MAX_ENTRIES):
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+
+    def path_for(self, key: str) -> Path:
+        """Location of an entry."""
+        return self.cache_dir / f"{key}.parquet"
+
+    def get(self, key: str) -> Optional[pa.Table]:
+        """Return a cached result and mark it as recently used."""
+        path = self.path_for(key)
+        try:
+            table = pq.read_table(path)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Failed to read cached query result {path}: {str(e)}")
+            return None
+        return table
+
+    def put(self, key: str, table: pa.Table) -> None:
+        """Store a result and evict the least recently used ones."""
+        path = self.path_for(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to cache query result {path}: {str(e)}")
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        entries = []
+        for entry in self.cache_dir.glob("*.parquet"):
+            try:
+                entries.append((entry.stat().st_mtime, entry))
+            except FileNotFoundError:
+                continue
+        for _, entry in sorted(entries)[:-self.max_entries or None]:
+            entry.unlink(missing_ok=True)
+
+def query_forecasts(query: ForecastQuery,
+                    conn: Optional[duckdb.DuckDBPyConnection] = None,
+                    cache: Optional[QueryCache] = None) -> pa.Table:
+    """
+    Run a query against the forecast database and return the rows as Arrow.
+
+    Results are fetched from DuckDB as Arrow directly. If a cache is given,
+    a result computed for the same query on the same database file and
+    the same state of its data is returned without scanning the table.
+
+    Returns:
+        Long-format rows (the columns of the forecast table), or one column
+        per variable if query.wide is set; empty if there is no data
+    """
+    if conn is None:
+        conn = get_connection(DB_PATH, read_only=True)
+        should_close = True
+    else:
+        should_close = False
+
+    try:
+        if get_storage(conn) is None:
+            raise ValueError("The database has no forecast data")
+        data_version = get_data_version(conn)
+        latest_run, _ = data_version
+        run_time = None if query.all_runs else (query.run_time or latest_run)
+
+        # In-memory databases cannot be told apart, so their results are not cached
+        database = get_database_identity(conn) if cache is not None else None
+        key = query.cache_key(database, data_version) if database is not None else None
+        if key is not None:
+            table = cache.get(key)
+            if table is not None:
+                metrics.count("query", cache_hits=1, rows=table.num_rows)
+                logger.info(f"Returning cached result for {key[:12]}")
+                return table
+
+        sql, params = build_sql(query, run_time)
+        with metrics.stage("query") as stage:
+            if query.points is not None:
+                conn.register(POINTS_VIEW, pa.table({
+                    "latitude": pa.array([lat for lat, _ in query.points], pa.float64()),
+                    "longitude": pa.array([lon for _, lon in query.points], pa.float64()),
+                }))
+            try:
+                table = conn.execute(sql, params).to_arrow_table()
+            finally:
+                if query.points is not None:
+                    conn.unregister(POINTS_VIEW)
+            stage["rows"] = table.num_rows
+    finally:
+        if should_close:
+            conn.close()
+
+    if key is not None:
+        cache.put(key, table)
+    return table
+
+def write_table(table: pa.Table, path: Optional[str], fmt: str) -> None:
+    """
+    Write a query result as CSV, Parquet or an Arrow IPC file.
+
+    CSV is written to stdout if no path is given.
+    """
+    if fmt == "parquet":
+        pq.write_table(table, path)
+    elif fmt == "arrow":
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    elif fmt == "csv":
+        if path is None:
+            pa_csv.write_csv(table, sys.stdout.buffer)
+            sys.stdout.flush()
+        else:
+            pa_csv.write_csv(table, path)
+    else:
+        raise ValueError(f"Unsupported output format: {fmt}")
\ No newline at end of file
@@ -0,0 +1,206 @@
+"""Daily rollup tables of common aggregates, maintained incrementally as forecasts are inserted."""
+
+import logging
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import duckdb
+
+from .config import TABLE_NAME, DAILY_TEMPERATURE_TABLE_NAME, DAILY_WIND_TABLE_NAME, DAILY_SOLAR_TABLE_NAME
+
+logger = logging.getLogger(__name__)
+
+# Key of every rollup table: one row per run, point and UTC day of valid time
+GROUP_KEY = "run_time_utc, latitude, longitude, day"
+
+# Temporary table of the groups touched by a batch
+GROUPS_TABLE = "rollup_groups"
+
+class Rollup(NamedTuple):
+    """
+    A rollup table: daily aggregates of some variables per GROUP_KEY.
+
+    select builds the aggregate query over a relation of long-format
+    forecast rows (the columns of TABLE_NAME), so the same query rebuilds
+    the whole table or recomputes only the groups touched by new rows.
+    """
+    name: str
+    variables: Tuple[str, ...]
+    columns: str
+    select: Callable[[str], str]
+
+def daily_temperature_sql(source: str) -> str:
+    """Daily minimum, maximum and mean 2 m temperature (K)."""
+    return f"""
+    SELECT run_time_utc, latitude, longitude, CAST(valid_time_utc AS DATE) AS day,
+           min(value) AS min_temperature,
+           max(value) AS max_temperature,
+           avg(value) AS mean_temperature,
+           count(*) AS hours
+    FROM {source}
+    GROUP BY run_time_utc, latitude, longitude, day
+    """
+
+def daily_wind_sql(source: str) -> str:
+    """Daily maximum and mean wind speed (m/s) at 10 m and 80 m, derived from the u/v components."""
+    return f"""
+    SELECT run_time_utc, latitude, longitude, CAST(valid_time_utc AS DATE) AS day,
+           max(speed_10m) AS max_speed_10m,
+           avg(speed_10m) AS mean_speed_10m,
+           max(speed_80m) AS max_speed_80m,
+           avg(speed_80m) AS mean_speed_80m,
+           count(*) AS hours
+    FROM (
+        SELECT run_time_utc, latitude, longitude, valid_time_utc,
+               sqrt(max(value) FILTER (WHERE variable = 'u_component_wind_10m') ** 2
+                    + max(value) FILTER (WHERE variable = 'v_component_wind_10m') ** 2) AS speed_10m,
+               sqrt(max(value) FILTER (WHERE variable = 'u_component_wind_80m') ** 2
+                    + max(value) FILTER (WHERE variable = 'v_component_wind_80m') ** 2) AS speed_80m
+        FROM {source}
+        GROUP BY run_time_utc, latitude, longitude, valid_time_utc
+    )
+    GROUP BY run_time_utc, latitude, longitude, day
+    """
+
+def daily_solar_sql(source: str) -> str:
+    """
+    Daily solar flux totals (Wh/m2) of the beam and diffuse components.
+
+    Forecast hours are one hour apart, so each hourly flux (W/m2) counts
+    for one hour of energy.
+    """
+    return f"""
+    SELECT run_time_utc, latitude, longitude, CAST(valid_time_utc AS DATE) AS day,
+           sum(value) FILTER (WHERE variable = 'visible_beam_downward_solar_flux') AS beam_wh_m2,
+           sum(value) FILTER (WHERE variable = 'visible_diffuse_downward_solar_flux') AS diffuse_wh_m2,
+           sum(value) AS total_wh_m2,
+           count(DISTINCT valid_time_utc) AS hours
+    FROM {source}
+    GROUP BY run_time_utc, latitude, longitude, day
+    """
+
+ROLLUPS = (
+    Rollup(DAILY_TEMPERATURE_TABLE_NAME, ("temperature_2m",),
+           "min_temperature FLOAT, max_temperature FLOAT, mean_temperature DOUBLE, hours INTEGER",
+           daily_temperature_sql),
+    Rollup(DAILY_WIND_TABLE_NAME,
+           ("u_component_wind_10m", "v_component_wind_10m", "u_component_wind_80m", "v_component_wind_80m"),
+           "max_speed_10m DOUBLE, mean_speed_10m DOUBLE, max_speed_80m DOUBLE, mean_speed_80m DOUBLE, hours INTEGER",
+           daily_wind_sql),
+    Rollup(DAILY_SOLAR_TABLE_NAME, ("visible_beam_downward_solar_flux", "visible_diffuse_downward_solar_flux"),
+           "beam_wh_m2 DOUBLE, diffuse_wh_m2 DOUBLE, total_wh_m2 DOUBLE, hours INTEGER",
+           daily_solar_sql),
+)
+
+def get_rollups(names: Optional[Sequence[str]] = None) -> List[Rollup]:
+    """Rollups by table name (all of them if names is empty or None)."""
+    if not names:
+        return list(ROLLUPS)
+    unknown = set(names) - {rollup.name for rollup in ROLLUPS}
+    if unknown:
+        raise ValueError(f"Unknown rollups: {', '.join(sorted(unknown))}")
+    return [rollup for rollup in ROLLUPS if rollup.name in names]
+
+def variable_list_sql(variables: Sequence[str]) -> str:
+    """SQL list of variable names."""
+    return ", ".join(f"'{var}'" for var in variables)
+
+def existing_rollups(conn: duckdb.DuckDBPyConnection, database: Optional[str] = None) -> List[Rollup]:
+    """Rollups whose tables exist in a database (the current one by default), i.e. those being maintained."""
+    tables = {row[0] for row in conn.execute("""
+        SELECT table_name FROM duckdb_tables()
+        WHERE database_name = coalesce(?, current_database()) AND schema_name = 'main'
+    """, [database]).fetchall()}
+    return [rollup for rollup in ROLLUPS if rollup.name in tables]
+
+def create_rollup_table(conn: duckdb.DuckDBPyConnection, rollup: Rollup) -> None:
+    """Create an empty rollup table."""
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {rollup.name} (
+        run_time_utc TIMESTAMP,
+        latitude FLOAT,
+        longitude FLOAT,
+        day DATE,
+        {rollup.columns},
+        PRIMARY KEY ({GROUP_KEY})
+    )
+    """)
+
+def rebuild_rollups(conn: duckdb.DuckDBPyConnection, rollups: Sequence[Rollup] = ROLLUPS) -> Dict[str, int]:
+    """
+    Create rollup tables, or recreate them, from all stored forecasts.
+
+    Rows are inserted sorted by GROUP_KEY so zone maps prune scans by run
+    and point. Once a table exists, inserts keep it up to date (see
+    update_rollups).
+
+    Returns:
+        Number of rows of each rebuilt table
+    """
+    counts = {}
+    for rollup in rollups:
+        conn.execute(f"DROP TABLE IF EXISTS {rollup.name}")
+        create_rollup_table(conn, rollup)
+        source = f"(SELECT * FROM {TABLE_NAME} WHERE variable IN ({variable_list_sql(rollup.variables)}))"
+        counts[rollup.name] = conn.execute(f"""
+            INSERT INTO {rollup.name}
+            SELECT * FROM ({rollup.select(source)})
+            ORDER BY {GROUP_KEY}
+        """).fetchone()[0]
+    return counts
+
+def drop_rollups(conn: duckdb.DuckDBPyConnection, rollups: Sequence[Rollup] = ROLLUPS) -> None:
+    """Drop rollup tables, which stops maintaining them."""
+    for rollup in rollups:
+        conn.execute(f"DROP TABLE IF EXISTS {rollup.name}")
+
+def update_rollups(conn: duckdb.DuckDBPyConnection, batch: str, rollups: Sequence[Rollup]) -> int:
+    """
+    Recompute the rollup groups touched by a batch of forecast rows.
+
+    Called right after the rows of the batch relation are inserted: the
+    (run, point, day) groups of its rows holding each rollup's variables
+    are aggregated again from TABLE_NAME and replace the stored ones, so
+    a batch only costs the groups it touches and rows of a day that
+    arrive in several batches (e.g. one per forecast hour) are all
+    counted. Rollups none of whose variables are in the batch are
+    skipped.
+
+    Returns:
+        Number of recomputed groups
+    """
+    updated = 0
+    try:
+        for rollup in rollups:
+            variables = variable_list_sql(rollup.variables)
+            conn.execute(f"""
+                CREATE OR REPLACE TEMP TABLE {GROUPS_TABLE} AS
+                SELECT DISTINCT
+                    CAST(run_time_utc AS TIMESTAMP) AS run_time_utc,
+                    CAST(latitude AS FLOAT) AS latitude,
+                    CAST(longitude AS FLOAT) AS longitude,
+                    CAST(valid_time_utc AS DATE) AS day
+                FROM {batch}
+                WHERE variable IN ({variables})
+            """)
+            num_groups, min_run, max_run = conn.execute(f"""
+                SELECT count(*), min(run_time_utc), max(run_time_utc) FROM {GROUPS_TABLE}
+            """).fetchone()
+            if not num_groups:
+                continue
+            # The run range lets zone maps skip other runs before the join
+            source = f"""(
+                SELECT f.* FROM {TABLE_NAME} f
+                JOIN {GROUPS_TABLE} g
+                  ON f.run_time_utc = g.run_time_utc
+                 AND f.latitude = g.latitude
+                 AND f.longitude = g.longitude
+                 AND CAST(f.valid_time_utc AS DATE) = g.day
+                WHERE f.run_time_utc BETWEEN $min_run AND $max_run
+                  AND f.variable IN ({variables})
+            )"""
+            conn.execute(f"INSERT OR REPLACE INTO {rollup.name} {rollup.select(source)}",
+                         {"min_run": min_run, "max_run": max_run})
+            updated += num_groups
+    finally:
+        conn.execute(f"DROP TABLE IF EXISTS {GROUPS_TABLE}")
+    return updated
\ No newline at end of file
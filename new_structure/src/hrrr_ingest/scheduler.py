@@ -0,0 +1,83 @@
+"""Expansion of date ranges and cycles into ingest work units."""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, List, NamedTuple
+
+from .config import get_max_forecast_hour, get_s3_key
+
+logger = logging.getLogger(__name__)
+
+class WorkUnit(NamedTuple):
+    """One GRIB file to ingest: a forecast hour of one run (date and cycle)."""
+    run_time: datetime
+    forecast_hour: int
+
+    @property
+    def date_str(self) -> str:
+        return self.run_time.strftime('%Y%m%d')
+
+    @property
+    def cycle(self) -> int:
+        return self.run_time.hour
+
+    @property
+    def s3_key(self) -> str:
+        return get_s3_key(self.date_str, self.forecast_hour, self.cycle)
+
+    def __str__(self) -> str:
+        return f"{self.date_str} {self.cycle:02d}z hour {self.forecast_hour}"
+
+def parse_cycles(value: str) -> List[int]:
+    """Parse a comma separated list of cycle hours such as "0,6,12,18"."""
+    cycles = sorted({int(c) for c in value.split(',') if c.strip()})
+    invalid = [c for c in cycles if c < 0 or c > 23]
+    if invalid or not cycles:
+        raise ValueError(f"Invalid cycles: {value}")
+    return cycles
+
+def expand_work_units(start_date: datetime, end_date: datetime,
+                      cycles: Iterable[int], num_hours: int) -> List[WorkUnit]:
+    """
+    Expand a date range into (run date, cycle, forecast hour) work units.
+
+    Each cycle gets forecast hours 0..num_hours-1, limited to the hours that
+    cycle actually publishes (see config.get_max_forecast_hour).
+    """
+    cycles = list(cycles)
+    units = []
+    day = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    while day <= end_date:
+        for cycle in cycles:
+            hours = min(num_hours, get_max_forecast_hour(cycle) + 1)
+            if hours < num_hours:
+                logger.warning(f"The {cycle:02d}z cycle only has {hours} forecast hours")
+            run_time = day.replace(hour=cycle)
+            units.extend(WorkUnit(run_time, forecast_hour) for forecast_hour in range(hours))
+        day += timedelta(days=1)
+
+    return order_work_units(units)
+
+def order_work_units(units: Iterable[WorkUnit]) -> List[WorkUnit]:
+    """
+    Order work units for ingestion.
+
+    Units are sorted by run and then forecast hour, so the files of a run
+    are downloaded, decoded and inserted together: a run's rows end up
+    contiguous in the table (which keeps DuckDB's min/max zone maps on
+    run_time_utc selective), and runs complete one after another instead
+    of all being partially ingested if a backfill is interrupted.
+    """
+    return sorted(set(units), key=lambda unit: (unit.run_time, unit.forecast_hour))
+
+def shard_work_units(units: Iterable[WorkUnit], num_shards: int, shard_index: int) -> List[WorkUnit]:
+    """
+    Work units of one shard of a sharded ingest.
+
+    Units are ordered (see order_work_units) and dealt out round-robin, so
+    every shard gets a similar share of each run and the shards of
+    several workers or hosts never overlap.
+    """
+    if not 0 <= shard_index < num_shards:
+        raise ValueError(f"Shard index must be between 0 and {num_shards - 1}")
+    return order_work_units(units)[shard_index::num_shards]
\ No newline at end of file
@@ -8,10 +8,10 @@ setup(
         "click>=8.0.0",
         "duckdb>=0.9.0",
         "boto3>=1.26.0",
-        "xarray>=2023.1.0",
-        "cfgrib>=0.9.10.4",
-        "pandas>=2.0.0",
+        "eccodes>=1.7.0",
         "numpy>=1.24.0",
+        "pyarrow>=12.0.0",
+        "scipy>=1.10.0",
     ],
     entry_points={
         'console_scripts': [
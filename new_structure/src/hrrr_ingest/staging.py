@@ -0,0 +1,295 @@
+"""Sharded ingestion: workers stage rows as Parquet shards that are merged into the database in one step."""
+
+import logging
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import duckdb
+import pyarrow.parquet as pq
+
+from .config import STAGING_DIR
+from .database import (BATCH_VIEW, FORECAST_SCHEMA, MANIFEST_COMPLETE, DatabaseSession, ForecastBatch,
+                       insert_batch_view, manifest_variables, sql_string, to_arrow)
+from .metrics import metrics
+from .pipeline import run_pipeline
+from .points import PointSource
+from .scheduler import WorkUnit, shard_work_units
+
+logger = logging.getLogger(__name__)
+
+# Suffix of staged shards; shards being written have a hidden .tmp name
+SHARD_SUFFIX = ".parquet"
+
+# Manifest fields stored in each shard's Parquet key/value metadata
+SHARD_METADATA_KEYS = ("s3_key", "variables", "points_hash", "etag", "bytes", "rows")
+
+# Primary key of the forecast table, on which shards are deduplicated
+FORECAST_KEY = "valid_time_utc, run_time_utc, latitude, longitude, variable"
+
+def list_shards(staging_dir: Path) -> List[Path]:
+    """Completed shards in a staging directory, oldest first."""
+    staging_dir = Path(staging_dir)
+    if not staging_dir.exists():
+        return []
+    return sorted(staging_dir.glob(f"*{SHARD_SUFFIX}"), key=lambda path: path.stat().st_mtime_ns)
+
+def read_shard_metadata(shard: Path) -> Dict[str, str]:
+    """Manifest fields of a shard (see ShardWriter)."""
+    metadata = pq.read_metadata(shard).metadata or {}
+    return {key.decode(): value.decode() for key, value in metadata.items()
+            if key.decode() in SHARD_METADATA_KEYS}
+
+class ShardWriter:
+    """
+    Writes the rows of each forecast file to a Parquet shard in a staging
+    directory instead of the database.
+
+    It stands in for a DatabaseSession in run_pipeline: the batches
+    appended in a transaction are staged in a temporary file, and on
+    commit they are deduplicated on the forecast table's primary key,
+    sorted, and written to one shard named after the file. The manifest
+    entry recorded as complete in the transaction, if any (there is none
+    without a points_hash), is kept in the shard's key/value metadata and
+    applied by merge_shards. A shard appears under
+    its final name only once it is complete, so a shared staging directory
+    can be written by workers on several hosts while it is being merged.
+    """
+
+    def __init__(self, staging_dir: Path = STAGING_DIR):
+        self.staging_dir = Path(staging_dir)
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        # In-memory connection used to deduplicate and sort shards
+        self.conn = duckdb.connect()
+        self.rows_path: Optional[Path] = None
+        self.rows_writer: Optional[pq.ParquetWriter] = None
+        self.manifest_entry: Optional[Dict[str, Any]] = None
+
+    def __enter__(self) -> "ShardWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the deduplication connection."""
+        self.conn.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator["ShardWriter"]:
+        """Stage the rows appended in the enclosed block as one shard, discarded on error."""
+        self.rows_path = self.staging_dir / f".{uuid.uuid4().hex}.rows.tmp"
+        self.manifest_entry = None
+        try:
+            yield self
+            appended = self.rows_writer is not None
+            if appended:
+                self.rows_writer.close()
+                self.rows_writer = None
+            # Rows are staged even if no manifest entry was recorded (no points_hash)
+            if appended or self.manifest_entry is not None:
+                with metrics.stage("shard_commit"):
+                    self.write_shard()
+        finally:
+            if self.rows_writer is not None:
+                self.rows_writer.close()
+                self.rows_writer = None
+            self.rows_path.unlink(missing_ok=True)
+            self.rows_path = None
+
+    def append(self, data: ForecastBatch) -> Tuple[int, int]:
+        """
+        Stage a batch of forecast rows.
+
+        Returns:
+            Tuple of (staged, 0) row counts; rows that are already stored
+            are only skipped when the shard is merged
+        """
+        data = to_arrow(data).cast(FORECAST_SCHEMA)
+        with metrics.stage("shard_write") as stage:
+            if self.rows_writer is None:
+                self.rows_writer = pq.ParquetWriter(self.rows_path, FORECAST_SCHEMA)
+            self.rows_writer.write_table(data)
+            stage["rows"] = data.num_rows
+        return data.num_rows, 0
+
+    def record_file(self, s3_key: str, variables: List[str], points_hash: str, status: str,
+                    etag: Optional[str] = None, num_bytes: Optional[int] = None,
+                    rows: Optional[int] = None) -> None:
+        """
+        Keep the manifest entry of the shard being written.
+
+        Only completed files are recorded, by merge_shards; started and
+        failed files are left to the database's manifest of the next run.
+        """
+        if status != MANIFEST_COMPLETE:
+            return
+        self.manifest_entry = {
+            "s3_key": s3_key,
+            "variables": manifest_variables(variables),
+            "points_hash": points_hash,
+            "etag": etag or "",
+            "bytes": num_bytes or 0,
+            "rows": rows or 0,
+        }
+
+    def completed_files(self, s3_keys: List[str], variables: List[str], points_hash: str) -> Set[str]:
+        """Forecast files already staged for every requested variable and the same point set."""
+        staged: Dict[str, Set[str]] = {}
+        for shard in list_shards(self.staging_dir):
+            try:
+                entry = read_shard_metadata(shard)
+            except OSError:
+                continue
+            if entry.get("points_hash") == points_hash:
+                staged.setdefault(entry["s3_key"], set()).update(entry["variables"].split(','))
+        wanted = set(variables)
+        return {s3_key for s3_key in s3_keys if wanted <= staged.get(s3_key, set())}
+
+    def write_shard(self) -> Path:
+        """Deduplicate and sort the staged rows into a shard carrying the manifest entry, if any."""
+        if self.rows_writer is None and not self.rows_path.exists():
+            pq.write_table(FORECAST_SCHEMA.empty_table(), self.rows_path)
+        entry = self.manifest_entry or {}
+        prefix = entry["s3_key"].replace('/', '_') if entry else "rows"
+        name = f"{prefix}.{uuid.uuid4().hex[:12]}{SHARD_SUFFIX}"
+        shard = self.staging_dir / name
+        partial = self.staging_dir / f".{name}.tmp"
+        metadata = ", ".join(f"{key}: {sql_string(value)}" for key, value in entry.items())
+        options = f", KV_METADATA {{{metadata}}}" if entry else ""
+        try:
+            self.conn.execute(f"""
+                COPY (
+                    SELECT DISTINCT ON ({FORECAST_KEY}) *
+                    FROM (
+                        SELECT
+                            CAST(valid_time_utc AS TIMESTAMP) AS valid_time_utc,
+                            CAST(run_time_utc AS TIMESTAMP) AS run_time_utc,
+                            CAST(latitude AS FLOAT) AS latitude,
+                            CAST(longitude AS FLOAT) AS longitude,
+                            variable,
+                            CAST(value AS FLOAT) AS value,
+                            source_s3
+                        FROM read_parquet({sql_string(self.rows_path)})
+                    )
+                    ORDER BY run_time_utc, valid_time_utc, latitude, longitude, variable
+                ) TO {sql_string(partial)} (FORMAT parquet{options})
+            """)
+            os.replace(partial, shard)
+        except BaseException:
+            partial.unlink(missing_ok=True)
+            raise
+        return shard
+
+def merge_shards(session: DatabaseSession, staging_dir: Path = STAGING_DIR) -> Tuple[int, int, int]:
+    """
+    Load all staged shards into the database in one transaction.
+
+    The shards are inserted with a single INSERT ... SELECT over
+    read_parquet, skipping rows that are already stored and updating the
+    rollup tables (see database.insert_batch_view), and their manifest entries are recorded
+    as complete in the same transaction. Shards are removed once the
+    transaction is committed; merging a shard twice (e.g. if the process
+    dies before removing it) inserts nothing new.
+
+    Returns:
+        Tuple of (inserted, skipped, merged shards)
+    """
+    shards = list_shards(staging_dir)
+    if not shards:
+        return 0, 0, 0
+    entries = [read_shard_metadata(shard) for shard in shards]
+
+    with metrics.stage("shard_merge") as stage, session.transaction():
+        session.conn.read_parquet([str(shard) for shard in shards]).create_view(BATCH_VIEW)
+        try:
+            num_rows = session.conn.execute(f"SELECT count(*) FROM {BATCH_VIEW}").fetchone()[0]
+            inserted = insert_batch_view(session.conn, session.storage, session.rollups)
+        finally:
+            session.conn.execute(f"DROP VIEW {BATCH_VIEW}")
+        for entry in entries:
+            if entry.get("s3_key"):
+                session.record_file(entry["s3_key"], entry["variables"].split(','), entry["points_hash"],
+                                    MANIFEST_COMPLETE, entry["etag"] or None, int(entry["bytes"]),
+                                    int(entry["rows"]))
+        stage["shards"] = len(shards)
+        stage["rows_inserted"] = inserted
+        stage["rows_skipped"] = num_rows - inserted
+
+    for shard in shards:
+        shard.unlink(missing_ok=True)
+    logger.info(f"Merged {len(shards)} shards: {inserted} rows inserted, {num_rows - inserted} already present")
+    return inserted, num_rows - inserted, len(shards)
+
+def stage_shard(units: List[WorkUnit], points: PointSource, variables: List[str], staging_dir: Path,
+                pipeline_options: Dict[str, Any]) -> Tuple[int, List[Tuple[str, str, Dict[str, float]]],
+                                                           List[Dict[Any, Any]]]:
+    """
+    Run the pipeline for one shard's work units, writing shards instead of rows.
+
+    Runs in a shard worker process, with its own download and decode pools.
+
+    Returns:
+        Tuple of (staged rows, metrics recorded in this worker, cProfile
+        stats of its decode workers)
+    """
+    metrics.reset()
+    with ShardWriter(staging_dir) as writer:
+        staged, _ = run_pipeline(units, points, variables, session=writer, **pipeline_options)
+    return staged, metrics.drain(), metrics.profiles
+
+def ingest_sharded(units: List[WorkUnit], points: PointSource, variables: List[str],
+                   session: DatabaseSession, num_shards: int, staging_dir: Path = STAGING_DIR,
+                   points_hash: Optional[str] = None, skip_completed: bool = True,
+                   **pipeline_options: Any) -> Tuple[int, int]:
+    """
+    Ingest work units with several shard workers and a single merge.
+
+    The units are split round-robin (see scheduler.shard_work_units) among
+    num_shards worker processes. Each runs its own pipeline (see
+    run_pipeline, which receives pipeline_options) and writes a Parquet
+    shard per forecast file to staging_dir, so decoding and writing
+    scale with the number of workers instead of going through the
+    database's single writer. The shards, including any left by an
+    interrupted run, are then merged in one transaction (see
+    merge_shards).
+
+    Files the manifest records as complete are skipped before the
+    workers start, unless skip_completed is False.
+
+    Returns:
+        Tuple of (inserted, skipped) record counts
+    """
+    if points_hash is not None and skip_completed:
+        completed = session.completed_files([u.s3_key for u in units], variables, points_hash)
+        if completed:
+            logger.info(f"Skipping {len(completed)} forecast files already ingested for these points and variables")
+            units = [u for u in units if u.s3_key not in completed]
+
+    shards = [shard_work_units(units, num_shards, index) for index in range(num_shards)]
+    # Parse a points file once, before it is sent to the shard workers
+    points.load()
+    pipeline_options = dict(pipeline_options, points_hash=points_hash, skip_completed=skip_completed)
+    # Workers are spawned rather than forked, as this process holds an open database
+    context = multiprocessing.get_context("spawn")
+    staged = 0
+    with ProcessPoolExecutor(max_workers=num_shards, mp_context=context) as pool:
+        futures = [pool.submit(stage_shard, shard_units, points, variables, Path(staging_dir), pipeline_options)
+                   for shard_units in shards if shard_units]
+        for future in as_completed(futures):
+            try:
+                shard_rows, worker_metrics, worker_profiles = future.result()
+            except Exception as e:
+                logger.error(f"Shard worker failed: {str(e)}")
+                continue
+            staged += shard_rows
+            metrics.merge(worker_metrics)
+            metrics.profiles.extend(worker_profiles)
+    logger.info(f"Staged {staged} records from {len(units)} forecast files in {num_shards} shards")
+
+    inserted, skipped, _ = merge_shards(session, staging_dir)
+    return inserted, skipped
\ No newline at end of file
@@ -0,0 +1,250 @@
+"""Long-running ingestion of forecast hours as they are published."""
+
+import logging
+import random
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from .cache import GribCache
+from .config import get_max_forecast_hour
+from .database import DatabaseSession
+from .download import catalog, check_file_exists
+from .field_cache import FieldCache
+from .metrics import metrics
+from .pipeline import make_decode_pool, run_pipeline
+from .points import PointSource
+from .scheduler import WorkUnit
+
+logger = logging.getLogger(__name__)
+
+# Default seconds between availability polls
+DEFAULT_POLL_INTERVAL = 20
+
+# Default fraction by which each poll interval is randomly shortened or stretched
+DEFAULT_POLL_JITTER = 0.25
+
+# Attempts at a published forecast hour before it is given up
+MAX_ATTEMPTS = 3
+
+# Runs are followed for this long after their cycle time; HRRR publishes
+# the last hour of a 48 hour forecast roughly two hours after the cycle
+DEFAULT_RUN_LOOKBACK = timedelta(hours=6)
+
+def utc_now() -> datetime:
+    """Current UTC time as a naive datetime, like the run times used elsewhere."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def latest_cycle(now: datetime, cycles: List[int]) -> datetime:
+    """Run time of the most recent cycle at or before now."""
+    day = now.replace(minute=0, second=0, microsecond=0)
+    for _ in range(2):
+        started = [day.replace(hour=c) for c in cycles if day.replace(hour=c) <= now]
+        if started:
+            return max(started)
+        day -= timedelta(days=1)
+    raise ValueError("No cycles given")
+
+class Watcher:
+    """
+    Polls S3 for newly published forecast hours and ingests them.
+
+    The S3 client, database session, download threads and decode worker
+    processes (with their in-memory grid indexes) are created once and
+    reused by every poll, so a newly published hour only pays for its own
+    download, decode and insert. Each followed run remembers the next
+    forecast hour it expects; since HRRR publishes the hours of a run in
+    order, a poll only looks up that hour and the ones after it until one
+    is missing, using a fresh listing of the run from the availability
+    catalog.
+    """
+
+    def __init__(self, points: Union[PointSource, Sequence[Tuple[float, float]]], variables: List[str],
+                 cycles: List[int], num_hours: int,
+                 session: DatabaseSession,
+                 cache: Optional[GribCache] = None,
+                 partial_download: bool = True,
+                 download_workers: int = 4, decode_workers: int = 2,
+                 max_in_flight: Optional[int] = None,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 jitter: float = DEFAULT_POLL_JITTER,
+                 lookback: timedelta = DEFAULT_RUN_LOOKBACK,
+                 metrics_prom: Optional[Path] = None,
+                 low_memory: bool = False,
+                 decode_memory_budget: Optional[int] = None,
+                 field_cache: Optional[FieldCache] = None,
+                 points_hash: Optional[str] = None,
+                 skip_completed: bool = True,
+                 stream: bool = False):
+        self.points = points
+        self.variables = variables
+        self.cycles = cycles
+        self.num_hours = num_hours
+        self.session = session
+        self.cache = cache
+        self.partial_download = partial_download
+        self.download_workers = download_workers
+        self.decode_workers = decode_workers
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self.jitter = jitter
+        self.lookback = lookback
+        self.metrics_prom = metrics_prom
+        self.low_memory = low_memory
+        self.decode_memory_budget = decode_memory_budget
+        self.field_cache = field_cache
+        self.points_hash = points_hash
+        self.skip_completed = skip_completed
+        self.stream = stream
+        # Next forecast hour expected for each followed run
+        self.next_hours: Dict[datetime, int] = {}
+        # Published hours that failed to ingest, with their attempt counts
+        self.retries: Dict[WorkUnit, int] = {}
+        self.stopping = threading.Event()
+
+    def stop(self, *_) -> None:
+        """Ask the watcher to stop after the work in progress (usable as a signal handler)."""
+        if not self.stopping.is_set():
+            logger.info("Shutting down after the current forecast hours are ingested")
+        self.stopping.set()
+
+    def install_signal_handlers(self) -> None:
+        """Stop gracefully on SIGINT and SIGTERM."""
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+    def run_hours(self, run_time: datetime) -> int:
+        """Number of forecast hours to ingest for a run."""
+        return min(self.num_hours, get_max_forecast_hour(run_time.hour) + 1)
+
+    def update_runs(self, now: datetime) -> None:
+        """Follow runs of the watched cycles started within the lookback window and drop older ones."""
+        run_time = latest_cycle(now, self.cycles)
+        while run_time >= now - self.lookback:
+            if run_time not in self.next_hours:
+                logger.info(f"Following the {run_time.strftime('%Y%m%d %H')}z run")
+                self.next_hours[run_time] = 0
+            run_time = latest_cycle(run_time - timedelta(seconds=1), self.cycles)
+
+        for run_time in [r for r in self.next_hours if r < now - self.lookback]:
+            if self.next_hours[run_time] < self.run_hours(run_time):
+                logger.warning(f"Giving up on the {run_time.strftime('%Y%m%d %H')}z run at hour "
+                               f"{self.next_hours[run_time]}")
+            del self.next_hours[run_time]
+            for unit in [u for u in self.retries if u.run_time == run_time]:
+                del self.retries[unit]
+
+    def find_published(self) -> List[WorkUnit]:
+        """
+        Probe each followed run for forecast hours published since the last poll.
+
+        A run's next hour is advanced past the hours returned, so the
+        caller must ingest them or keep them for a retry. If a lookup
+        fails, the hours found so far are returned and probing resumes
+        from there on the next poll.
+        """
+        units = []
+        for run_time, next_hour in sorted(self.next_hours.items()):
+            hours = self.run_hours(run_time)
+            while next_hour < hours and not self.stopping.is_set():
+                unit = WorkUnit(run_time, next_hour)
+                try:
+                    published = check_file_exists(unit.date_str, unit.forecast_hour, unit.cycle)
+                except Exception as e:
+                    logger.error(f"Failed to look up {unit}: {str(e)}")
+                    self.next_hours[run_time] = next_hour
+                    return units
+                if not published:
+                    break
+                units.append(unit)
+                next_hour += 1
+            self.next_hours[run_time] = next_hour
+        return units
+
+    def poll(self, download_pool, decode_pool) -> int:
+        """
+        Ingest everything published since the last poll.
+
+        Hours that fail, or that were pending when the poll raised, are
+        retried on the following polls, up to MAX_ATTEMPTS times. Metrics
+        are folded into per-stage totals after every poll.
+
+        Returns:
+            Number of forecast hours ingested
+        """
+        self.update_runs(utc_now())
+        # Each poll lists the followed runs once to see what was published since
+        catalog.invalidate()
+        units = sorted(set(self.find_published()) | set(self.retries))
+        completed = set()
+        try:
+            if units and self.points_hash is not None and self.skip_completed:
+                # Hours ingested before a restart are recorded in the manifest
+                done = self.session.completed_files([u.s3_key for u in units], self.variables, self.points_hash)
+                for unit in [u for u in units if u.s3_key in done]:
+                    self.retries.pop(unit, None)
+                units = [u for u in units if u.s3_key not in done]
+            if not units:
+                return 0
+
+            logger.info(f"Ingesting {len(units)} forecast hours: {', '.join(map(str, units))}")
+            inserted, skipped = run_pipeline(
+                units, self.points, self.variables,
+                download_workers=self.download_workers,
+                decode_workers=self.decode_workers,
+                partial_download=self.partial_download,
+                cache=self.cache,
+                max_in_flight=self.max_in_flight,
+                session=self.session,
+                download_pool=download_pool,
+                decode_pool=decode_pool,
+                on_complete=lambda unit, *_: completed.add(unit),
+                low_memory=self.low_memory,
+                decode_memory_budget=self.decode_memory_budget,
+                field_cache=self.field_cache,
+                points_hash=self.points_hash,
+                skip_completed=False,
+                stream=self.stream,
+            )
+            logger.info(f"Inserted {inserted} records across {len(completed)} forecast files ({skipped} already present)")
+        finally:
+            # Hours not completed, including all those of a poll that
+            # raised, count as failed attempts and are retried
+            for unit in units:
+                if unit in completed:
+                    self.retries.pop(unit, None)
+                    continue
+                attempts = self.retries.get(unit, 0) + 1
+                if attempts >= MAX_ATTEMPTS:
+                    logger.error(f"Giving up on {unit} after {attempts} attempts")
+                    self.retries.pop(unit, None)
+                else:
+                    self.retries[unit] = attempts
+            # Keep stage totals only, so metrics do not grow with every hour ingested
+            metrics.fold_units()
+
+        if self.metrics_prom:
+            metrics.write_prometheus(self.metrics_prom)
+        return len(completed)
+
+    def next_delay(self) -> float:
+        """Seconds until the next poll, randomly jittered so several watchers do not poll in lockstep."""
+        return self.poll_interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def run(self) -> None:
+        """Poll until stop() is called."""
+        with ThreadPoolExecutor(max_workers=self.download_workers) as download_pool, \
+             make_decode_pool(self.decode_workers) as decode_pool:
+            while not self.stopping.is_set():
+                try:
+                    ingested = self.poll(download_pool, decode_pool)
+                except Exception as e:
+                    logger.error(f"Poll failed: {str(e)}")
+                    ingested = 0
+                # Published hours often arrive back to back, so check again right away
+                if not ingested or self.retries:
+                    self.stopping.wait(self.next_delay())
+        logger.info("Watcher stopped")
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""Shared fixtures for the hrrr_ingest tests."""
+
+from datetime import datetime, timedelta
+from typing import Iterable, List, Tuple
+
+import pyarrow as pa
+import pytest
+
+from benchmarks.synthetic import write_grib
+from hrrr_ingest.database import DatabaseSession
+
+RUN_TIME = datetime(2025, 5, 1, 18)
+
+# Run and forecast hour of the synthetic GRIB file
+GRIB_RUN_TIME = datetime(2025, 5, 1, 6)
+GRIB_FORECAST_HOUR = 1
+
+def forecast_rows(points: Iterable[Tuple[float, float]], variables: List[str], hours: Iterable[int],
+                  run_time: datetime = RUN_TIME, offset: float = 0.0) -> pa.Table:
+    """Long-format forecast rows with a distinct value for every point, variable and hour."""
+    columns = {name: [] for name in ("valid_time_utc", "run_time_utc", "latitude", "longitude",
+                                     "variable", "value", "source_s3")}
+    for hour in hours:
+        for i, (lat, lon) in enumerate(points):
+            for j, var in enumerate(variables):
+                columns["valid_time_utc"].append(run_time + timedelta(hours=hour))
+                columns["run_time_utc"].append(run_time)
+                columns["latitude"].append(lat)
+                columns["longitude"].append(lon)
+                columns["variable"].append(var)
+                columns["value"].append(offset + 100 * hour + 10 * i + j)
+                columns["source_s3"].append(
+                    f"s3://noaa-hrrr-bdp-pds/hrrr.{run_time.strftime('%Y%m%d')}/conus/"
+                    f"hrrr.t{run_time.hour:02d}z.wrfsfcf{hour:02d}.grib2")
+    return pa.table(columns)
+
+@pytest.fixture(params=["standard", "compact"])
+def session(request, tmp_path):
+    """Database session in each storage layout."""
+    with DatabaseSession(tmp_path / "test.db", storage=request.param) as session:
+        yield session
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """Run each test in its own directory, so the default .hrrr_cache is not shared."""
+    monkeypatch.chdir(tmp_path)
+
+@pytest.fixture(scope="session")
+def synthetic_grib(tmp_path_factory):
+    """
+    Small HRRR-shaped GRIB2 file with every supported variable (see benchmarks.synthetic).
+
+    Returns:
+        Tuple of (path, list of (variable, byte offset))
+    """
+    path = tmp_path_factory.mktemp("grib") / "hrrr.t06z.wrfsfcf01.grib2"
+    offsets = write_grib(path, GRIB_RUN_TIME, GRIB_FORECAST_HOUR, scale=16)
+    return path, offsets
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""Tests for the local GRIB file cache."""
+
+import os
+import threading
+import time
+
+from hrrr_ingest.cache import EVICTION_GRACE_SECONDS, GribCache
+from hrrr_ingest.decode import INDEX_SUFFIX
+from hrrr_ingest.metrics import metrics
+
+def writer(data: bytes, calls: list):
+    def download(path):
+        calls.append(path)
+        path.write_bytes(data)
+        return True
+    return download
+
+def age(path, seconds):
+    """Mark an entry as last used some seconds ago."""
+    used = time.time() - seconds
+    os.utime(path, (used, used))
+
+def test_make_key():
+    key = GribCache.make_key("hrrr.20250501/conus/hrrr.t06z.wrfsfcf01.grib2", '"abc"')
+
+    assert key == GribCache.make_key("hrrr.20250501/conus/hrrr.t06z.wrfsfcf01.grib2", "abc")
+    assert key != GribCache.make_key("hrrr.20250501/conus/hrrr.t06z.wrfsfcf01.grib2", "abd")
+    assert key != GribCache.make_key("hrrr.20250501/conus/hrrr.t06z.wrfsfcf01.grib2", "abc", ["temperature_2m"])
+    assert (GribCache.make_key("key", "abc", ["temperature_2m", "surface_pressure"])
+            == GribCache.make_key("key", "abc", ["surface_pressure", "temperature_2m"]))
+
+def test_fetch_downloads_once(tmp_path):
+    cache = GribCache(tmp_path, max_bytes=1 << 20)
+    calls = []
+    metrics.reset()
+
+    first = cache.fetch("ab12", writer(b"grib", calls))
+    second = cache.fetch("ab12", writer(b"other", calls))
+
+    assert first == second == cache.path_for("ab12")
+    assert first.read_bytes() == b"grib"
+    assert len(calls) == 1
+    assert metrics.stage_totals()["cache"] == {"hits": 1, "misses": 1}
+
+def test_failed_download_leaves_no_entry(tmp_path):
+    cache = GribCache(tmp_path, max_bytes=1 << 20)
+
+    def download(path):
+        path.write_bytes(b"partial")
+        return False
+
+    assert cache.fetch("ab12", download) is None
+    assert cache.get("ab12") is None
+    assert cache.entries() == []
+    assert not list(tmp_path.rglob("*.tmp"))
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = GribCache(tmp_path, max_bytes=250)
+    paths = {key: cache.fetch(key, writer(b"x" * 100, [])) for key in ("aa01", "bb02", "cc03")}
+    age(paths["aa01"], EVICTION_GRACE_SECONDS + 30)
+    age(paths["bb02"], EVICTION_GRACE_SECONDS + 20)
+    age(paths["cc03"], EVICTION_GRACE_SECONDS + 10)
+    # A hit makes the oldest entry the most recently used
+    cache.get("aa01")
+
+    assert cache.evict() == 100
+
+    assert sorted(cache.entries()) == sorted([paths["aa01"], paths["cc03"]])
+    assert cache.size() == 200
+
+def test_eviction_removes_index_and_lock(tmp_path):
+    cache = GribCache(tmp_path, max_bytes=0)
+    path = cache.fetch("ab12", writer(b"grib", []))
+    index = path.with_name(f"{path.name}{INDEX_SUFFIX}")
+    index.write_text("{}")
+    assert path.with_suffix(".lock").exists()
+    age(path, EVICTION_GRACE_SECONDS + 10)
+
+    cache.evict()
+
+    assert not path.exists()
+    assert not index.exists()
+    assert not path.with_suffix(".lock").exists()
+
+def test_recent_and_kept_entries_are_not_evicted(tmp_path):
+    cache = GribCache(tmp_path, max_bytes=0)
+    recent = cache.fetch("aa01", writer(b"grib", []))
+    kept = cache.fetch("bb02", writer(b"grib", []))
+    age(kept, EVICTION_GRACE_SECONDS + 10)
+
+    assert cache.evict(keep=kept) == 0
+
+    assert recent.exists() and kept.exists()
+
+def test_concurrent_fetches_download_once(tmp_path):
+    cache = GribCache(tmp_path, max_bytes=1 << 20)
+    calls = []
+    barrier = threading.Barrier(4)
+
+    def slow_download(path):
+        calls.append(path)
+        time.sleep(0.2)
+        path.write_bytes(b"grib")
+        return True
+
+    results = []
+    def fetch():
+        barrier.wait()
+        results.append(cache.fetch("ab12", slow_download))
+
+    threads = [threading.Thread(target=fetch) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [cache.path_for("ab12")] * 4
\ No newline at end of file
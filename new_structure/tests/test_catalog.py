@@ -0,0 +1,106 @@
+"""Tests for the availability catalog and S3 file lookups."""
+
+import time
+
+import boto3
+import botocore
+import pytest
+from moto import mock_aws
+
+from hrrr_ingest import download
+from hrrr_ingest.catalog import AvailabilityCatalog
+from hrrr_ingest.config import HRRR_BUCKET, get_s3_key
+
+class FakeS3:
+    """Client whose listings are counted."""
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.listings = 0
+
+    def get_paginator(self, name):
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        self.listings += 1
+        return [{"Contents": [{"Key": key, "ETag": f'"{key[-8:-6]}"', "Size": 100}
+                              for key in self.keys if key.startswith(Prefix)]}]
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        monkeypatch.setattr(download, "_S3_CLIENT", None)
+        client = boto3.client("s3")
+        client.create_bucket(Bucket=HRRR_BUCKET)
+        client.put_object(Bucket=HRRR_BUCKET, Key=get_s3_key("20250501", 0, 6), Body=b"grib",
+                          ACL="public-read")
+        yield client
+
+def test_get_file_info(clock):
+    client = FakeS3([get_s3_key("20250501", hour, 6) for hour in range(3)] + [get_s3_key("20250501", 0, 12)])
+    catalog = AvailabilityCatalog(lambda: client)
+
+    assert catalog.get_file_info("20250501", 1, 6) == {"etag": '"01"', "size": 100}
+    assert catalog.get_file_info("20250501", 3, 6) is None
+    assert catalog.get_file_info("20250501", 2, 6) is not None
+    assert client.listings == 1
+    assert catalog.get_file_info("20250501", 0, 12) is not None
+    assert client.listings == 2
+
+def test_listings_expire(clock):
+    keys = [get_s3_key("20250501", 0, 6)]
+    client = FakeS3(keys)
+    catalog = AvailabilityCatalog(lambda: client, ttl=60)
+    assert catalog.get_file_info("20250501", 1, 6) is None
+
+    keys.append(get_s3_key("20250501", 1, 6))
+    clock[0] += 59
+    assert catalog.get_file_info("20250501", 1, 6) is None
+    clock[0] += 1
+    assert catalog.get_file_info("20250501", 1, 6) is not None
+    assert client.listings == 2
+
+def test_invalidate(clock):
+    keys = [get_s3_key("20250501", 0, 6)]
+    client = FakeS3(keys)
+    catalog = AvailabilityCatalog(lambda: client)
+    assert catalog.get_file_info("20250501", 1, 6) is None
+
+    keys.append(get_s3_key("20250501", 1, 6))
+    catalog.invalidate()
+
+    assert catalog.get_file_info("20250501", 1, 6) is not None
+    assert client.listings == 2
+
+def test_head_file_info(s3):
+    info = download.head_file_info("20250501", 0, 6)
+
+    assert info["size"] == 4
+    assert info["etag"] == s3.head_object(Bucket=HRRR_BUCKET, Key=get_s3_key("20250501", 0, 6))["ETag"]
+    assert download.head_file_info("20250501", 1, 6) is None
+
+def test_head_file_info_raises_other_errors(monkeypatch):
+    class DeniedS3:
+        def head_object(self, Bucket, Key):
+            raise botocore.exceptions.ClientError({"Error": {"Code": "403", "Message": "Forbidden"}}, "HeadObject")
+
+    monkeypatch.setattr(download, "get_s3_client", DeniedS3)
+
+    with pytest.raises(botocore.exceptions.ClientError):
+        download.head_file_info("20250501", 0, 6)
+
+def test_listing_failure_falls_back_to_head(s3, monkeypatch):
+    def failing_client():
+        raise botocore.exceptions.EndpointConnectionError(endpoint_url="https://s3.amazonaws.com")
+
+    monkeypatch.setattr(download, "catalog", AvailabilityCatalog(failing_client))
+
+    assert download.check_file_exists("20250501", 0, 6)
+    assert not download.check_file_exists("20250501", 1, 6)
\ No newline at end of file
@@ -0,0 +1,91 @@
+"""Tests for inserting forecasts, the storage layouts and the ingest manifest."""
+
+import pytest
+
+from hrrr_ingest.config import TABLE_NAME, WIDE_VIEW_NAME
+from hrrr_ingest.database import (MANIFEST_COMPLETE, MANIFEST_FAILED, MANIFEST_STARTED, DatabaseSession,
+                                  insert_forecast_data, migrate_database, sql_string)
+
+from conftest import forecast_rows
+
+POINTS = [(40.0, -100.0), (41.5, -99.25), (35.125, -80.5)]
+VARIABLES = ["temperature_2m", "surface_pressure"]
+
+def stored_rows(session):
+    return session.conn.execute(f"""
+        SELECT valid_time_utc, run_time_utc, latitude, longitude, variable, value, source_s3
+        FROM {TABLE_NAME} ORDER BY ALL
+    """).fetchall()
+
+def test_insert_is_idempotent(session):
+    rows = forecast_rows(POINTS, VARIABLES, range(3))
+    assert insert_forecast_data(rows, session.conn) == (18, 0)
+    before = stored_rows(session)
+    assert insert_forecast_data(rows, session.conn) == (0, 18)
+    assert stored_rows(session) == before
+
+def test_insert_skips_only_existing_rows(session):
+    insert_forecast_data(forecast_rows(POINTS, VARIABLES, range(2)), session.conn)
+    assert insert_forecast_data(forecast_rows(POINTS, VARIABLES, range(3)), session.conn) == (6, 12)
+    assert len(stored_rows(session)) == 18
+
+def test_insert_keeps_first_value(session):
+    insert_forecast_data(forecast_rows(POINTS, VARIABLES, [0]), session.conn)
+    insert_forecast_data(forecast_rows(POINTS, VARIABLES, [0], offset=0.5), session.conn)
+    values = [row[5] for row in stored_rows(session)]
+    assert all(value == int(value) for value in values)
+
+def test_layouts_store_the_same_rows(tmp_path):
+    rows = forecast_rows(POINTS, VARIABLES, range(3))
+    stored = {}
+    for storage in ("standard", "compact"):
+        with DatabaseSession(tmp_path / f"{storage}.db", storage=storage) as session:
+            session.append(rows)
+            stored[storage] = stored_rows(session)
+    assert stored["standard"] == stored["compact"]
+
+def test_wide_view(session):
+    insert_forecast_data(forecast_rows(POINTS, VARIABLES, range(2)), session.conn)
+    row = session.conn.execute(f"""
+        SELECT temperature_2m, surface_pressure, dewpoint_2m IS NULL FROM {WIDE_VIEW_NAME}
+        WHERE latitude = 41.5 AND valid_time_utc = (SELECT max(valid_time_utc) FROM {WIDE_VIEW_NAME})
+    """).fetchone()
+    assert row == (110.0, 111.0, True)
+    assert session.conn.execute(f"SELECT count(*) FROM {WIDE_VIEW_NAME}").fetchone()[0] == 6
+
+@pytest.mark.parametrize("name", ["test.db", "forecaster's.db"])
+def test_migrate_keeps_rows(tmp_path, name):
+    db_path = tmp_path / name
+    with DatabaseSession(db_path, storage="standard") as session:
+        session.append(forecast_rows(POINTS, VARIABLES, range(3)))
+        session.record_file("a", VARIABLES, "points", MANIFEST_COMPLETE)
+        before = stored_rows(session)
+    migrate_database(db_path, "compact", keep_backup=False)
+    with DatabaseSession(db_path) as session:
+        assert session.storage == "compact"
+        assert stored_rows(session) == before
+        assert session.completed_files(["a"], VARIABLES, "points") == {"a"}
+
+def test_migrate_keeps_backup(tmp_path):
+    db_path = tmp_path / "test.db"
+    with DatabaseSession(db_path, storage="standard") as session:
+        session.append(forecast_rows(POINTS, VARIABLES, range(3)))
+
+    migrate_database(db_path, "compact")
+
+    assert (tmp_path / "test.db.bak").exists()
+    assert not (tmp_path / "test.db.migrating").exists()
+
+def test_sql_string():
+    assert sql_string("/data/forecaster's.db") == "'/data/forecaster''s.db'"
+
+def test_manifest_completed_files(session):
+    session.record_file("a", ["temperature_2m"], "points", MANIFEST_COMPLETE)
+    session.record_file("a", ["surface_pressure"], "points", MANIFEST_COMPLETE)
+    session.record_file("b", VARIABLES, "points", MANIFEST_STARTED)
+    session.record_file("c", VARIABLES, "points", MANIFEST_COMPLETE)
+    session.record_file("c", VARIABLES, "points", MANIFEST_FAILED)
+    session.record_file("d", VARIABLES, "other points", MANIFEST_COMPLETE)
+    session.record_file("e", ["temperature_2m"], "points", MANIFEST_COMPLETE)
+    assert session.completed_files(["a", "b", "c", "d", "e"], VARIABLES, "points") == {"a"}
+    assert session.completed_files(["a", "e"], ["temperature_2m"], "points") == {"a", "e"}
\ No newline at end of file
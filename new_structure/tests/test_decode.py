@@ -0,0 +1,138 @@
+"""Tests for decoding GRIB2 messages with eccodes."""
+
+import logging
+import os
+import shutil
+from datetime import timedelta
+
+import numpy as np
+
+from conftest import GRIB_FORECAST_HOUR, GRIB_RUN_TIME
+from hrrr_ingest.decode import decode_fields, decode_messages, index_path, read_message_index, split_messages
+
+VARIABLES = ["temperature_2m", "surface_pressure", "u_component_wind_80m"]
+
+def decode(grib_file, variables=VARIABLES, **kwargs):
+    return {field.variable: field for field in decode_fields(str(grib_file), variables, **kwargs)}
+
+def test_decode_fields(synthetic_grib):
+    grib_file, offsets = synthetic_grib
+
+    fields = decode(grib_file)
+
+    assert set(fields) == set(VARIABLES)
+    for var, offset in offsets:
+        if var not in fields:
+            continue
+        field = fields[var]
+        assert field.offset == offset
+        assert field.values.dtype == np.float32
+        assert field.values.shape == (66, 112)
+        assert field.step_hours == GRIB_FORECAST_HOUR
+        assert field.valid_time == GRIB_RUN_TIME + timedelta(hours=GRIB_FORECAST_HOUR)
+    assert len({field.grid_key for field in fields.values()}) == 1
+
+def test_variables_are_told_apart_by_level(synthetic_grib):
+    grib_file, _ = synthetic_grib
+
+    fields = decode(grib_file, ["u_component_wind_10m", "u_component_wind_80m"])
+
+    assert fields["u_component_wind_10m"].offset != fields["u_component_wind_80m"].offset
+    assert not np.array_equal(fields["u_component_wind_10m"].values, fields["u_component_wind_80m"].values)
+
+def test_grid_coordinates(synthetic_grib):
+    grib_file, _ = synthetic_grib
+
+    lats, lons = decode(grib_file)["temperature_2m"].grid_coordinates()
+
+    assert lats.shape == lons.shape == (66, 112)
+    assert 20 < lats.min() and lats.max() < 55
+    assert 225 < lons.min() and lons.max() < 305
+
+def test_missing_variable_is_logged(synthetic_grib, caplog):
+    grib_file, _ = synthetic_grib
+    variables = ["temperature_2m", "not_a_variable"]
+
+    with caplog.at_level(logging.ERROR):
+        fields = decode(grib_file, variables)
+
+    assert set(fields) == {"temperature_2m"}
+    assert "not_a_variable" in caplog.text
+
+def test_message_index(synthetic_grib, tmp_path):
+    grib_file = tmp_path / "copy.grib2"
+    shutil.copy(synthetic_grib[0], grib_file)
+
+    scanned = decode(grib_file, use_index=True)
+    assert index_path(str(grib_file)).exists()
+    messages = read_message_index(str(grib_file))
+    assert [keys["offset"] for keys in messages] == [offset for _, offset in synthetic_grib[1]]
+
+    indexed = decode(grib_file, use_index=True)
+    assert set(indexed) == set(scanned)
+    for var, field in indexed.items():
+        assert field.offset == scanned[var].offset
+        assert np.array_equal(field.values, scanned[var].values)
+
+def test_stale_message_index_is_ignored(synthetic_grib, tmp_path):
+    grib_file = tmp_path / "copy.grib2"
+    shutil.copy(synthetic_grib[0], grib_file)
+    decode(grib_file, use_index=True)
+
+    stat = os.stat(grib_file)
+    os.utime(grib_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    assert read_message_index(str(grib_file)) is None
+    assert set(decode(grib_file, use_index=True)) == set(VARIABLES)
+
+def test_split_messages(synthetic_grib):
+    grib_file, offsets = synthetic_grib
+    data = grib_file.read_bytes()
+    # Junk between messages is skipped
+    buffer = b"junk" + data[:offsets[2][1]] + b"\x00" * 8 + data[offsets[2][1]:]
+
+    messages = list(split_messages(buffer))
+
+    assert len(messages) == len(offsets)
+    assert all(isinstance(message, memoryview) for message in messages)
+    assert b"".join(bytes(message) for message in messages) == data
+    assert bytes(messages[2]) == data[offsets[2][1]:offsets[3][1]]
+
+def test_split_truncated_messages(synthetic_grib, caplog):
+    grib_file, offsets = synthetic_grib
+    data = grib_file.read_bytes()
+
+    messages = list(split_messages(data[:offsets[3][1] + 100]))
+
+    assert len(messages) == 3
+    assert "Truncated GRIB message" in caplog.text
+
+def test_decode_messages(synthetic_grib):
+    grib_file, offsets = synthetic_grib
+    data = grib_file.read_bytes()
+    # Messages can be spread over several buffers, e.g. one per ranged GET
+    buffers = [data[:offsets[4][1]], data[offsets[4][1]:]]
+
+    fields = {field.variable: field for field in decode_messages(buffers, VARIABLES)}
+
+    expected = decode(grib_file)
+    assert set(fields) == set(VARIABLES)
+    for var, field in fields.items():
+        assert field.grib_file is None
+        assert np.array_equal(field.values, expected[var].values)
+        assert (field.valid_time, field.step_hours, field.grid_key) == (
+            expected[var].valid_time, expected[var].step_hours, expected[var].grid_key)
+    lats, lons = fields["temperature_2m"].grid_coordinates()
+    expected_lats, expected_lons = expected["temperature_2m"].grid_coordinates()
+    assert np.array_equal(lats, expected_lats) and np.array_equal(lons, expected_lons)
+
+def test_decode_messages_missing_variable(synthetic_grib, caplog):
+    grib_file, offsets = synthetic_grib
+    data = grib_file.read_bytes()
+    # Only the first message is downloaded
+    buffers = [data[:offsets[1][1]]]
+
+    fields = list(decode_messages(buffers, ["temperature_2m", offsets[0][0]]))
+
+    assert [field.variable for field in fields] == [offsets[0][0]]
+    assert "Variable temperature_2m not found" in caplog.text
\ No newline at end of file
@@ -0,0 +1,57 @@
+"""Tests for .idx parsing and byte range planning."""
+
+from hrrr_ingest.download import merge_byte_ranges, parse_idx, select_idx_entries
+
+IDX = """\
+1:0:d=2025050106:REFC:entire atmosphere:1 hour fcst:
+2:1000:d=2025050106:TMP:2 m above ground:1 hour fcst:
+3:2500:d=2025050106:PRES:surface:1 hour fcst:
+not an inventory line
+4:4000:d=2025050106:APCP:surface:0-1 hour acc fcst:
+"""
+
+def test_parse_idx_ranges_run_to_next_message():
+    entries = parse_idx(IDX)
+    assert [(e["start"], e["end"]) for e in entries] == [(0, 999), (1000, 2499), (2500, 3999), (4000, None)]
+    assert entries[1]["variable"] == "TMP"
+    assert entries[1]["level"] == "2 m above ground"
+    assert entries[3]["forecast"] == "0-1 hour acc fcst"
+
+def test_parse_idx_sorts_by_offset():
+    lines = IDX.splitlines()
+    entries = parse_idx("\n".join([lines[2], lines[0], lines[1]]))
+    assert [e["message"] for e in entries] == ["1", "2", "3"]
+    assert entries[-1]["end"] is None
+
+def test_parse_idx_empty():
+    assert parse_idx("") == []
+
+def test_select_idx_entries():
+    entries = parse_idx(IDX)
+    selected = select_idx_entries(entries, ["surface_pressure", "temperature_2m"])
+    assert [e["message"] for e in selected] == ["3", "2"]
+
+def test_select_idx_entries_prefers_instantaneous_messages():
+    entries = parse_idx("""\
+1:0:d=2025050106:UGRD:10 m above ground:0-1 hour max fcst:
+2:500:d=2025050106:UGRD:10 m above ground:1 hour fcst:
+3:900:d=2025050106:VGRD:10 m above ground:0-1 hour ave fcst:
+""")
+    assert [e["message"] for e in select_idx_entries(entries, ["u_component_wind_10m"])] == ["2"]
+    assert select_idx_entries(entries, ["v_component_wind_10m"]) == []
+
+def test_select_idx_entries_skips_missing_variables():
+    assert select_idx_entries(parse_idx(IDX), ["dewpoint_2m", "unknown"]) == []
+
+def test_merge_byte_ranges_adjacent_and_overlapping():
+    assert merge_byte_ranges([(1000, 2499), (0, 999), (2000, 3000)]) == [(0, 3000)]
+
+def test_merge_byte_ranges_keeps_gaps():
+    assert merge_byte_ranges([(0, 99), (200, 299)]) == [(0, 99), (200, 299)]
+
+def test_merge_byte_ranges_contained_and_duplicate():
+    assert merge_byte_ranges([(0, 999), (100, 200), (0, 999)]) == [(0, 999)]
+
+def test_merge_byte_ranges_open_end():
+    assert merge_byte_ranges([(4000, None), (0, 999), (1000, 1999)]) == [(0, 1999), (4000, None)]
+    assert merge_byte_ranges([(0, 999), (500, None), (2000, 2999)]) == [(0, None)]
\ No newline at end of file
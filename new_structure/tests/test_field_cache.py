@@ -0,0 +1,83 @@
+"""Tests for the on-disk cache of decoded fields."""
+
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from conftest import GRIB_FORECAST_HOUR, GRIB_RUN_TIME
+from hrrr_ingest.cache import EVICTION_GRACE_SECONDS
+from hrrr_ingest.decode import decode_fields
+from hrrr_ingest.field_cache import META_SUFFIX, FieldCache, FieldKey
+
+VARIABLES = ["temperature_2m", "surface_pressure"]
+
+KEY = FieldKey(GRIB_RUN_TIME, GRIB_FORECAST_HOUR, '"etag"')
+
+@pytest.fixture
+def fields(synthetic_grib):
+    return list(decode_fields(str(synthetic_grib[0]), VARIABLES))
+
+def test_put_and_load(tmp_path, fields):
+    cache = FieldCache(tmp_path)
+    assert not cache.has(KEY, VARIABLES)
+
+    for field in fields:
+        cache.put(KEY, field)
+
+    assert cache.has(KEY, VARIABLES)
+    assert not cache.has(FieldKey(GRIB_RUN_TIME, GRIB_FORECAST_HOUR, '"other"'), VARIABLES)
+    assert not list(tmp_path.rglob("*.tmp"))
+    loaded = {field.variable: field for field in cache.load(KEY, VARIABLES)}
+    for field in fields:
+        cached = loaded[field.variable]
+        assert isinstance(cached.values, np.memmap)
+        assert np.array_equal(cached.values, field.values)
+        assert (cached.valid_time, cached.step_hours, cached.grid_key) == (
+            field.valid_time, field.step_hours, field.grid_key)
+    lats, lons = loaded["temperature_2m"].grid_coordinates()
+    expected_lats, expected_lons = fields[0].grid_coordinates()
+    assert np.array_equal(lats, expected_lats) and np.array_equal(lons, expected_lons)
+
+def test_fields_without_metadata_are_not_cached(tmp_path, fields):
+    cache = FieldCache(tmp_path)
+    for field in fields:
+        cache.put(KEY, field)
+
+    cache.path_for(KEY, "surface_pressure").with_suffix(META_SUFFIX).unlink()
+
+    assert cache.has(KEY, ["temperature_2m"])
+    assert not cache.has(KEY, VARIABLES)
+
+def test_load_skips_missing_variables(tmp_path, fields, caplog):
+    cache = FieldCache(tmp_path)
+    cache.put(KEY, fields[0])
+
+    loaded = list(cache.load(KEY, VARIABLES))
+
+    assert [field.variable for field in loaded] == [fields[0].variable]
+    assert "is unavailable" in caplog.text
+
+def test_evict_least_recently_used(tmp_path, fields):
+    size = fields[0].values.nbytes
+    cache = FieldCache(tmp_path, max_bytes=int(2.5 * size))
+    keys = [FieldKey(datetime(2025, 5, 1, 6), hour, '"etag"') for hour in range(3)]
+    for age, key in zip((30, 20, 10), keys):
+        cache.put(key, fields[0])
+        used = time.time() - EVICTION_GRACE_SECONDS - age
+        os.utime(cache.path_for(key, fields[0].variable), (used, used))
+
+    assert cache.evict() > 0
+
+    assert [cache.has(key, [fields[0].variable]) for key in keys] == [False, True, True]
+    assert not cache.path_for(keys[0], fields[0].variable).with_suffix(META_SUFFIX).exists()
+    assert cache.grid_path(fields[0].grid_key).exists()
+
+def test_recently_used_fields_are_kept(tmp_path, fields):
+    cache = FieldCache(tmp_path, max_bytes=0)
+    cache.put(KEY, fields[0])
+
+    assert cache.evict() == 0
+    assert cache.has(KEY, [fields[0].variable])
\ No newline at end of file
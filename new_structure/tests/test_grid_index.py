@@ -0,0 +1,71 @@
+"""Tests for the nearest-grid-point index."""
+
+import numpy as np
+import pytest
+
+from hrrr_ingest import grid_index
+from hrrr_ingest.grid_index import GridIndex, get_grid_index, grid_hash
+from hrrr_ingest.process import find_nearest_grid_point
+
+@pytest.fixture
+def grid():
+    """Slightly rotated 0/360 longitude grid over CONUS, about 0.5 degree spacing."""
+    y, x = np.meshgrid(np.arange(48), np.arange(110), indexing='ij')
+    lats = 25.0 + 0.5 * y + 0.05 * x
+    lons = 236.0 + 0.52 * x - 0.04 * y
+    return lats, lons
+
+@pytest.fixture(autouse=True)
+def clear_index_cache():
+    grid_index._INDEX_CACHE.clear()
+    yield
+    grid_index._INDEX_CACHE.clear()
+
+def cell_points(lats, lons, count=200, seed=0):
+    """Points near random grid cells (within a tenth of the spacing), with -180/180 longitudes."""
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, lats.shape[0], count)
+    x = rng.integers(0, lats.shape[1], count)
+    points = np.column_stack([lats[y, x], lons[y, x] - 360]) + rng.uniform(-0.05, 0.05, (count, 2))
+    return points, y, x
+
+def test_query_matches_brute_force(grid):
+    lats, lons = grid
+    points, y, x = cell_points(lats, lons)
+    y_idx, x_idx = GridIndex.build(lats, lons).query(points)
+    assert np.array_equal(y_idx, y) and np.array_equal(x_idx, x)
+    assert [find_nearest_grid_point(lat, lon, lats, lons) for lat, lon in points] == list(zip(y, x))
+
+def test_query_is_independent_of_longitude_convention(grid):
+    lats, lons = grid
+    points, _, _ = cell_points(lats, lons, count=50)
+    index = GridIndex.build(lats, lons)
+    west, east = index.query(points), index.query(points + [0, 360])
+    assert np.array_equal(west[0], east[0]) and np.array_equal(west[1], east[1])
+    other = GridIndex.build(lats, lons - 360).query(points)
+    assert np.array_equal(west[0], other[0]) and np.array_equal(west[1], other[1])
+
+def test_index_is_built_once_and_saved(grid, tmp_path):
+    lats, lons = grid
+    key = grid_hash(lats, lons)
+    calls = []
+
+    def load_coordinates():
+        calls.append(key)
+        return lats, lons
+
+    index = get_grid_index(key, load_coordinates, tmp_path)
+    assert get_grid_index(key, load_coordinates, tmp_path) is index
+    assert (tmp_path / f"{key}.pkl").exists()
+
+    # A new process loads the saved index instead of building it
+    grid_index._INDEX_CACHE.clear()
+    loaded = get_grid_index(key, load_coordinates, tmp_path)
+    assert calls == [key]
+    points, _, _ = cell_points(lats, lons, count=20)
+    assert np.array_equal(loaded.query(points), index.query(points))
+
+def test_grid_hash_depends_on_geometry(grid):
+    lats, lons = grid
+    assert grid_hash(lats, lons) == grid_hash(lats.copy(), lons.copy())
+    assert grid_hash(lats, lons) != grid_hash(lats, lons + 0.01)
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""Tests for cropping decoded fields and the decode memory budget."""
+
+from datetime import datetime
+
+import numpy as np
+
+from hrrr_ingest.decode import GribField
+from hrrr_ingest.pipeline import decode_slot_count
+from hrrr_ingest.process import points_bounds
+
+MB = 1024 ** 2
+
+def make_field():
+    values = np.arange(20 * 30, dtype=np.float32).reshape(20, 30)
+    return GribField("temperature_2m", values, datetime(2025, 5, 1, 7), 1, "grid", None, 0)
+
+def test_points_bounds():
+    cells = [(np.array([3, 7]), np.array([10, 2])), (np.array([5]), np.array([25])), (np.array([]), np.array([]))]
+
+    assert points_bounds(cells) == (3, 8, 2, 26)
+    assert points_bounds([(np.array([]), np.array([]))]) == (0, 0, 0, 0)
+
+def test_crop_keeps_sampled_values():
+    field = make_field()
+    y_indices, x_indices = np.array([3, 7, 5]), np.array([10, 2, 25])
+    expected = field.sample(y_indices, x_indices)
+
+    field.crop(*points_bounds([(y_indices, x_indices)]))
+
+    assert field.values.shape == (5, 24)
+    assert field.origin == (3, 2)
+    assert field.shape == (20, 30)
+    assert np.array_equal(field.sample(y_indices, x_indices), expected)
+
+def test_crop_releases_the_full_field():
+    field = make_field()
+    full = field.values
+
+    field.crop(0, 2, 0, 2)
+
+    assert not np.shares_memory(field.values, full)
+
+def test_decode_slot_count():
+    assert decode_slot_count(None, None, 5) == 5
+    assert decode_slot_count(None, 300 * MB, 5) == 5
+    assert decode_slot_count(1000 * MB, None, 5) == 1
+    assert decode_slot_count(1000 * MB, 300 * MB, 5) == 3
+    assert decode_slot_count(1000 * MB, 2000 * MB, 5) == 1
\ No newline at end of file
@@ -0,0 +1,108 @@
+"""Tests for per-stage run metrics."""
+
+import json
+import threading
+
+from hrrr_ingest.metrics import METRIC_PREFIX, RunMetrics
+
+def test_stages_are_accumulated_per_unit():
+    metrics = RunMetrics()
+    with metrics.unit("hour 0"):
+        with metrics.stage("s3_download") as stage:
+            stage["bytes"] = 100
+        with metrics.stage("s3_download") as stage:
+            stage["bytes"] = 50
+    with metrics.unit("hour 1"):
+        with metrics.stage("s3_download") as stage:
+            stage["bytes"] = 25
+        metrics.count("cache", hits=1)
+    metrics.count("cache", misses=1)
+
+    totals = metrics.stage_totals()
+    assert totals["s3_download"]["bytes"] == 175
+    assert totals["s3_download"]["calls"] == 3
+    assert totals["s3_download"]["wall_seconds"] >= 0
+    assert totals["cache"] == {"hits": 1, "misses": 1}
+
+    units = metrics.report()["units"]
+    assert units["hour 0"]["s3_download"]["bytes"] == 150
+    assert units["hour 1"]["cache"] == {"hits": 1}
+    assert units["run"]["cache"] == {"misses": 1}
+
+def test_units_are_per_thread():
+    metrics = RunMetrics()
+
+    def work(label):
+        with metrics.unit(label):
+            metrics.count("extract", rows=1)
+
+    with metrics.unit("main"):
+        thread = threading.Thread(target=work, args=("worker",))
+        thread.start()
+        thread.join()
+        metrics.count("extract", rows=2)
+
+    units = metrics.report()["units"]
+    assert units["worker"]["extract"] == {"rows": 1}
+    assert units["main"]["extract"] == {"rows": 2}
+
+def test_drain_and_merge():
+    worker = RunMetrics()
+    with worker.unit("hour 0"):
+        worker.count("grib_decode", messages=2)
+    parent = RunMetrics()
+    parent.count("grib_decode", messages=1)
+
+    parent.merge(worker.drain())
+
+    assert worker.stage_totals() == {}
+    assert parent.stage_totals() == {"grib_decode": {"messages": 3}}
+
+def test_reset():
+    metrics = RunMetrics()
+    metrics.count("cache", hits=1)
+    metrics.profiles.append({})
+
+    metrics.reset()
+
+    assert metrics.stage_totals() == {}
+    assert metrics.profiles == []
+
+def test_write_prometheus(tmp_path):
+    metrics = RunMetrics()
+    metrics.count("s3_download", bytes=100, failures=1)
+    metrics.count("db_insert", rows=10)
+    path = tmp_path / "hrrr.prom"
+
+    metrics.write_prometheus(path)
+
+    lines = path.read_text().splitlines()
+    assert f"# TYPE {METRIC_PREFIX}_run_wall_seconds gauge" in lines
+    assert f"# TYPE {METRIC_PREFIX}_stage_bytes_total counter" in lines
+    assert f'{METRIC_PREFIX}_stage_bytes_total{{stage="s3_download"}} 100' in lines
+    assert f'{METRIC_PREFIX}_stage_failures_total{{stage="s3_download"}} 1' in lines
+    assert f'{METRIC_PREFIX}_stage_rows_total{{stage="db_insert"}} 10' in lines
+    assert not (tmp_path / "hrrr.prom.tmp").exists()
+
+def test_write_json(tmp_path):
+    metrics = RunMetrics()
+    metrics.count("db_insert", rows=10)
+    path = tmp_path / "metrics.json"
+
+    metrics.write_json(path)
+
+    report = json.loads(path.read_text())
+    assert report["stages"] == {"db_insert": {"rows": 10}}
+    assert report["units"] == {"run": {"db_insert": {"rows": 10}}}
+
+def test_fold_units():
+    metrics = RunMetrics()
+    for hour in range(3):
+        with metrics.unit(f"hour {hour}"):
+            metrics.count("db_insert", rows=10)
+    totals = metrics.stage_totals()
+
+    metrics.fold_units()
+
+    assert metrics.stage_totals() == totals
+    assert metrics.report()["units"] == {"run": {"db_insert": {"rows": 30}}}
\ No newline at end of file
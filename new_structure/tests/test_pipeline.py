@@ -0,0 +1,73 @@
+"""Tests for the ingest pipeline."""
+
+import shutil
+from datetime import datetime
+
+from benchmarks.synthetic import write_grib
+from conftest import GRIB_FORECAST_HOUR, GRIB_RUN_TIME
+from hrrr_ingest import pipeline
+from hrrr_ingest.database import DatabaseSession
+from hrrr_ingest.field_cache import FieldKey
+from hrrr_ingest.metrics import metrics
+from hrrr_ingest.scheduler import WorkUnit
+
+RUN_TIME = datetime(2025, 5, 1, 6)
+
+POINTS = [(40.0, -100.0), (35.125, -80.5)]
+VARIABLES = ["temperature_2m", "surface_pressure"]
+
+def serve(monkeypatch, grib_file):
+    """Make the download stage hand out copies of a local GRIB file."""
+    def fetch(unit, *args, **kwargs):
+        path = grib_file.with_name(f"{unit.forecast_hour}-{grib_file.name}")
+        shutil.copy(grib_file, path)
+        return pipeline.FetchedHour(path, FieldKey(unit.run_time, unit.forecast_hour, '"etag"'),
+                                    path.stat().st_size)
+
+    monkeypatch.setattr(pipeline, "fetch_forecast_hour", fetch)
+
+def ingest(tmp_path, units):
+    with DatabaseSession(tmp_path / "test.db") as session:
+        result = pipeline.run_pipeline(units, POINTS, VARIABLES, session=session, points_hash="points",
+                                       download_workers=2, decode_workers=1)
+        statuses = dict(session.conn.execute("SELECT s3_key, status FROM ingest_manifest").fetchall())
+    return result, statuses
+
+def test_failed_download_does_not_stop_the_run(tmp_path, monkeypatch):
+    def fetch(unit, *args, **kwargs):
+        if unit.forecast_hour == 1:
+            raise ConnectionError("connection reset")
+        return None
+
+    monkeypatch.setattr(pipeline, "fetch_forecast_hour", fetch)
+    metrics.reset()
+    units = [WorkUnit(RUN_TIME, hour) for hour in range(3)]
+
+    result, statuses = ingest(tmp_path, units)
+
+    assert result == (0, 0)
+    # Files that are not published or fail to download are both failures
+    assert statuses == {unit.s3_key: "failed" for unit in units}
+    assert metrics.stage_totals()["s3_download"]["failures"] == 3
+
+def test_ingest_grib_file(tmp_path, monkeypatch, synthetic_grib):
+    serve(monkeypatch, synthetic_grib[0])
+    unit = WorkUnit(GRIB_RUN_TIME, GRIB_FORECAST_HOUR)
+
+    result, statuses = ingest(tmp_path, [unit])
+
+    assert result == (len(POINTS) * len(VARIABLES), 0)
+    assert statuses == {unit.s3_key: "complete"}
+
+def test_file_missing_variables_is_not_complete(tmp_path, monkeypatch):
+    grib_file = tmp_path / "partial.grib2"
+    write_grib(grib_file, GRIB_RUN_TIME, GRIB_FORECAST_HOUR, variables=["temperature_2m"], scale=16)
+    serve(monkeypatch, grib_file)
+    metrics.reset()
+    unit = WorkUnit(GRIB_RUN_TIME, GRIB_FORECAST_HOUR)
+
+    result, statuses = ingest(tmp_path, [unit])
+
+    assert result == (len(POINTS), 0)
+    assert statuses == {unit.s3_key: "failed"}
+    assert metrics.stage_totals()["grib_decode"]["incomplete"] == 1
\ No newline at end of file
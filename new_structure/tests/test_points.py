@@ -0,0 +1,75 @@
+"""Tests for reading points files."""
+
+import pickle
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from hrrr_ingest.points import PointSource, iter_point_chunks, parse_points_file
+
+COORDS = np.array([[40.0, -100.0], [41.5, -99.25], [35.125, -80.5], [47.0, -122.5], [25.75, -80.25]])
+
+@pytest.fixture
+def text_file(tmp_path):
+    path = tmp_path / "points.txt"
+    path.write_text("\n".join(f"{lat},{lon}" for lat, lon in COORDS) + "\n\n# comment %\n")
+    return path
+
+def test_text_and_parquet_formats(tmp_path, text_file):
+    parquet_file = tmp_path / "points.parquet"
+    pq.write_table(pa.table({"Lat": COORDS[:, 0], "lon": COORDS[:, 1]}), parquet_file)
+    for path in (text_file, parquet_file):
+        chunks = list(iter_point_chunks(path, chunk_size=2))
+        assert [len(chunk.coords) for chunk in chunks] == [2, 2, 1]
+        assert np.array_equal(np.concatenate([chunk.coords for chunk in chunks]), COORDS)
+
+def test_missing_column(tmp_path):
+    path = tmp_path / "points.csv"
+    path.write_text("name,latitude\na,40\n")
+    with pytest.raises(ValueError):
+        list(iter_point_chunks(path))
+
+def test_points_file_is_parsed_once(tmp_path, text_file):
+    cache_dir = tmp_path / "cache"
+    points = PointSource(text_file, chunk_size=2, cache_dir=cache_dir)
+    assert points.count() == len(COORDS)
+    assert isinstance(points.coords, np.memmap)
+    assert np.array_equal(np.concatenate(points.coordinate_chunks()), COORDS)
+
+    # Workers get the parsed array's path, not the coordinates
+    worker = pickle.loads(pickle.dumps(points))
+    assert worker.coords is None
+    assert worker.coords_path == points.coords_path
+    assert np.array_equal(worker.load(), COORDS)
+
+    assert parse_points_file(text_file, cache_dir) == (points.coords_path, None)
+    assert len(list(cache_dir.iterdir())) == 1
+
+def test_edited_file_is_parsed_again(tmp_path, text_file):
+    cache_dir = tmp_path / "cache"
+    first, _ = parse_points_file(text_file, cache_dir)
+    text_file.write_text("10,20\n")
+    second, _ = parse_points_file(text_file, cache_dir)
+    assert second != first
+    assert list(cache_dir.iterdir()) == [second]
+    assert np.array_equal(np.load(second), [[10.0, 20.0]])
+
+def test_site_ids(tmp_path):
+    path = tmp_path / "points.csv"
+    path.write_text("site_id,latitude,longitude\n" + "".join(
+        f"{'s' + str(i) if i != 2 else ''},{lat},{lon}\n" for i, (lat, lon) in enumerate(COORDS)))
+    points = PointSource(path, chunk_size=2, cache_dir=tmp_path / "cache")
+    chunks = list(points.chunks())
+    assert [chunk.site_ids.to_pylist() for chunk in chunks] == [["s0", "s1"], ["", "s3"], ["s4"]]
+    assert np.array_equal(np.concatenate([chunk.coords for chunk in chunks]), COORDS)
+
+def test_fingerprint(tmp_path, text_file):
+    points = PointSource(text_file, chunk_size=2, cache_dir=tmp_path / "cache")
+    fingerprint = points.fingerprint()
+    assert PointSource.from_points(COORDS[::-1]).fingerprint() == fingerprint
+    # Coordinates equal as float32 are the same stored points
+    assert PointSource.from_points(COORDS + 1e-9).fingerprint() == fingerprint
+    assert PointSource.from_points(COORDS[1:]).fingerprint() != fingerprint
+    assert PointSource.from_points(np.vstack([COORDS, COORDS[:1]])).fingerprint() != fingerprint
\ No newline at end of file
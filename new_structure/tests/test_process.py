@@ -0,0 +1,82 @@
+"""Tests for extracting forecast rows from GRIB2 files."""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from conftest import GRIB_FORECAST_HOUR, GRIB_RUN_TIME
+from hrrr_ingest import config
+from hrrr_ingest.database import FORECAST_SCHEMA
+from hrrr_ingest.decode import decode_fields
+from hrrr_ingest.process import make_forecast_batch, process_grib_file
+
+VARIABLES = ["temperature_2m", "surface_pressure"]
+
+def grid_points(grib_file, cells):
+    """(lat, lon) of grid cells, with longitudes in -180/180."""
+    field = next(decode_fields(str(grib_file), VARIABLES[:1]))
+    lats, lons = field.grid_coordinates()
+    return [(float(lats[y, x]), float((lons[y, x] + 180) % 360 - 180)) for y, x in cells]
+
+def test_make_forecast_batch():
+    valid_time = datetime(2025, 5, 1, 7)
+    batch = make_forecast_batch(valid_time, GRIB_RUN_TIME, np.array([40.0, 41.5]), np.array([-100.0, -99.25]),
+                                "temperature_2m", np.array([280.5, 281.25]), "s3://bucket/key")
+
+    assert batch.schema == FORECAST_SCHEMA
+    assert batch.to_pylist() == [
+        {"valid_time_utc": valid_time, "run_time_utc": GRIB_RUN_TIME, "latitude": 40.0, "longitude": -100.0,
+         "variable": "temperature_2m", "value": 280.5, "source_s3": "s3://bucket/key"},
+        {"valid_time_utc": valid_time, "run_time_utc": GRIB_RUN_TIME, "latitude": 41.5, "longitude": -99.25,
+         "variable": "temperature_2m", "value": 281.25, "source_s3": "s3://bucket/key"},
+    ]
+
+def test_make_forecast_batch_without_points():
+    batch = make_forecast_batch(datetime(2025, 5, 1, 7), GRIB_RUN_TIME, np.array([]), np.array([]),
+                                "temperature_2m", np.array([]), "s3://bucket/key")
+
+    assert batch.schema == FORECAST_SCHEMA
+    assert batch.num_rows == 0
+
+def test_process_grib_file(synthetic_grib):
+    grib_file, _ = synthetic_grib
+    cells = [(0, 0), (10, 20), (65, 111)]
+    points = grid_points(grib_file, cells)
+
+    table = process_grib_file(str(grib_file), points, VARIABLES, GRIB_RUN_TIME)
+
+    assert table.schema == FORECAST_SCHEMA
+    assert table.num_rows == len(points) * len(VARIABLES)
+    expected = {field.variable: field.values for field in decode_fields(str(grib_file), VARIABLES)}
+    for row in table.to_pylist():
+        y, x = cells[points.index((row["latitude"], row["longitude"]))]
+        assert row["value"] == np.float32(expected[row["variable"]][y, x])
+        assert row["run_time_utc"] == GRIB_RUN_TIME
+        assert row["valid_time_utc"] == GRIB_RUN_TIME + timedelta(hours=GRIB_FORECAST_HOUR)
+
+def test_low_memory_rows_match(synthetic_grib):
+    grib_file, _ = synthetic_grib
+    points = grid_points(grib_file, [(5, 5), (30, 60), (50, 100)])
+
+    full = process_grib_file(str(grib_file), points, VARIABLES, GRIB_RUN_TIME)
+    cropped = process_grib_file(str(grib_file), points, VARIABLES, GRIB_RUN_TIME, low_memory=True)
+
+    assert cropped.equals(full)
+
+def test_source_s3_uses_configured_bucket(synthetic_grib, monkeypatch):
+    grib_file, _ = synthetic_grib
+    monkeypatch.setattr(config, "HRRR_BUCKET", "hrrr-mirror")
+
+    table = process_grib_file(str(grib_file), [(40.0, -100.0)], VARIABLES, GRIB_RUN_TIME)
+
+    assert set(table.column("source_s3").to_pylist()) == {
+        f"s3://hrrr-mirror/hrrr.20250501/conus/hrrr.t06z.wrfsfcf{GRIB_FORECAST_HOUR:02d}.grib2"
+    }
+
+def test_no_matching_variables(synthetic_grib):
+    grib_file, _ = synthetic_grib
+
+    table = process_grib_file(str(grib_file), [(40.0, -100.0)], ["not_a_variable"], GRIB_RUN_TIME)
+
+    assert table.schema == FORECAST_SCHEMA
+    assert table.num_rows == 0
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""Tests for querying stored forecasts and caching the results."""
+
+import pyarrow as pa
+import pytest
+
+from hrrr_ingest.database import DatabaseSession
+from hrrr_ingest.query import ForecastQuery, QueryCache, query_forecasts
+
+from conftest import RUN_TIME, forecast_rows
+
+POINTS = [(40.0, -100.0), (41.5, -99.25)]
+VARIABLES = ["temperature_2m", "surface_pressure"]
+
+@pytest.fixture
+def cache(tmp_path):
+    return QueryCache(tmp_path / "cache")
+
+def test_query_points_and_variables(session):
+    session.append(forecast_rows(POINTS, VARIABLES, range(2)))
+    table = query_forecasts(ForecastQuery(points=[POINTS[1]], variables=["surface_pressure"]), session.conn)
+    assert isinstance(table, pa.Table)
+    assert table.column("value").to_pylist() == [11.0, 111.0]
+
+def test_wide_query(session):
+    session.append(forecast_rows(POINTS, VARIABLES, range(2)))
+    table = query_forecasts(ForecastQuery(variables=VARIABLES, wide=True), session.conn)
+    assert table.column_names[-2:] == VARIABLES
+    assert table.num_rows == 4
+    assert table.column("temperature_2m").to_pylist() == [0.0, 100.0, 10.0, 110.0]
+
+def test_query_latest_run_by_default(session):
+    session.append(forecast_rows(POINTS, VARIABLES, [0], run_time=RUN_TIME.replace(hour=12)))
+    session.append(forecast_rows(POINTS, VARIABLES, [0]))
+    table = query_forecasts(ForecastQuery(), session.conn)
+    assert set(table.column("run_time_utc").to_pylist()) == {RUN_TIME}
+    assert query_forecasts(ForecastQuery(all_runs=True), session.conn).num_rows == 8
+
+def test_cache_is_invalidated_by_inserts(session, cache):
+    session.append(forecast_rows(POINTS, VARIABLES, [0]))
+    query = ForecastQuery(variables=VARIABLES)
+    assert query_forecasts(query, session.conn, cache).num_rows == 4
+    assert len(list(cache.cache_dir.iterdir())) == 1
+    assert query_forecasts(query, session.conn, cache).num_rows == 4
+    assert len(list(cache.cache_dir.iterdir())) == 1
+
+    session.append(forecast_rows(POINTS, VARIABLES, [1]))
+    assert query_forecasts(query, session.conn, cache).num_rows == 8
+    assert len(list(cache.cache_dir.iterdir())) == 2
+
+def test_cache_is_per_database(tmp_path, cache):
+    query = ForecastQuery(variables=["temperature_2m"])
+    values = {}
+    for name, offset in (("a", 0.0), ("b", 0.5), ("a", None)):
+        with DatabaseSession(tmp_path / f"{name}.db") as session:
+            if offset is not None:
+                session.append(forecast_rows(POINTS, VARIABLES, [0], offset=offset))
+            values.setdefault(name, []).append(query_forecasts(query, session.conn, cache).column("value").to_pylist())
+    assert values["a"] == [[0.0, 10.0], [0.0, 10.0]]
+    assert values["b"] == [[0.5, 10.5]]
+
+def test_cache_evicts_least_recently_used(session, tmp_path):
+    cache = QueryCache(tmp_path / "cache", max_entries=2)
+    session.append(forecast_rows(POINTS, VARIABLES, [0]))
+    for variable in VARIABLES + ["dewpoint_2m"]:
+        query_forecasts(ForecastQuery(variables=[variable]), session.conn, cache)
+    assert len(list(cache.cache_dir.iterdir())) == 2
+
+def test_invalid_variable(session):
+    session.append(forecast_rows(POINTS, VARIABLES, [0]))
+    with pytest.raises(ValueError):
+        query_forecasts(ForecastQuery(variables=["snow"]), session.conn)
\ No newline at end of file
@@ -0,0 +1,74 @@
+"""Tests for incrementally maintained rollup tables."""
+
+import pytest
+from click.testing import CliRunner
+
+from hrrr_ingest.cli import main
+from hrrr_ingest.database import DatabaseSession, insert_forecast_data
+from hrrr_ingest.rollups import ROLLUPS, existing_rollups, get_rollups, rebuild_rollups, update_rollups
+
+from conftest import forecast_rows
+
+POINTS = [(40.0, -100.0), (41.5, -99.25)]
+VARIABLES = sorted({var for rollup in ROLLUPS for var in rollup.variables} | {"surface_pressure"})
+
+def rollup_rows(conn):
+    """Rows of every rollup table, with floats rounded so sums in a different order compare equal."""
+    return {rollup.name: [tuple(round(v, 6) if isinstance(v, float) else v for v in row)
+                          for row in conn.execute(f"SELECT * FROM {rollup.name} ORDER BY ALL").fetchall()]
+            for rollup in ROLLUPS}
+
+def test_incremental_rollups_match_rebuild(session):
+    rebuild_rollups(session.conn)
+    session.rollups = existing_rollups(session.conn)
+    # One forecast hour per insert, crossing a day boundary (18z + 6 hours)
+    for hour in range(9):
+        session.append(forecast_rows(POINTS, VARIABLES, [hour]))
+    incremental = rollup_rows(session.conn)
+
+    rebuild_rollups(session.conn)
+    rebuilt = rollup_rows(session.conn)
+    assert incremental == rebuilt
+    assert {row[3] for row in rebuilt["daily_temperature"]} == {
+        forecast_rows(POINTS, VARIABLES, [0])["valid_time_utc"][0].as_py().date(),
+        forecast_rows(POINTS, VARIABLES, [8])["valid_time_utc"][0].as_py().date(),
+    }
+
+def test_daily_temperature_values(session):
+    rebuild_rollups(session.conn, get_rollups(["daily_temperature"]))
+    insert_forecast_data(forecast_rows(POINTS[:1], ["temperature_2m"], range(3)), session.conn)
+    assert session.conn.execute("""
+        SELECT min_temperature, max_temperature, mean_temperature, hours FROM daily_temperature
+    """).fetchall() == [(0.0, 200.0, 100.0, 3)]
+
+def test_update_skips_rollups_without_batch_variables(session):
+    rebuild_rollups(session.conn)
+    session.conn.register("batch", forecast_rows(POINTS, ["surface_pressure"], [0]))
+    assert update_rollups(session.conn, "batch", ROLLUPS) == 0
+    session.conn.register("batch", forecast_rows(POINTS, ["temperature_2m"], [0]))
+    assert update_rollups(session.conn, "batch", ROLLUPS) == len(POINTS)
+
+def test_tables_without_rollups_are_not_maintained(session):
+    rebuild_rollups(session.conn, get_rollups(["daily_wind"]))
+    assert [rollup.name for rollup in existing_rollups(session.conn)] == ["daily_wind"]
+    insert_forecast_data(forecast_rows(POINTS, VARIABLES, [0]), session.conn)
+    assert session.conn.execute("SELECT count(*) FROM daily_wind").fetchone()[0] == len(POINTS)
+
+def test_unknown_rollup():
+    with pytest.raises(ValueError):
+        get_rollups(["daily_snow"])
+
+def test_rollups_command(tmp_path):
+    db_path = tmp_path / "test.db"
+    runner = CliRunner()
+
+    result = runner.invoke(main, ["rollups", "--db-path", str(db_path)])
+    assert result.exit_code == 2
+    assert not db_path.exists()
+
+    with DatabaseSession(db_path) as session:
+        session.append(forecast_rows(POINTS, VARIABLES, range(2)))
+    result = runner.invoke(main, ["rollups", "--db-path", str(db_path)])
+    assert result.exit_code == 0
+    with DatabaseSession(db_path) as session:
+        assert [rollup.name for rollup in session.rollups] == [rollup.name for rollup in ROLLUPS]
\ No newline at end of file
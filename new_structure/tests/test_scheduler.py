@@ -0,0 +1,43 @@
+"""Tests for expanding date ranges and cycles into work units."""
+
+from datetime import datetime
+
+import pytest
+
+from hrrr_ingest.scheduler import WorkUnit, expand_work_units, order_work_units, parse_cycles
+
+def test_expand_work_units():
+    units = expand_work_units(datetime(2025, 5, 1), datetime(2025, 5, 2), [18, 6], 2)
+
+    assert units == [
+        WorkUnit(datetime(2025, 5, 1, 6), 0), WorkUnit(datetime(2025, 5, 1, 6), 1),
+        WorkUnit(datetime(2025, 5, 1, 18), 0), WorkUnit(datetime(2025, 5, 1, 18), 1),
+        WorkUnit(datetime(2025, 5, 2, 6), 0), WorkUnit(datetime(2025, 5, 2, 6), 1),
+        WorkUnit(datetime(2025, 5, 2, 18), 0), WorkUnit(datetime(2025, 5, 2, 18), 1),
+    ]
+
+def test_hours_are_limited_to_the_cycle(caplog):
+    units = expand_work_units(datetime(2025, 5, 1), datetime(2025, 5, 1), [3, 6], 30)
+
+    assert [unit.forecast_hour for unit in units if unit.cycle == 3] == list(range(19))
+    assert [unit.forecast_hour for unit in units if unit.cycle == 6] == list(range(30))
+    assert "The 03z cycle only has 19 forecast hours" in caplog.text
+
+def test_order_work_units():
+    units = [WorkUnit(datetime(2025, 5, 2, 0), 0), WorkUnit(datetime(2025, 5, 1, 12), 1),
+             WorkUnit(datetime(2025, 5, 1, 12), 0), WorkUnit(datetime(2025, 5, 1, 12), 1)]
+
+    assert order_work_units(units) == [WorkUnit(datetime(2025, 5, 1, 12), 0), WorkUnit(datetime(2025, 5, 1, 12), 1),
+                                       WorkUnit(datetime(2025, 5, 2, 0), 0)]
+
+def test_work_unit():
+    unit = WorkUnit(datetime(2025, 5, 1, 6), 7)
+
+    assert unit.s3_key == "hrrr.20250501/conus/hrrr.t06z.wrfsfcf07.grib2"
+    assert str(unit) == "20250501 06z hour 7"
+
+def test_parse_cycles():
+    assert parse_cycles("18, 0,6,6") == [0, 6, 18]
+    for value in ("24", "-1", ",", "a"):
+        with pytest.raises(ValueError):
+            parse_cycles(value)
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""Tests for staging Parquet shards and merging them into the database."""
+
+from datetime import datetime
+
+import pytest
+from click.testing import CliRunner
+
+from hrrr_ingest.cli import main
+from hrrr_ingest.config import TABLE_NAME
+from hrrr_ingest.database import MANIFEST_COMPLETE, MANIFEST_FAILED, DatabaseSession
+from hrrr_ingest.rollups import existing_rollups, rebuild_rollups
+from hrrr_ingest.scheduler import WorkUnit, shard_work_units
+from hrrr_ingest.staging import ShardWriter, list_shards, merge_shards, read_shard_metadata
+
+from conftest import forecast_rows
+
+POINTS = [(40.0, -100.0), (41.5, -99.25)]
+VARIABLES = ["temperature_2m", "surface_pressure"]
+
+def stage(writer, hour, status=MANIFEST_COMPLETE, points_hash="points", rows=None):
+    with writer.transaction():
+        writer.append(rows if rows is not None else forecast_rows(POINTS, VARIABLES, [hour]))
+        if points_hash is not None:
+            writer.record_file(f"hrrr.20250501/conus/f{hour:02d}", VARIABLES, points_hash, status, rows=4)
+
+def test_merge_shards(session, tmp_path):
+    staging_dir = tmp_path / "staging"
+    with ShardWriter(staging_dir) as writer:
+        for hour in range(3):
+            stage(writer, hour)
+    assert len(list_shards(staging_dir)) == 3
+    assert read_shard_metadata(list_shards(staging_dir)[0])["s3_key"] == "hrrr.20250501/conus/f00"
+
+    assert merge_shards(session, staging_dir) == (12, 0, 3)
+    assert list_shards(staging_dir) == []
+    assert session.conn.execute(f"SELECT count(*) FROM {TABLE_NAME}").fetchone()[0] == 12
+    keys = [f"hrrr.20250501/conus/f{hour:02d}" for hour in range(3)]
+    assert session.completed_files(keys, VARIABLES, "points") == set(keys)
+    assert merge_shards(session, staging_dir) == (0, 0, 0)
+
+def test_merge_skips_stored_and_duplicate_rows(session, tmp_path):
+    staging_dir = tmp_path / "staging"
+    session.append(forecast_rows(POINTS, VARIABLES, [0]))
+    rows = forecast_rows(POINTS, VARIABLES, [0, 1])
+    with ShardWriter(staging_dir) as writer:
+        # Rows appended twice in one file and a file staged twice
+        stage(writer, 1, rows=rows.slice(4))
+        with writer.transaction():
+            writer.append(rows)
+            writer.append(rows)
+    assert merge_shards(session, staging_dir) == (4, 8, 2)
+    assert session.conn.execute(f"SELECT count(*) FROM {TABLE_NAME}").fetchone()[0] == 8
+
+def test_shards_without_manifest_entry_are_merged(session, tmp_path):
+    staging_dir = tmp_path / "staging"
+    with ShardWriter(staging_dir) as writer:
+        stage(writer, 0, points_hash=None)
+        stage(writer, 1, status=MANIFEST_FAILED)
+    shards = list_shards(staging_dir)
+    assert [read_shard_metadata(shard) for shard in shards] == [{}, {}]
+    assert merge_shards(session, staging_dir) == (8, 0, 2)
+    assert session.conn.execute("SELECT count(*) FROM ingest_manifest").fetchone()[0] == 0
+
+def test_failed_transaction_stages_nothing(tmp_path):
+    staging_dir = tmp_path / "staging"
+    with ShardWriter(staging_dir) as writer:
+        try:
+            with writer.transaction():
+                writer.append(forecast_rows(POINTS, VARIABLES, [0]))
+                raise RuntimeError("decode failed")
+        except RuntimeError:
+            pass
+    assert list(staging_dir.iterdir()) == []
+
+def test_completed_files_of_staged_shards(tmp_path):
+    with ShardWriter(tmp_path) as writer:
+        stage(writer, 0)
+        stage(writer, 1, points_hash="other points")
+        keys = [f"hrrr.20250501/conus/f{hour:02d}" for hour in range(2)]
+        assert writer.completed_files(keys, VARIABLES, "points") == {keys[0]}
+        assert writer.completed_files(keys, VARIABLES + ["dewpoint_2m"], "points") == set()
+
+def test_shard_work_units():
+    units = [WorkUnit(datetime(2025, 5, 1, 6), hour) for hour in range(7)]
+
+    shards = [shard_work_units(reversed(units), 3, index) for index in range(3)]
+
+    assert shards[0] == [units[0], units[3], units[6]]
+    assert sorted(unit for shard in shards for unit in shard) == units
+    with pytest.raises(ValueError):
+        shard_work_units(units, 3, 3)
+
+def test_merge_updates_rollups(session, tmp_path):
+    rebuild_rollups(session.conn)
+    session.rollups = existing_rollups(session.conn)
+    with ShardWriter(tmp_path / "staging") as writer:
+        for hour in range(2):
+            stage(writer, hour, rows=forecast_rows(POINTS, ["temperature_2m"], [hour]))
+    merge_shards(session, tmp_path / "staging")
+    assert session.conn.execute("""
+        SELECT min_temperature, max_temperature, hours FROM daily_temperature ORDER BY latitude
+    """).fetchall() == [(0.0, 100.0, 2), (10.0, 110.0, 2)]
+
+def test_merge_command(tmp_path):
+    staging_dir = tmp_path / "staging"
+    with ShardWriter(staging_dir) as writer:
+        stage(writer, 0)
+    db_path = tmp_path / "merged.db"
+
+    result = CliRunner().invoke(main, ["merge", "--staging-dir", str(staging_dir), "--db-path", str(db_path)])
+
+    assert result.exit_code == 0
+    with DatabaseSession(db_path) as session:
+        assert session.conn.execute(f"SELECT count(*) FROM {TABLE_NAME}").fetchone()[0] == 4
\ No newline at end of file
@@ -0,0 +1,66 @@
+"""Tests for the watcher's polls and retries."""
+
+from datetime import datetime
+
+import pytest
+
+from hrrr_ingest import watch
+from hrrr_ingest.metrics import metrics
+from hrrr_ingest.scheduler import WorkUnit
+
+RUN_TIME = datetime(2025, 5, 1, 6)
+
+class FakeSession:
+    pass
+
+@pytest.fixture
+def watcher(monkeypatch):
+    monkeypatch.setattr(watch, "utc_now", lambda: RUN_TIME.replace(minute=30))
+    monkeypatch.setattr(watch, "check_file_exists", lambda date, hour, cycle: hour < 2)
+    return watch.Watcher([(40.0, -100.0)], ["temperature_2m"], [6], 3, FakeSession())
+
+def test_hours_of_a_failed_poll_are_retried(watcher, monkeypatch):
+    batches = []
+
+    def run_pipeline(units, *args, on_complete, **kwargs):
+        batches.append(units)
+        if len(batches) == 1:
+            raise RuntimeError("database is locked")
+        for unit in units:
+            on_complete(unit, 1, 0)
+        return len(units), 0
+
+    monkeypatch.setattr(watch, "run_pipeline", run_pipeline)
+    with pytest.raises(RuntimeError):
+        watcher.poll(None, None)
+    published = [WorkUnit(RUN_TIME, hour) for hour in range(2)]
+    assert watcher.next_hours == {RUN_TIME: 2}
+    assert watcher.retries == {unit: 1 for unit in published}
+
+    assert watcher.poll(None, None) == 2
+    assert batches[1] == published
+    assert watcher.retries == {}
+
+def test_failed_hours_are_given_up(watcher, monkeypatch):
+    monkeypatch.setattr(watch, "run_pipeline", lambda units, *args, **kwargs: (0, 0))
+    for _ in range(watch.MAX_ATTEMPTS - 1):
+        watcher.poll(None, None)
+        assert len(watcher.retries) == 2
+    watcher.poll(None, None)
+    assert watcher.retries == {}
+
+def test_metrics_are_folded_after_each_poll(watcher, monkeypatch):
+    def run_pipeline(units, *args, on_complete, **kwargs):
+        for unit in units:
+            with metrics.unit(str(unit)):
+                metrics.count("db_insert", rows=10)
+            on_complete(unit, 10, 0)
+        return 10 * len(units), 0
+
+    monkeypatch.setattr(watch, "run_pipeline", run_pipeline)
+    metrics.reset()
+    watcher.poll(None, None)
+
+    report = metrics.report()
+    assert list(report["units"]) == ["run"]
+    assert report["stages"]["db_insert"] == {"rows": 20}
\ No newline at end of file